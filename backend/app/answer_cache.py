@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+def context_fingerprint(context_chunks: List[str], prompt: str) -> str:
+    """Hash of everything besides the question that shapes an answer"""
+    payload = json.dumps([context_chunks, prompt], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class _Entry:
+    query: str
+    vector: np.ndarray
+    fingerprint: str
+    answer: str
+    created_at: float
+    last_hit: float
+    hits: int = 0
+
+
+@dataclass
+class _Bucket:
+    """Cached answers of one provider, with their query vectors stacked"""
+
+    entries: List[_Entry] = field(default_factory=list)
+    matrix: Optional[np.ndarray] = None
+
+    def vectors(self) -> np.ndarray:
+        if self.matrix is None:
+            self.matrix = np.stack([entry.vector for entry in self.entries])
+        return self.matrix
+
+
+class SemanticAnswerCache:
+    """Reuse answers for paraphrases of questions already answered.
+
+    An answer is served when a new query's embedding is within ``threshold``
+    cosine similarity of a cached query for the same provider *and* the
+    retrieved context and prompt hash to the same fingerprint, so a cached
+    answer is never served over different documents or history. Entries
+    expire after ``ttl`` seconds; past ``max_entries`` the least recently
+    hit entry is evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _size(self) -> int:
+        return sum(len(bucket.entries) for bucket in self._buckets.values())
+
+    def _remove(self, provider: str, index: int):
+        bucket = self._buckets[provider]
+        del bucket.entries[index]
+        bucket.matrix = None
+        if not bucket.entries:
+            del self._buckets[provider]
+
+    def lookup(self, provider: str, vector, fingerprint: str) -> Optional[str]:
+        """Cached answer for a similar query over the same context, if any"""
+        if not self.enabled:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(provider)
+            # A dimension mismatch means the embedding model changed since caching
+            if bucket is None or bucket.vectors().shape[1] != query.shape[0]:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = bucket.vectors() @ query
+            # Best candidates first; stop at the first usable one
+            for index in np.argsort(-similarities):
+                if similarities[index] < self.threshold:
+                    break
+                entry = bucket.entries[index]
+                if now - entry.created_at > self.ttl:
+                    self._stats["expired"] += 1
+                    continue
+                if entry.fingerprint != fingerprint:
+                    self._stats["stale"] += 1
+                    continue
+                entry.hits += 1
+                entry.last_hit = now
+                self._stats["hits"] += 1
+                return entry.answer
+
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, provider: str, query: str, vector, fingerprint: str, answer: str):
+        """Remember an answer"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        entry = _Entry(
+            query=query,
+            vector=np.asarray(vector, dtype=np.float32),
+            fingerprint=fingerprint,
+            answer=answer,
+            created_at=now,
+            last_hit=now,
+        )
+        with self._lock:
+            self._purge_expired(now)
+            while self._size() >= self.max_entries:
+                self._evict_one()
+            bucket = self._buckets.setdefault(provider, _Bucket())
+            if bucket.entries and bucket.entries[0].vector.shape != entry.vector.shape:
+                # The embedding model changed; old vectors can't be compared
+                bucket.entries.clear()
+            bucket.entries.append(entry)
+            bucket.matrix = None
+
+    def _purge_expired(self, now: float):
+        for provider in list(self._buckets):
+            bucket = self._buckets[provider]
+            live = [e for e in bucket.entries if now - e.created_at <= self.ttl]
+            if len(live) != len(bucket.entries):
+                self._stats["expired"] += len(bucket.entries) - len(live)
+                bucket.entries = live
+                bucket.matrix = None
+            if not bucket.entries:
+                del self._buckets[provider]
+
+    def _evict_one(self):
+        provider, index = min(
+            (
+                (provider, i)
+                for provider, bucket in self._buckets.items()
+                for i in range(len(bucket.entries))
+            ),
+            key=lambda item: self._buckets[item[0]].entries[item[1]].last_hit,
+        )
+        self._remove(provider, index)
+        self._stats["evictions"] += 1
+
+    def invalidate(self, provider: Optional[str] = None):
+        """Drop cached answers for one provider, or all of them"""
+        with self._lock:
+            if provider is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(provider, None)
+            self._stats["invalidations"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": self._size(),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "threshold": self.threshold,
+            }
+
+
+answer_cache = SemanticAnswerCache()
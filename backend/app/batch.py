@@ -0,0 +1,154 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from app.answer_cache import answer_cache, context_fingerprint
+from app.context import context_assembler
+from app.llm.base import LLMProvider
+from app.schemas import BatchSearchRequest
+from app.workflows.base import WorkflowProvider
+from app.workflows.knowledge_provider import KnowledgeBaseWorkflowProvider
+from app.workflows.manager import WorkflowManager
+
+BATCH_RETRIEVAL_CONCURRENCY = int(os.getenv("BATCH_RETRIEVAL_CONCURRENCY", "8"))
+
+
+class BatchSearchRunner:
+    """Answer a list of queries, sharing work across them.
+
+    All queries are embedded in one model batch up front; the vectors serve
+    routing, knowledge base retrieval and answer cache lookups alike.
+    Retrieval then runs concurrently on pooled connections, at most
+    ``retrieval_concurrency`` queries at a time, and LLM calls at most
+    ``llm_concurrency`` at a time. Batch answers aren't added to
+    conversation history.
+    """
+
+    def __init__(
+        self,
+        workflow_manager: WorkflowManager,
+        knowledge_provider: KnowledgeBaseWorkflowProvider,
+        llm_provider: LLMProvider,
+        retrieval_concurrency: int = BATCH_RETRIEVAL_CONCURRENCY,
+    ):
+        self.workflow_manager = workflow_manager
+        self.knowledge_provider = knowledge_provider
+        self.llm_provider = llm_provider
+        self.retrieval_concurrency = retrieval_concurrency
+
+    async def plan(
+        self, queries: List[str], fan_out: bool = False
+    ) -> Tuple[List[WorkflowProvider], List[List[float]]]:
+        """Embed every query in one batch and route them by their vectors"""
+        vectors = await asyncio.to_thread(
+            self.knowledge_provider.embed_queries, queries
+        )
+        providers = await asyncio.gather(
+            *(
+                self.workflow_manager.get_provider(query, vector, fan_out)
+                for query, vector in zip(queries, vectors)
+            )
+        )
+        return list(providers), vectors
+
+    async def run(
+        self,
+        request: BatchSearchRequest,
+        providers: List[WorkflowProvider],
+        vectors: List[List[float]],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield results in query order, each once it and those before it are done"""
+        retrieval_slots = asyncio.Semaphore(self.retrieval_concurrency)
+        llm_slots = asyncio.Semaphore(request.llm_concurrency)
+        tasks = [
+            asyncio.create_task(
+                self._answer(
+                    index, query, provider, vector, request, retrieval_slots, llm_slots
+                )
+            )
+            for index, (query, provider, vector) in enumerate(
+                zip(request.queries, providers, vectors)
+            )
+        ]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            # The client may disconnect midway; don't keep answering
+            for task in tasks:
+                task.cancel()
+
+    async def _answer(
+        self,
+        index: int,
+        query: str,
+        provider: WorkflowProvider,
+        vector: List[float],
+        request: BatchSearchRequest,
+        retrieval_slots: asyncio.Semaphore,
+        llm_slots: asyncio.Semaphore,
+    ) -> Dict[str, Any]:
+        timings: Dict[str, float] = {}
+        provider_name = provider.get_capabilities()["name"]
+        try:
+            options = request.retrieval_options()
+            async with retrieval_slots:
+                started = time.perf_counter()
+                if isinstance(provider, KnowledgeBaseWorkflowProvider):
+                    context = await provider.get_context(
+                        query, options, query_vector=vector
+                    )
+                else:
+                    context = await provider.get_context(query, options)
+                result = await provider.handle_query(
+                    query, options=options, context=context
+                )
+                timings["retrieval_ms"] = (time.perf_counter() - started) * 1000
+
+            assembled = context_assembler.assemble(
+                result["context"], request.context_token_budget
+            )
+            use_cache = request.use_cache and answer_cache.enabled
+            answer = None
+            if use_cache:
+                fingerprint = context_fingerprint(assembled.chunks, result["prompt"])
+                answer = answer_cache.lookup(provider_name, vector, fingerprint)
+            cache_hit = answer is not None
+
+            if answer is None:
+                async with llm_slots:
+                    started = time.perf_counter()
+                    answer = await self.llm_provider.generate_response(
+                        query=query,
+                        context=assembled.chunks,
+                        system_prompt=result["prompt"],
+                        temperature=0.5,
+                    )
+                    timings["llm_ms"] = (time.perf_counter() - started) * 1000
+                if use_cache:
+                    answer_cache.store(
+                        provider_name, query, vector, fingerprint, answer
+                    )
+
+            context = result["context"]
+            return {
+                "index": index,
+                "query": query,
+                "answer": answer,
+                "provider": provider_name,
+                "source_links": (
+                    context.get("source_links", []) if isinstance(context, dict) else []
+                ),
+                "cache_hit": cache_hit,
+                "context_tokens": assembled.tokens,
+                "timings": timings,
+            }
+        except Exception as e:
+            # One bad query shouldn't sink the rest of the batch
+            return {
+                "index": index,
+                "query": query,
+                "provider": provider_name,
+                "error": str(e),
+                "timings": timings,
+            }
@@ -0,0 +1,89 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+
+
+class _Tokenizer:
+    """tiktoken when installed, otherwise a ~4 characters per token estimate"""
+
+    def __init__(self, encoding_name: str):
+        try:
+            import tiktoken
+
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            print(f"Warning: tiktoken unavailable ({e}), estimating token counts")
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            return text[: max_tokens * 4]
+        tokens = self._encoding.encode(text, disallowed_special=())
+        return self._encoding.decode(tokens[:max_tokens])
+
+
+@dataclass
+class AssembledContext:
+    chunks: List[str]
+    tokens: int
+    budget: int
+    dropped_chunks: int
+    truncated: bool
+
+
+class ContextAssembler:
+    """Build the LLM context from a provider's ranked ``context_chunks``.
+
+    Only the chunk text goes to the model - not source links, metadata or
+    raw API payloads that providers return alongside - and chunks are taken
+    in rank order until the token budget is spent. The chunk that crosses
+    the budget is cut to fit; everything after it is dropped.
+    """
+
+    def __init__(self, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.budget = budget
+        self.tokenizer = _Tokenizer(CONTEXT_TOKENIZER)
+
+    def assemble(self, context: Dict[str, Any], budget: int = None) -> AssembledContext:
+        budget = budget or self.budget
+        if isinstance(context, dict) and "context_chunks" in context:
+            chunks = [str(chunk) for chunk in context["context_chunks"]]
+        else:
+            chunks = [str(context)]
+
+        selected: List[str] = []
+        used = 0
+        truncated = False
+        for chunk in chunks:
+            tokens = self.tokenizer.count(chunk)
+            if used + tokens <= budget:
+                selected.append(chunk)
+                used += tokens
+                continue
+            remainder = self.tokenizer.truncate(chunk, budget - used)
+            if remainder:
+                selected.append(remainder)
+                used += self.tokenizer.count(remainder)
+                truncated = True
+            break
+
+        return AssembledContext(
+            chunks=selected,
+            tokens=used,
+            budget=budget,
+            dropped_chunks=len(chunks) - len(selected),
+            truncated=truncated,
+        )
+
+
+context_assembler = ContextAssembler()
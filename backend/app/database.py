@@ -1,10 +1,28 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON, Index, ForeignKey
+from sqlalchemy import (
+    create_engine,
+    Column,
+    Integer,
+    BigInteger,
+    Float,
+    LargeBinary,
+    String,
+    JSON,
+    Index,
+    ForeignKey,
+)
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from pgvector.sqlalchemy import Vector
+from typing import Dict, List, Optional
 import os
 import json
 import hashlib
+import itertools
+import threading
+import time
 
 # Database connection
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -12,9 +30,125 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set")
 
 
+# Optional comma-separated read replicas for search and other read-only traffic
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class ReplicaRouter:
+    """Round-robin routing of read-only sessions across read replicas.
+
+    A replica that raises a connection-level error is ejected for
+    ``eject_seconds`` and probed before it is used again. With no healthy
+    replica, reads fall back to the primary. Keys passed to
+    ``record_write`` stay pinned to the primary for ``sticky_seconds`` so
+    a client reading what it just wrote never sees replica lag.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replica_urls: List[str],
+        eject_seconds: float = 30.0,
+        sticky_seconds: float = 5.0,
+    ):
+        self.primary_session = sessionmaker(
+            autocommit=False, autoflush=False, bind=primary
+        )
+        self.eject_seconds = eject_seconds
+        self.sticky_seconds = sticky_seconds
+        self.replicas: List[Engine] = []
+        self._sessions: Dict[Engine, sessionmaker] = {}
+        self._ejected_until: Dict[Engine, float] = {}
+        self._recent_writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        for url in replica_urls:
+            replica = create_engine(url, pool_pre_ping=True)
+            event.listen(replica, "handle_error", self._on_error)
+            self.replicas.append(replica)
+            self._sessions[replica] = sessionmaker(
+                autocommit=False, autoflush=False, bind=replica
+            )
+        self._cycle = itertools.cycle(self.replicas)
+
+    def _on_error(self, context):
+        if context.is_disconnect or isinstance(
+            context.sqlalchemy_exception, OperationalError
+        ):
+            self.eject(context.engine)
+
+    def eject(self, replica: Engine):
+        """Take a replica out of rotation for ``eject_seconds``"""
+        with self._lock:
+            self._ejected_until[replica] = time.monotonic() + self.eject_seconds
+
+    def _probe(self, replica: Engine) -> bool:
+        try:
+            with replica.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def _next_replica(self) -> Optional[Engine]:
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+                ejected_until = self._ejected_until.get(replica)
+            if ejected_until is None:
+                return replica
+            if time.monotonic() < ejected_until:
+                continue
+            # Ejection expired: let it back in only if it answers
+            if self._probe(replica):
+                with self._lock:
+                    self._ejected_until.pop(replica, None)
+                return replica
+            self.eject(replica)
+        return None
+
+    def record_write(self, key: str):
+        """Pin reads for ``key`` to the primary while replicas catch up"""
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[key] = now + self.sticky_seconds
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {
+                    k: until for k, until in self._recent_writes.items() if until > now
+                }
+
+    def read_session(self, sticky_key: Optional[str] = None) -> Session:
+        """Open a session for read-only work, on a replica when possible"""
+        if sticky_key is not None:
+            until = self._recent_writes.get(sticky_key)
+            if until is not None and time.monotonic() < until:
+                return self.primary_session()
+
+        replica = self._next_replica() if self.replicas else None
+        if replica is None:
+            return self.primary_session()
+        return self._sessions[replica]()
+
+    def status(self) -> List[Dict[str, object]]:
+        now = time.monotonic()
+        return [
+            {
+                "replica": replica.url.render_as_string(hide_password=True),
+                "healthy": self._ejected_until.get(replica, 0) <= now,
+            }
+            for replica in self.replicas
+        ]
+
+
+replica_router = ReplicaRouter(engine, DATABASE_REPLICA_URLS)
+
 Base = declarative_base()
 
 
@@ -25,6 +159,18 @@ class BaseEmbedding(Base):
     text = Column(String, nullable=False)
     vector = Column(Vector)  # Dimension will be set in subclasses
     extra_metadata = Column(String, nullable=True)
+    text_hash = Column(String, unique=True, index=True)
+    source_document = Column(String, nullable=True)
+    # Position of the chunk within its source document, for neighbor lookups
+    chunk_index = Column(Integer, nullable=True)
+    # Set on near-duplicates, which are stored without a vector (see app.dedup)
+    canonical_id = Column(Integer, nullable=True)
+
+    def __init__(self, *args, **kwargs):
+        if "text" in kwargs and "text_hash" not in kwargs:
+            # Generate hash before calling parent constructor
+            kwargs["text_hash"] = hashlib.md5(kwargs["text"].encode()).hexdigest()
+        super().__init__(*args, **kwargs)
 
     def set_metadata(self, metadata_dict):
         """Convert metadata dict to JSON string for storage"""
@@ -35,23 +181,34 @@ class BaseEmbedding(Base):
         return json.loads(self.extra_metadata) if self.extra_metadata else None
 
 
+def _embedding_indexes(table_name):
+    """Indexes every embedding table needs besides the primary key.
+
+    An HNSW index matching the inner-product operator used by searches, and
+    (source_document, chunk_index) for fetching a chunk's neighbors.
+    """
+    return (
+        Index(
+            f"ix_{table_name}_vector_ip",
+            "vector",
+            postgresql_using="hnsw",
+            postgresql_ops={"vector": "vector_ip_ops"},
+        ),
+        Index(f"ix_{table_name}_document_position", "source_document", "chunk_index"),
+    )
+
+
 class ADAEmbedding(BaseEmbedding):
     __tablename__ = "embeddings_ada"
-    vector = Column(Vector(768))  # Specific dimension for ADA embeddings
+    __table_args__ = _embedding_indexes("embeddings_ada")
+    vector = Column(Vector(1536))  # Specific dimension for ADA embeddings
 
 
 class E5Embedding(BaseEmbedding):
     __tablename__ = "embeddings_e5"
+    __table_args__ = _embedding_indexes("embeddings_e5")
 
     vector = Column(Vector(384))  # Specific dimension for E5 embeddings
-    text_hash = Column(String, unique=True, index=True)
-    source_document = Column(String, nullable=True)
-
-    def __init__(self, *args, **kwargs):
-        if "text" in kwargs:
-            # Generate hash before calling parent constructor
-            kwargs["text_hash"] = hashlib.md5(kwargs["text"].encode()).hexdigest()
-        super().__init__(*args, **kwargs)
 
 
 class TestEmbedding(BaseEmbedding):
@@ -80,9 +237,129 @@ class Conversation(Base):
         return self.conversation_metadata
 
 
+class ConversationSummary(Base):
+    """Rolling summary of a conversation's older turns"""
+
+    __tablename__ = "conversation_summaries"
+
+    conversation_id = Column(String, primary_key=True)
+    summary = Column(String, nullable=False)
+    # Id of the newest Conversation row folded into the summary
+    last_turn_id = Column(Integer, nullable=False)
+    turns_summarized = Column(Integer, nullable=False, default=0)
+    updated_at = Column(String, nullable=False)
+
+
+class SystemSetting(Base):
+    """Small key/value table for runtime settings shared by all workers"""
+
+    __tablename__ = "system_settings"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=True)
+
+
+class CorpusStat(Base):
+    """Chunk counts per embedding table, kept up to date during ingestion.
+
+    ``dimension`` is "total", "type" or "source_document"; ``key`` is the
+    type or document name ("" for the total).
+    """
+
+    __tablename__ = "corpus_stats"
+
+    table_name = Column(String, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    chunk_count = Column(Integer, nullable=False, default=0)
+
+
+class LLMCompletionCache(Base):
+    """Second-tier cache of LLM completions, keyed by a hash of the request"""
+
+    __tablename__ = "llm_completion_cache"
+
+    key = Column(String, primary_key=True)
+    model = Column(String, nullable=True)
+    response = Column(String, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+
+class ChunkMinHash(Base):
+    """MinHash signature of a chunk, for near-duplicate detection at ingest"""
+
+    __tablename__ = "chunk_minhashes"
+
+    table_name = Column(String, primary_key=True)
+    chunk_id = Column(Integer, primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+
+
+class ChunkLSHBucket(Base):
+    """LSH band buckets of canonical chunks; a shared bucket makes a candidate"""
+
+    __tablename__ = "chunk_lsh_buckets"
+    __table_args__ = (Index("ix_chunk_lsh_buckets_chunk", "table_name", "chunk_id"),)
+
+    table_name = Column(String, primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    chunk_id = Column(Integer, primary_key=True)
+
+
+# Columns added to the embedding tables after their first release, and
+# indexes over them; create_all only creates tables that don't exist yet
+EMBEDDING_COLUMN_UPGRADES = [("chunk_index", "integer"), ("canonical_id", "integer")]
+EMBEDDING_INDEX_UPGRADES = {"document_position": "(source_document, chunk_index)"}
+
+
+def upgrade_embedding_tables(bind: Engine):
+    """Add the columns and indexes an existing embedding table is missing.
+
+    Idempotent, and run at startup on the primary and every shard, so an
+    upgraded deployment can query right away. Indexes are built
+    CONCURRENTLY to keep ingestion running; backfilling the new columns is
+    left to the scripts in ``app.migrations``.
+    """
+    if bind.dialect.name != "postgresql":
+        return
+    tables = [model.__tablename__ for model in BaseEmbedding.__subclasses__()]
+    try:
+        with bind.begin() as conn:
+            for table in tables:
+                for column, column_type in EMBEDDING_COLUMN_UPGRADES:
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table} "
+                            f"ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                        )
+                    )
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in tables:
+                for suffix, columns in EMBEDDING_INDEX_UPGRADES.items():
+                    conn.execute(
+                        text(
+                            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                            f"ix_{table}_{suffix} ON {table} {columns}"
+                        )
+                    )
+    except Exception as e:
+        # Another worker starting at the same time may be running the same DDL
+        print(f"Warning: could not upgrade embedding tables on {bind.url}: {e}")
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session for read-only endpoints, routed to a replica when configured"""
+    db = replica_router.read_session()
+    try:
+        yield db
+    finally:
+        db.close()
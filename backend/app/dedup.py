@@ -0,0 +1,276 @@
+import hashlib
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+import numpy as np
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import BaseEmbedding, ChunkLSHBucket, ChunkMinHash
+
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+# "link" stores the duplicate without a vector, "skip" drops it, "off" disables
+NEAR_DUP_ACTION = os.getenv("NEAR_DUP_ACTION", "link").lower()
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "5"))
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) with the fewest missed duplicates and spurious candidates.
+
+    Candidates are verified against their signatures afterwards, so a false
+    positive only costs a comparison while a false negative lets a duplicate
+    through; misses are weighted accordingly.
+    """
+    s = np.linspace(0.0, 1.0, 201)
+    below = s < threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        # Probability that a pair with Jaccard similarity s shares a bucket
+        candidate = 1 - (1 - s**rows) ** bands
+        error = 0.1 * candidate[below].sum() + 0.9 * (1 - candidate[~below]).sum()
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHasher:
+    """MinHash signatures over word shingles.
+
+    Text is lowercased and reduced to its words first, so chunks differing only
+    in whitespace, punctuation or case get identical signatures.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = NEAR_DUP_NUM_PERM,
+        shingle_size: int = NEAR_DUP_SHINGLE_SIZE,
+        seed: int = 1,
+    ):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, (1 << 61) - 1, num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, (1 << 61) - 1, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        k = self.shingle_size
+        grams = (
+            {" ".join(words[i : i + k]) for i in range(len(words) - k + 1)}
+            if len(words) > k
+            else {" ".join(words)}
+        )
+        return np.fromiter(
+            (zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        with np.errstate(over="ignore"):
+            permuted = (
+                (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME
+            ) & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of the chunks in each embedding table.
+
+    Signatures are split into bands and every band is hashed into
+    ``chunk_lsh_buckets``; chunks sharing a bucket are candidates, and a
+    candidate counts as a duplicate when the estimated Jaccard similarity of
+    the signatures reaches ``threshold``. Only canonical chunks are bucketed,
+    so every duplicate resolves to an original rather than to another copy.
+    The tables live next to the chunks, so in sharded mode duplicates are
+    found within a shard.
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUP_THRESHOLD,
+        action: str = NEAR_DUP_ACTION,
+        hasher: Optional[MinHasher] = None,
+    ):
+        if action not in ("link", "skip", "off"):
+            raise ValueError(f"Unknown near-duplicate action: {action}")
+        self.threshold = threshold
+        self.action = action
+        self.hasher = hasher or MinHasher()
+        self.bands, self.rows = lsh_parameters(threshold, self.hasher.num_perm)
+
+    @property
+    def enabled(self) -> bool:
+        return self.action != "off"
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(text)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows : (band + 1) * self.rows]
+            digest = hashlib.md5(chunk.tobytes()).digest()[:8]
+            keys.append((band, int.from_bytes(digest, "big", signed=True)))
+        return keys
+
+    def find(
+        self, db: Session, table: Type[BaseEmbedding], signature: np.ndarray
+    ) -> Optional[Tuple[int, float]]:
+        """(chunk id, estimated Jaccard) of the closest canonical duplicate"""
+        table_name = table.__tablename__
+        candidates = [
+            chunk_id
+            for (chunk_id,) in db.query(ChunkLSHBucket.chunk_id)
+            .filter(
+                ChunkLSHBucket.table_name == table_name,
+                tuple_(ChunkLSHBucket.band, ChunkLSHBucket.bucket).in_(
+                    self._band_keys(signature)
+                ),
+            )
+            .distinct()
+        ]
+        if not candidates:
+            return None
+
+        rows = db.query(ChunkMinHash.chunk_id, ChunkMinHash.signature).filter(
+            ChunkMinHash.table_name == table_name,
+            ChunkMinHash.chunk_id.in_(candidates),
+        )
+        best = None
+        for chunk_id, stored in rows:
+            similarity = float(
+                np.mean(np.frombuffer(stored, dtype=np.uint64) == signature)
+            )
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (chunk_id, similarity)
+        return best
+
+    def add(
+        self,
+        db: Session,
+        table: Type[BaseEmbedding],
+        chunk_id: int,
+        signature: np.ndarray,
+        canonical: bool = True,
+    ):
+        """Index a flushed chunk. Doesn't commit."""
+        table_name = table.__tablename__
+        db.execute(
+            insert(ChunkMinHash)
+            .values(
+                table_name=table_name,
+                chunk_id=chunk_id,
+                signature=signature.astype(np.uint64).tobytes(),
+            )
+            .on_conflict_do_nothing()
+        )
+        if canonical:
+            self._bucket(db, table_name, chunk_id, signature)
+
+    def _bucket(self, db: Session, table_name: str, chunk_id: int, signature):
+        db.execute(
+            insert(ChunkLSHBucket)
+            .values(
+                [
+                    {
+                        "table_name": table_name,
+                        "band": band,
+                        "bucket": bucket,
+                        "chunk_id": chunk_id,
+                    }
+                    for band, bucket in self._band_keys(signature)
+                ]
+            )
+            .on_conflict_do_nothing()
+        )
+
+    def remove(
+        self, db: Session, table: Type[BaseEmbedding], chunks: Iterable[BaseEmbedding]
+    ):
+        """Unindex chunks that are about to be deleted. Doesn't commit.
+
+        Linked duplicates of a deleted canonical chunk that survive are
+        promoted: the first becomes canonical, inheriting the vector, and the
+        rest are re-linked to it.
+        """
+        table_name = table.__tablename__
+        removed = {chunk.id: chunk for chunk in chunks}
+        if not removed:
+            return
+
+        orphans: Dict[int, List[BaseEmbedding]] = defaultdict(list)
+        for row in (
+            db.query(table)
+            .filter(table.canonical_id.in_(removed), ~table.id.in_(removed))
+            .order_by(table.id)
+        ):
+            orphans[row.canonical_id].append(row)
+
+        for canonical_id, linked in orphans.items():
+            heir, rest = linked[0], linked[1:]
+            heir.vector = removed[canonical_id].vector
+            heir.canonical_id = None
+            for row in rest:
+                row.canonical_id = heir.id
+            stored = db.get(ChunkMinHash, (table_name, heir.id))
+            signature = (
+                np.frombuffer(stored.signature, dtype=np.uint64)
+                if stored
+                else self.signature(heir.text)
+            )
+            self.add(db, table, heir.id, signature)
+
+        for model in (ChunkLSHBucket, ChunkMinHash):
+            db.query(model).filter(
+                model.table_name == table_name, model.chunk_id.in_(removed)
+            ).delete(synchronize_session=False)
+
+    def copy(
+        self,
+        db: Session,
+        source: Type[BaseEmbedding],
+        target: Type[BaseEmbedding],
+        id_map: Dict[int, int],
+    ):
+        """Carry signatures over to another table, e.g. when re-embedding"""
+        if not id_map:
+            return
+        rows = (
+            db.query(ChunkMinHash.chunk_id, ChunkMinHash.signature)
+            .filter(
+                ChunkMinHash.table_name == source.__tablename__,
+                ChunkMinHash.chunk_id.in_(id_map),
+            )
+            .all()
+        )
+        canonical = {
+            chunk_id
+            for (chunk_id,) in db.query(target.id).filter(
+                target.id.in_(id_map.values()), target.canonical_id.is_(None)
+            )
+        }
+        for chunk_id, stored in rows:
+            new_id = id_map[chunk_id]
+            self.add(
+                db,
+                target,
+                new_id,
+                np.frombuffer(stored, dtype=np.uint64),
+                canonical=new_id in canonical,
+            )
+
+    def reset(self, db: Session, table: Type[BaseEmbedding]):
+        """Drop the index of a table, e.g. after deleting all its rows"""
+        for model in (ChunkLSHBucket, ChunkMinHash):
+            db.query(model).filter(model.table_name == table.__tablename__).delete()
+
+
+near_duplicates = NearDuplicateIndex()
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+import numpy as np
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Type
+from sqlalchemy.orm import Session
+from app.database import BaseEmbedding, E5Embedding, ADAEmbedding, SystemSetting
+
+ACTIVE_MODEL_KEY = "active_embedding_model"
+# Seconds a worker may go on using the active model it last read; a cutover
+# reaches every worker within this long
+ACTIVE_MODEL_MAX_AGE = float(os.getenv("ACTIVE_MODEL_MAX_AGE", "30"))
+
+
+def normalize_vector(vector) -> List[float]:
+    """Scale a vector to unit L2 length.
+
+    On unit vectors inner product ranks exactly like cosine similarity, so
+    searches can use pgvector's cheaper ``<#>`` operator.
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    if norm == 0:
+        return array.tolist()
+    return (array / norm).tolist()
+
+
+def _load_e5_small():
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    return HuggingFaceEmbedding(model_name="intfloat/e5-small-v2")
+
+
+def _load_ada():
+    from llama_index.embeddings.openai import OpenAIEmbedding
+
+    return OpenAIEmbedding(
+        model="text-embedding-ada-002", api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+
+@dataclass(frozen=True)
+class EmbeddingModelSpec:
+    """Describes an embedding model and the table its vectors live in"""
+
+    name: str
+    table: Type[BaseEmbedding]
+    loader: Callable[[], Any]
+
+    @property
+    def dimension(self) -> int:
+        return self.table.__table__.c.vector.type.dim
+
+    @property
+    def table_name(self) -> str:
+        return self.table.__tablename__
+
+
+class EmbeddingModelRegistry:
+    """Maps embedding models to their tables and tracks the active model.
+
+    The active model decides which table searches read from and ingestion
+    writes to. It is persisted in ``system_settings`` so a cutover made by
+    one worker is picked up by the others on their next refresh.
+    """
+
+    def __init__(self, default_model: str):
+        self._specs: Dict[str, EmbeddingModelSpec] = {}
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._active_name = default_model
+        self._loaded_at = 0.0
+
+    def register(self, spec: EmbeddingModelSpec):
+        """Register an embedding model"""
+        self._specs[spec.name] = spec
+
+    def get(self, name: str) -> EmbeddingModelSpec:
+        """Get a registered model spec by name"""
+        if name not in self._specs:
+            raise ValueError(f"Unknown embedding model: {name}")
+        return self._specs[name]
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        """Describe every registered model"""
+        return [
+            {
+                "name": spec.name,
+                "table": spec.table_name,
+                "dimension": spec.dimension,
+                "active": spec.name == self._active_name,
+            }
+            for spec in self._specs.values()
+        ]
+
+    def active(self) -> EmbeddingModelSpec:
+        """Get the spec of the model currently serving searches"""
+        return self.get(self._active_name)
+
+    def get_embed_model(self, name: Optional[str] = None):
+        """Get the (lazily loaded) embedding model for a registered spec"""
+        spec = self.get(name) if name else self.active()
+        model = self._models.get(spec.name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(spec.name)
+                if model is None:
+                    model = spec.loader()
+                    self._models[spec.name] = model
+        return model
+
+    def embed(self, text: str, name: Optional[str] = None) -> List[float]:
+        """Embed a single text with the given (or active) model, unit-normalized"""
+        return normalize_vector(self.get_embed_model(name).get_text_embedding(text))
+
+    def embed_batch(
+        self, texts: List[str], name: Optional[str] = None
+    ) -> List[List[float]]:
+        """Embed several texts in one model call, unit-normalized"""
+        vectors = np.asarray(
+            self.get_embed_model(name).get_text_embedding_batch(texts),
+            dtype=np.float32,
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+    def load_active(self, db: Session, max_age: float = 0.0) -> EmbeddingModelSpec:
+        """Refresh the active model from the settings table.
+
+        With ``max_age`` set, the settings table is only re-read once the
+        cached value is older than that many seconds.
+        """
+        if max_age and time.monotonic() - self._loaded_at < max_age:
+            return self.active()
+
+        setting = db.get(SystemSetting, ACTIVE_MODEL_KEY, populate_existing=True)
+        if setting and setting.value in self._specs:
+            self._active_name = setting.value
+        self._loaded_at = time.monotonic()
+        return self.active()
+
+    def set_active(self, name: str, db: Session) -> EmbeddingModelSpec:
+        """Atomically switch searches and ingestion to another model"""
+        spec = self.get(name)
+        setting = db.get(SystemSetting, ACTIVE_MODEL_KEY)
+        if setting is None:
+            db.add(SystemSetting(key=ACTIVE_MODEL_KEY, value=name))
+        else:
+            setting.value = name
+        db.commit()
+        self._loaded_at = time.monotonic()
+        # Single reference swap, so in-flight requests see either model, never a mix
+        self._active_name = name
+        return spec
+
+
+embedding_registry = EmbeddingModelRegistry(
+    default_model=os.getenv("EMBEDDING_MODEL", "e5-small-v2")
+)
+embedding_registry.register(
+    EmbeddingModelSpec(name="e5-small-v2", table=E5Embedding, loader=_load_e5_small)
+)
+embedding_registry.register(
+    EmbeddingModelSpec(name="ada-002", table=ADAEmbedding, loader=_load_ada)
+)
@@ -1,24 +1,41 @@
 import os
-from typing import List
+from typing import AsyncIterator, List
+import httpx
 from openai import AsyncOpenAI
 from .base import LLMProvider
+from .client import LLMProviderError, deployment_gate, shared_http_client
 
 
 class AzureOpenAIProvider(LLMProvider):
     """Azure OpenAI implementation of the LLM provider."""
 
-    def __init__(self, model: str = "gpt-35-turbo"):
+    def __init__(
+        self,
+        model: str = "gpt-35-turbo",
+        api_key: str = None,
+        endpoint: str = None,
+        api_version: str = None,
+        deployment: str = None,
+    ):
         """
         Initialize the Azure OpenAI provider.
 
+        Settings not passed in are read from the AZURE_OPENAI_* environment.
+
         Args:
             model: The Azure OpenAI model to use (e.g., "gpt-35-turbo", "gpt-4")
+            api_key: API key of the Azure OpenAI resource
+            endpoint: Resource endpoint, e.g. "https://my-resource.openai.azure.com"
+            api_version: Azure OpenAI API version
+            deployment: Deployment name; defaults to AZURE_OPENAI_MODEL or model
         """
         # Load configuration
-        api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
-        deployment_name = os.getenv("AZURE_OPENAI_MODEL", model)
+        api_key = api_key or os.getenv("AZURE_OPENAI_API_KEY")
+        endpoint = (endpoint or os.getenv("AZURE_OPENAI_ENDPOINT", "")).rstrip("/")
+        api_version = api_version or os.getenv(
+            "AZURE_OPENAI_API_VERSION", "2025-01-01-preview"
+        )
+        deployment_name = deployment or os.getenv("AZURE_OPENAI_MODEL", model)
 
         if not all([api_key, endpoint, deployment_name]):
             raise ValueError("Missing required Azure OpenAI environment variables.")
@@ -30,9 +47,14 @@ class AzureOpenAIProvider(LLMProvider):
             api_key=api_key,
             base_url=base_url,
             default_query={"api-version": api_version},
+            http_client=shared_http_client(),
+            # Retries are handled by the deployment gate, not the SDK
+            max_retries=0,
         )
 
+        self.endpoint = endpoint
         self.model = deployment_name  # Ensure model matches deployment name
+        self.gate = deployment_gate(f"azure:{base_url}")
 
     async def generate_response(
         self,
@@ -55,26 +77,53 @@ class AzureOpenAIProvider(LLMProvider):
         Returns:
             str: The generated response
         """
-        # Combine context into a single string
-        context_text = "\n\n".join(context)
-
-        # Prepare messages
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-
-        messages.append({"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {query}"})
+        messages = self._build_messages(query, context, system_prompt)
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
+            response = await self.gate.call(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
             )
             return response.choices[0].message.content
         except Exception as e:
-            raise Exception(f"Error generating response from Azure OpenAI: {str(e)}")
+            raise LLMProviderError(
+                f"Error generating response from Azure OpenAI: {str(e)}",
+                status_code=getattr(e, "status_code", None),
+            ) from e
+
+    async def stream_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> AsyncIterator[str]:
+        """Stream the response token by token from Azure OpenAI's API."""
+        messages = self._build_messages(query, context, system_prompt)
+        try:
+            stream = self.gate.stream(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                )
+            )
+            async for chunk in stream:
+                # Some chunks (e.g. content filter results) carry no text
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise LLMProviderError(
+                f"Error streaming response from Azure OpenAI: {str(e)}",
+                status_code=getattr(e, "status_code", None),
+            ) from e
 
     async def health_check(self) -> bool:
         """
@@ -84,12 +133,11 @@ class AzureOpenAIProvider(LLMProvider):
             bool: True if the API is accessible, False otherwise
         """
         try:
-            # Try a simple completion to check API access
-            await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1,
+            # List the resource's models: authenticated, but no tokens spent
+            await self.client.get(
+                f"{self.endpoint}/openai/models", cast_to=httpx.Response
             )
             return True
-        except Exception:
-            return False
+        except Exception as e:
+            # Rate limited is still up; the deployment gate waits out the 429
+            return getattr(e, "status_code", None) == 429
@@ -1,10 +1,28 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    def _build_messages(
+        self, query: str, context: List[str], system_prompt: str = None
+    ) -> List[dict]:
+        """Chat messages carrying the system prompt, context and question"""
+        # Combine context into a single string
+        context_text = "\n\n".join(context)
+
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append(
+            {
+                "role": "user",
+                "content": f"Context:\n{context_text}\n\nQuestion: {query}",
+            }
+        )
+        return messages
+
     @abstractmethod
     async def generate_response(
         self,
@@ -29,6 +47,37 @@ class LLMProvider(ABC):
         """
         pass
 
+    async def stream_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response as it is generated.
+
+        Providers without native streaming yield the complete response once.
+
+        Args:
+            query: The user's question
+            context: List of relevant text chunks from the vector store
+            system_prompt: Optional system prompt to guide the model's behavior
+            temperature: Controls randomness in the output (0.0 to 1.0)
+            max_tokens: Maximum number of tokens to generate
+
+        Yields:
+            str: Successive pieces of the generated response
+        """
+        yield await self.generate_response(
+            query=query,
+            context=context,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+
     @abstractmethod
     async def health_check(self) -> bool:
         """
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+from sqlalchemy.dialects.postgresql import insert
+from .base import LLMProvider
+from ..database import SessionLocal, LLMCompletionCache
+
+# Set per request (see the middleware in main.py) to skip the cache
+cache_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+BYPASS_HEADER = "x-llm-cache"
+
+
+class CachedLLMProvider(LLMProvider):
+    """Exact-match completion cache in front of any LLM provider.
+
+    Requests are keyed by a hash of the model and every generation argument.
+    Lookups go to an in-memory LRU first and then to the
+    ``llm_completion_cache`` table, which survives restarts and is shared by
+    all workers. With ``cache_bypass`` set, the wrapped provider is called
+    and the fresh answer overwrites the cached one. Writes purge the table
+    at most every ``purge_interval`` seconds: rows older than the TTL go,
+    then the oldest rows beyond ``max_database_rows``.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        max_memory_entries: int = 1000,
+        ttl_seconds: Optional[float] = None,
+        use_database: bool = True,
+        max_database_rows: Optional[int] = 100000,
+        purge_interval: float = 300.0,
+    ):
+        self.provider = provider
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_database = use_database
+        self.max_database_rows = max_database_rows
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self.model = getattr(provider, "model", type(provider).__name__)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            "memory_hits": 0,
+            "database_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "purged": 0,
+        }
+
+    def cache_key(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: Optional[str],
+        temperature: float,
+        max_tokens: int,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "provider": type(self.provider).__name__,
+                "model": self.model,
+                "system_prompt": system_prompt,
+                "context": context,
+                "query": query,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _fresh(self, created_at: float) -> bool:
+        return self.ttl_seconds is None or time.time() - created_at < self.ttl_seconds
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[tuple]:
+        db = SessionLocal()
+        try:
+            row = db.get(LLMCompletionCache, key)
+            return (row.response, row.created_at) if row else None
+        finally:
+            db.close()
+
+    def _save(self, key: str, response: str, created_at: float):
+        db = SessionLocal()
+        try:
+            stmt = insert(LLMCompletionCache).values(
+                key=key, model=self.model, response=response, created_at=created_at
+            )
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["key"],
+                    set_={"response": response, "created_at": created_at},
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _purge(self) -> int:
+        """Delete expired rows, then the oldest ones over the row cap"""
+        db = SessionLocal()
+        try:
+            purged = 0
+            if self.ttl_seconds is not None:
+                purged += (
+                    db.query(LLMCompletionCache)
+                    .filter(
+                        LLMCompletionCache.created_at < time.time() - self.ttl_seconds
+                    )
+                    .delete(synchronize_session=False)
+                )
+            if self.max_database_rows is not None:
+                cutoff = (
+                    db.query(LLMCompletionCache.created_at)
+                    .order_by(LLMCompletionCache.created_at.desc())
+                    .offset(self.max_database_rows)
+                    .limit(1)
+                    .scalar()
+                )
+                if cutoff is not None:
+                    purged += (
+                        db.query(LLMCompletionCache)
+                        .filter(LLMCompletionCache.created_at <= cutoff)
+                        .delete(synchronize_session=False)
+                    )
+            db.commit()
+            return purged
+        finally:
+            db.close()
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        if cache_bypass.get():
+            self._stats["bypassed"] += 1
+            return None
+
+        cached = self._memory.get(key)
+        if cached and self._fresh(cached[1]):
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return cached[0]
+
+        if self.use_database:
+            try:
+                cached = await asyncio.to_thread(self._load, key)
+            except Exception as e:
+                print(f"Warning: LLM cache lookup failed: {e}")
+                cached = None
+            if cached and self._fresh(cached[1]):
+                self._remember(key, *cached)
+                self._stats["database_hits"] += 1
+                return cached[0]
+
+        self._stats["misses"] += 1
+        return None
+
+    async def _store(self, key: str, response: str):
+        created_at = time.time()
+        self._remember(key, response, created_at)
+        if self.use_database:
+            try:
+                await asyncio.to_thread(self._save, key, response, created_at)
+            except Exception as e:
+                # The cache must never fail a request that already has its answer
+                print(f"Warning: LLM cache write failed: {e}")
+            if created_at - self._last_purge >= self.purge_interval:
+                self._last_purge = created_at
+                try:
+                    self._stats["purged"] += await asyncio.to_thread(self._purge)
+                except Exception as e:
+                    print(f"Warning: LLM cache purge failed: {e}")
+
+    async def generate_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> str:
+        """Return the cached completion for identical requests, else generate one"""
+        key = self.cache_key(query, context, system_prompt, temperature, max_tokens)
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+
+        response = await self.provider.generate_response(
+            query=query,
+            context=context,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        await self._store(key, response)
+        return response
+
+    async def stream_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> AsyncIterator[str]:
+        """Replay a cached completion in one piece, else stream and cache it"""
+        key = self.cache_key(query, context, system_prompt, temperature, max_tokens)
+        cached = await self._lookup(key)
+        if cached is not None:
+            yield cached
+            return
+
+        pieces = []
+        async for piece in self.provider.stream_response(
+            query=query,
+            context=context,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        ):
+            pieces.append(piece)
+            yield piece
+        # Only completed streams are cached, never an answer cut off midway
+        await self._store(key, "".join(pieces))
+
+    async def health_check(self) -> bool:
+        return await self.provider.health_check()
+
+    def clear(self):
+        """Empty both cache tiers"""
+        self._memory.clear()
+        if self.use_database:
+            db = SessionLocal()
+            try:
+                db.query(LLMCompletionCache).delete()
+                db.commit()
+            finally:
+                db.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = (
+            self._stats["memory_hits"]
+            + self._stats["database_hits"]
+            + self._stats["misses"]
+        )
+        hits = self._stats["memory_hits"] + self._stats["database_hits"]
+        return {
+            **self._stats,
+            "memory_entries": len(self._memory),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
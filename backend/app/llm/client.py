@@ -0,0 +1,263 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+import openai
+from ..retry import retry_after_seconds
+from .latency import LatencyWindow
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Give up instead of waiting when the server asks for a longer pause
+LLM_RETRY_AFTER_MAX = float(os.getenv("LLM_RETRY_AFTER_MAX", "60"))
+# e.g. 95: send a second request when the first is slower than p95; unset disables
+LLM_HEDGE_PERCENTILE = (
+    float(os.getenv("LLM_HEDGE_PERCENTILE"))
+    if os.getenv("LLM_HEDGE_PERCENTILE")
+    else None
+)
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+T = TypeVar("T")
+
+_http_client: Optional[openai.DefaultAsyncHttpxClient] = None
+
+
+def shared_http_client() -> openai.DefaultAsyncHttpxClient:
+    """Connection pool shared by every LLM client in the process"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        # Build limits and timeouts from the types the SDK itself uses
+        limits_type = type(openai.DEFAULT_CONNECTION_LIMITS)
+        _http_client = openai.DefaultAsyncHttpxClient(
+            limits=limits_type(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=30,
+            ),
+            timeout=openai.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class LLMProviderError(Exception):
+    """An LLM request that failed for good, after any retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+
+class DeploymentGate:
+    """Concurrency limit, retries and hedging for requests to one deployment.
+
+    At most ``max_concurrency`` requests are in flight at once. Retryable
+    failures (429, 5xx, timeouts, connection errors) are retried with full
+    jitter exponential backoff, or after exactly as long as a ``Retry-After``
+    header asks - and a 429 pauses every request to the deployment, not just
+    the one that got it. With ``hedge_percentile`` set, a request still
+    running past that percentile of recent latencies gets a duplicate, and
+    the first answer wins; duplicates are only sent while the gate has spare
+    capacity, so hedging never pushes the deployment past its limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        retry_after_max: float = LLM_RETRY_AFTER_MAX,
+        hedge_percentile: Optional[float] = LLM_HEDGE_PERCENTILE,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyWindow()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    @property
+    def paused(self) -> bool:
+        """Whether a rate limit pause is holding requests back"""
+        return self._paused_until > time.monotonic()
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up"""
+        if not _retryable(error) or attempt >= self.max_retries:
+            return None
+        retry_after = retry_after_seconds(error)
+        if getattr(error, "status_code", None) == 429:
+            self._stats["rate_limited"] += 1
+            pause = retry_after if retry_after is not None else self.backoff_base
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.retry_after_max else None
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _acquire(self):
+        await self._semaphore.acquire()
+        try:
+            # Respect a rate limit pause that started while we were queued
+            while (wait := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self._in_flight += 1
+
+    def _release(self):
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def _attempt(self, request: Callable[[], Awaitable[T]]) -> T:
+        await self._acquire()
+        try:
+            started = time.perf_counter()
+            result = await request()
+            self.latency.record((time.perf_counter() - started) * 1000)
+            return result
+        finally:
+            self._release()
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile) / 1000
+
+    async def _hedged(self, request: Callable[[], Awaitable[T]]) -> T:
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(self._attempt(request))
+        backup = None
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or self._in_flight >= self.max_concurrency:
+                return await primary
+
+            self._stats["hedges"] += 1
+            backup = asyncio.ensure_future(self._attempt(request))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+            raise primary.exception()
+        finally:
+            # The loser, or both if the caller gave up
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def call(self, request: Callable[[], Awaitable[T]]) -> T:
+        """Run ``request`` (a zero-argument coroutine factory) resiliently"""
+        self._stats["requests"] += 1
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(request)
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._stats["failures"] += 1
+                    raise
+                self._stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def stream(self, request: Callable[[], Awaitable[Any]]) -> AsyncIterator[Any]:
+        """Open a stream with retries and iterate it within a concurrency slot.
+
+        Only opening the stream is retried; a stream that fails midway has
+        already sent tokens to the caller. Streams aren't hedged and don't
+        count towards the latency percentiles.
+        """
+        self._stats["requests"] += 1
+        attempt = 0
+        while True:
+            await self._acquire()
+            try:
+                stream = await request()
+            except Exception as e:
+                self._release()
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._stats["failures"] += 1
+                    raise
+                self._stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                self._release()
+            return
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "paused_for_s": max(0.0, self._paused_until - time.monotonic()),
+            "latency": self.latency.summary(),
+        }
+
+
+_gates: Dict[str, DeploymentGate] = {}
+
+
+def deployment_gate(name: str) -> DeploymentGate:
+    """The gate of a deployment, shared by all providers that call it"""
+    if name not in _gates:
+        _gates[name] = DeploymentGate(name)
+    return _gates[name]
+
+
+def gate_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: gate.metrics() for name, gate in _gates.items()}
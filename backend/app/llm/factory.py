@@ -1,8 +1,10 @@
-from typing import Dict, Type, Any
+from typing import Any, Dict, List, Type
 from .base import LLMProvider
 from .openai_provider import OpenAIProvider
 from .azure_provider import AzureOpenAIProvider
 from .mock_provider import MockLLMProvider
+from .router import Backend, RoutingLLMProvider
+import json
 import os
 
 
@@ -40,9 +42,40 @@ class LLMFactory:
                 return MockLLMProvider()
         elif provider_type == "mock":
             return MockLLMProvider()
+        elif provider_type == "router":
+            return cls.create_router(**kwargs)
+        elif provider_type in cls._providers:
+            return cls._providers[provider_type](**kwargs)
         else:
             raise ValueError(f"Unknown provider type: {provider_type}")
 
+    @classmethod
+    def create_router(cls, backends: List[Dict[str, Any]] = None) -> LLMProvider:
+        """
+        Create a routing provider over several deployments.
+
+        Args:
+            backends: One dict per deployment with "type" (a registered
+                provider), optional "name" and "weight", and the remaining keys
+                passed to the provider's constructor. Read from the
+                LLM_BACKENDS environment variable (JSON) when not given.
+
+        Returns:
+            RoutingLLMProvider: Provider routing across the backends
+        """
+        if backends is None:
+            backends = json.loads(os.getenv("LLM_BACKENDS", "[]"))
+        routed = []
+        for i, config in enumerate(backends):
+            config = dict(config)
+            provider_type = config.pop("type")
+            name = config.pop("name", f"{provider_type}-{i}")
+            weight = float(config.pop("weight", 1.0))
+            routed.append(
+                Backend(name, cls._providers[provider_type](**config), weight)
+            )
+        return RoutingLLMProvider(routed)
+
     @classmethod
     def register_provider(cls, name: str, provider_class: Type[LLMProvider]):
         """
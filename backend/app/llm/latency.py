@@ -0,0 +1,39 @@
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+import numpy as np
+
+
+class LatencyWindow:
+    """Rolling window of the most recent latency samples, in milliseconds"""
+
+    def __init__(self, size: int = 500):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, ms: float):
+        with self._lock:
+            self._samples.append(ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The ``q``-th percentile (0-100) of the window, None while empty"""
+        with self._lock:
+            if not self._samples:
+                return None
+            return float(np.percentile(np.fromiter(self._samples, float), q))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = np.fromiter(self._samples, float)
+        if not samples.size:
+            return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": int(samples.size),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
@@ -14,7 +14,9 @@ class MockLLMProvider(LLMProvider):
         max_tokens: int = 500,
     ) -> str:
         """Generate a mock response based on the query type"""
-        if context and any("organization" in str(c) for c in context):
+        if context and any(
+            "organization" in str(c) or "Device:" in str(c) for c in context
+        ):
             return (
                 "Based on the network configuration data:\n\n"
                 "Organization: Big Data Org (UID: 1234)\n"
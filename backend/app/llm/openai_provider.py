@@ -1,21 +1,34 @@
 import os
-from typing import List
+from typing import AsyncIterator, List
 from openai import AsyncOpenAI
 from .base import LLMProvider
+from .client import LLMProviderError, deployment_gate, shared_http_client
 
 
 class OpenAIProvider(LLMProvider):
     """OpenAI implementation of the LLM provider."""
 
-    def __init__(self, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self, model: str = "gpt-3.5-turbo", api_key: str = None, base_url: str = None
+    ):
         """
         Initialize the OpenAI provider.
 
         Args:
             model: The OpenAI model to use (e.g., "gpt-3.5-turbo", "gpt-4")
+            api_key: API key; defaults to OPENAI_API_KEY
+            base_url: Any OpenAI-compatible endpoint; defaults to OPENAI_BASE_URL
+                or the OpenAI API
         """
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Retries are handled by the deployment gate, not the SDK
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL"),
+            http_client=shared_http_client(),
+            max_retries=0,
+        )
         self.model = model
+        self.gate = deployment_gate(f"openai:{self.client.base_url}:{model}")
 
     async def generate_response(
         self,
@@ -38,34 +51,53 @@ class OpenAIProvider(LLMProvider):
         Returns:
             str: The generated response
         """
-        # Combine context into a single string
-        context_text = "\n\n".join(context)
-
-        # Prepare messages
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-
-        # Add context and query
-        messages.extend(
-            [
-                {
-                    "role": "user",
-                    "content": f"Context:\n{context_text}\n\nQuestion: {query}",
-                }
-            ]
-        )
+        messages = self._build_messages(query, context, system_prompt)
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
+            response = await self.gate.call(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
             )
             return response.choices[0].message.content
         except Exception as e:
-            raise Exception(f"Error generating response from OpenAI: {str(e)}")
+            raise LLMProviderError(
+                f"Error generating response from OpenAI: {str(e)}",
+                status_code=getattr(e, "status_code", None),
+            ) from e
+
+    async def stream_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> AsyncIterator[str]:
+        """Stream the response token by token from OpenAI's API."""
+        messages = self._build_messages(query, context, system_prompt)
+        try:
+            stream = self.gate.stream(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                )
+            )
+            async for chunk in stream:
+                # Some chunks (e.g. content filter results) carry no text
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise LLMProviderError(
+                f"Error streaming response from OpenAI: {str(e)}",
+                status_code=getattr(e, "status_code", None),
+            ) from e
 
     async def health_check(self) -> bool:
         """
@@ -75,12 +107,9 @@ class OpenAIProvider(LLMProvider):
             bool: True if the API is accessible, False otherwise
         """
         try:
-            # Try a simple completion to check API access
-            await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1,
-            )
+            # List models: authenticated, but no tokens spent
+            await self.client.models.list()
             return True
-        except Exception:
-            return False
+        except Exception as e:
+            # Rate limited is still up; the deployment gate waits out the 429
+            return getattr(e, "status_code", None) == 429
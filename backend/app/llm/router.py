@@ -0,0 +1,314 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+from .base import LLMProvider
+from .client import LLMProviderError
+
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_REQUESTS = int(os.getenv("LLM_BREAKER_MIN_REQUESTS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "30"))
+# Retries a routed backend makes itself before the router fails over; a
+# Retry-After longer than the max fails over instead of waiting
+LLM_ROUTED_MAX_RETRIES = int(os.getenv("LLM_ROUTED_MAX_RETRIES", "1"))
+LLM_ROUTED_RETRY_AFTER_MAX = float(os.getenv("LLM_ROUTED_RETRY_AFTER_MAX", "2"))
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker for one backend.
+
+    The breaker opens once at least ``min_requests`` of the last ``window``
+    requests were recorded and ``error_rate`` of them failed; a failed
+    health check counts as one failed request. After ``cooldown`` seconds,
+    or sooner when a health check passes, an open breaker lets a single
+    trial request through (half-open); its outcome closes or re-opens it.
+    """
+
+    def __init__(
+        self,
+        window: int = LLM_BREAKER_WINDOW,
+        min_requests: int = LLM_BREAKER_MIN_REQUESTS,
+        error_rate: float = LLM_BREAKER_ERROR_RATE,
+        cooldown: float = LLM_BREAKER_COOLDOWN,
+    ):
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._trial_started: Optional[float] = None
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow(self) -> bool:
+        """Whether a request may go to the backend now"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open":
+            # A trial that never reported back (e.g. cancelled) expires too
+            now = time.monotonic()
+            if self._trial_started and now - self._trial_started < self.cooldown:
+                return False
+            self._trial_started = now
+            return True
+        return self.state == "closed"
+
+    def open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self._trial_started = None
+
+    def half_open(self):
+        """Let the next request through as a trial"""
+        self.state = "half_open"
+        self._trial_started = None
+
+    def close(self):
+        self.state = "closed"
+        self._outcomes.clear()
+        self._trial_started = None
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self.close() if ok else self.open()
+            return
+        self._outcomes.append(ok)
+        if (
+            self.state == "closed"
+            and len(self._outcomes) >= self.min_requests
+            and self.error_rate >= self.error_rate_threshold
+        ):
+            self.open()
+
+
+class Backend:
+    """One deployment behind the router"""
+
+    def __init__(self, name: str, provider: LLMProvider, weight: float = 1.0):
+        self.name = name
+        self.provider = provider
+        self.weight = weight
+        self.breaker = CircuitBreaker()
+        # Failing over beats waiting out this backend's backoff
+        gate = getattr(provider, "gate", None)
+        if gate is not None:
+            gate.max_retries = min(gate.max_retries, LLM_ROUTED_MAX_RETRIES)
+            gate.retry_after_max = min(gate.retry_after_max, LLM_ROUTED_RETRY_AFTER_MAX)
+        # Exponentially weighted latency of successful requests
+        self.latency_ms: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def paused(self) -> bool:
+        """Rate limited right now; requests would queue behind the pause"""
+        gate = getattr(self.provider, "gate", None)
+        return gate is not None and gate.paused
+
+    def observe_latency(self, ms: float):
+        self.latency_ms = (
+            ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * ms
+        )
+
+
+def _counts_against_backend(error: Exception) -> bool:
+    """Client errors like an oversized prompt would fail on any backend"""
+    status = getattr(error, "status_code", None)
+    return status is None or status in (408, 429) or status >= 500
+
+
+class RoutingLLMProvider(LLMProvider):
+    """Spread requests over several deployments by weight and latency.
+
+    Each request picks a backend at random with probability proportional to
+    ``weight / latency``, skipping backends whose circuit breaker is open
+    and trying rate limited ones last, and fails over to the remaining
+    backends if that one errors. Backends retry at most
+    ``LLM_ROUTED_MAX_RETRIES`` times themselves, so failover isn't held up
+    by one deployment's backoff. Breakers
+    are driven by the error rate of real requests and by periodic
+    ``health_check`` calls (see ``start_health_checks``).
+    """
+
+    def __init__(self, backends: List[Backend]):
+        if not backends:
+            raise ValueError("RoutingLLMProvider needs at least one backend")
+        self.backends = backends
+        self.model = "router:" + ",".join(backend.name for backend in backends)
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _ranked(self) -> List[Backend]:
+        """Usable backends in the order to try them"""
+        known = [b.latency_ms for b in self.backends if b.latency_ms is not None]
+        # Backends without measurements yet are assumed to be average
+        default_latency = sum(known) / len(known) if known else 1.0
+        candidates = [
+            (backend, backend.weight / max(backend.latency_ms or default_latency, 1.0))
+            for backend in self.backends
+            if backend.weight > 0
+        ]
+        ranked = []
+        while candidates:
+            pick = random.uniform(0, sum(score for _, score in candidates))
+            for i, (backend, score) in enumerate(candidates):
+                pick -= score
+                if pick <= 0 or i == len(candidates) - 1:
+                    ranked.append(candidates.pop(i)[0])
+                    break
+        # Rate limited backends are the last resort
+        return sorted(ranked, key=lambda backend: backend.paused)
+
+    def _record(self, backend: Backend, error: Optional[Exception], started: float):
+        backend.requests += 1
+        if error is None:
+            backend.observe_latency((time.perf_counter() - started) * 1000)
+            backend.breaker.record(True)
+        elif _counts_against_backend(error):
+            backend.failures += 1
+            backend.breaker.record(False)
+        else:
+            # Not the backend's fault; just release a half-open trial
+            backend.breaker.record(True)
+
+    async def generate_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> str:
+        """Generate with the best available backend, failing over on errors"""
+        errors = []
+        for backend in self._ranked():
+            if not backend.breaker.allow():
+                continue
+            started = time.perf_counter()
+            try:
+                response = await backend.provider.generate_response(
+                    query=query,
+                    context=context,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                )
+            except Exception as e:
+                self._record(backend, e, started)
+                if not _counts_against_backend(e):
+                    raise
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record(backend, None, started)
+            return response
+        raise LLMProviderError(self._exhausted_message(errors))
+
+    async def stream_response(
+        self,
+        query: str,
+        context: List[str],
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 500,
+    ) -> AsyncIterator[str]:
+        """Stream from the best available backend.
+
+        Fails over only until the first token; after that the answer is
+        committed to its backend.
+        """
+        errors = []
+        for backend in self._ranked():
+            if not backend.breaker.allow():
+                continue
+            started = time.perf_counter()
+            streamed = False
+            try:
+                async for piece in backend.provider.stream_response(
+                    query=query,
+                    context=context,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                ):
+                    streamed = True
+                    yield piece
+            except Exception as e:
+                self._record(backend, e, started)
+                if streamed or not _counts_against_backend(e):
+                    raise
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._record(backend, None, started)
+            return
+        raise LLMProviderError(self._exhausted_message(errors))
+
+    def _exhausted_message(self, errors: List[str]) -> str:
+        if errors:
+            return "All LLM backends failed: " + "; ".join(errors)
+        return "No LLM backend available, all circuit breakers are open"
+
+    async def check_health(self) -> Dict[str, bool]:
+        """Health-check every backend and feed the results to the breakers.
+
+        A failed probe is one failed outcome, not an immediate ejection; a
+        passing probe only lets an open breaker try a real request early.
+        """
+        results = await asyncio.gather(
+            *(backend.provider.health_check() for backend in self.backends),
+            return_exceptions=True,
+        )
+        health = {}
+        for backend, result in zip(self.backends, results):
+            healthy = result is True
+            health[backend.name] = healthy
+            if not healthy:
+                backend.breaker.record(False)
+            elif backend.breaker.state == "open":
+                backend.breaker.half_open()
+        return health
+
+    async def health_check(self) -> bool:
+        return any((await self.check_health()).values())
+
+    def start_health_checks(self, interval: float = LLM_HEALTH_INTERVAL):
+        """Probe the backends every ``interval`` seconds on the running loop"""
+        if interval <= 0 or (self._health_task and not self._health_task.done()):
+            return
+
+        async def loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.check_health()
+                except Exception as e:
+                    print(f"Warning: LLM backend health check failed: {e}")
+
+        self._health_task = asyncio.create_task(loop())
+
+    def stop_health_checks(self):
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": backend.name,
+                "model": getattr(backend.provider, "model", None),
+                "weight": backend.weight,
+                "state": backend.breaker.state,
+                "error_rate": backend.breaker.error_rate,
+                "latency_ms": backend.latency_ms,
+                "requests": backend.requests,
+                "failures": backend.failures,
+            }
+            for backend in self.backends
+        ]
@@ -1,53 +1,214 @@
 import pandas as pd
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import (
+    FastAPI,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Request,
+    UploadFile,
+    File,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from app.utils import LlamaVectorizer
-from app.database import engine, Base, get_db, E5Embedding, Conversation
+from app.database import (
+    engine,
+    Base,
+    get_db,
+    get_read_db,
+    replica_router,
+    SessionLocal,
+    Conversation,
+    ConversationSummary,
+    upgrade_embedding_tables,
+)
+from app.embeddings import embedding_registry, ACTIVE_MODEL_MAX_AGE
+from app.reembed import ReEmbeddingJob
+from app.sharding import sharded_store
+from app.stats import corpus_stats
+from app.dedup import near_duplicates
+from app.answer_cache import answer_cache, context_fingerprint
+from app.context import context_assembler
+from app.batch import BatchSearchRunner
 from app.schemas import (
     EmbeddingResponse,
     EmbeddingListResponse,
     TextSearchRequest,
+    BatchSearchRequest,
     LLMResponse,
     ConversationHistory,
-    ConversationListResponse
+    ConversationListResponse,
 )
 from llama_index.core import Document
+import asyncio
+import json
 import os
 import tempfile
+import time
+import uuid
+from typing import Any, Dict, Optional
 from app.llm.factory import LLMFactory
+from app.llm.cached_provider import CachedLLMProvider, cache_bypass, BYPASS_HEADER
+from app.llm.client import close_http_client, gate_metrics
+from app.llm.latency import LatencyWindow
+from app.llm.router import RoutingLLMProvider
+from app.services.http import upstream
 from app.memory import ConversationMemory
+from app.summary import (
+    conversation_summarizer,
+    MEMORY_SUMMARY_MODEL,
+    MEMORY_SUMMARY_PROVIDER,
+)
 from app.workflows.manager import WorkflowManager
+from app.workflows.semantic_router import SemanticRouter, SEMANTIC_ROUTING
+from app.workflows.fanout import WORKFLOW_FAN_OUT
 from app.workflows.sdwan_provider import SDWANWorkflowProvider
 from app.workflows.knowledge_provider import KnowledgeBaseWorkflowProvider
 from app.workflows.servicenow_provider import ServiceNowWorkflowProvider
 
-
 app = FastAPI(title="RAG Vector Search API")
 
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173"], 
+    allow_origins=["http://localhost:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 Base.metadata.create_all(bind=engine)
+upgrade_embedding_tables(engine)
+sharded_store.create_all()
+
+# Pick up the embedding model a previous cutover switched to
+_startup_db = SessionLocal()
+try:
+    embedding_registry.load_active(_startup_db)
+finally:
+    _startup_db.close()
+
+
+def _bootstrap_corpus_stats():
+    """Count the chunks of tables filled before the counters existed"""
+    for session_factory in sharded_store.session_factories or [SessionLocal]:
+        db = session_factory()
+        try:
+            for model in embedding_registry.list_models():
+                table = embedding_registry.get(model["name"]).table
+                try:
+                    if corpus_stats.bootstrap(db, table):
+                        print(f"Rebuilt corpus statistics for {model['table']}")
+                except Exception as e:
+                    db.rollback()
+                    print(
+                        "Warning: could not rebuild corpus statistics for "
+                        f"{model['table']}: {e}"
+                    )
+        finally:
+            db.close()
+
+
+_bootstrap_corpus_stats()
 
 vectorizer = LlamaVectorizer()
 
-llm_provider = LLMFactory.create_provider("azure")
+# Background re-embedding job, at most one at a time
+reembedding_job = None
+
+# "router" spreads requests over the deployments listed in LLM_BACKENDS
+llm_provider = LLMFactory.create_provider(os.getenv("LLM_PROVIDER", "azure"))
+llm_router = llm_provider if isinstance(llm_provider, RoutingLLMProvider) else None
+if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true":
+    llm_provider = CachedLLMProvider(
+        llm_provider,
+        max_memory_entries=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+        ttl_seconds=(
+            float(os.getenv("LLM_CACHE_TTL")) if os.getenv("LLM_CACHE_TTL") else None
+        ),
+        max_database_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "100000")) or None,
+    )
+
+# Rolling conversation summaries are written with the same LLM unless a
+# cheaper provider or model is configured for them
+if MEMORY_SUMMARY_PROVIDER or MEMORY_SUMMARY_MODEL:
+    summary_provider_type = MEMORY_SUMMARY_PROVIDER or os.getenv(
+        "LLM_PROVIDER", "azure"
+    )
+    summary_kwargs = {}
+    if MEMORY_SUMMARY_MODEL and summary_provider_type == "azure":
+        summary_kwargs["deployment"] = MEMORY_SUMMARY_MODEL
+    elif MEMORY_SUMMARY_MODEL and summary_provider_type not in ("mock", "router"):
+        summary_kwargs["model"] = MEMORY_SUMMARY_MODEL
+    conversation_summarizer.llm_provider = LLMFactory.create_provider(
+        summary_provider_type, **summary_kwargs
+    )
+else:
+    conversation_summarizer.llm_provider = llm_provider
+
+# Time to first streamed token, from the request and from the LLM call
+ttft_latency = LatencyWindow()
+llm_ttft_latency = LatencyWindow()
+
+
+@app.on_event("startup")
+async def start_llm_health_checks():
+    if llm_router:
+        llm_router.start_health_checks()
+
+
+@app.on_event("shutdown")
+async def close_llm_connections():
+    if llm_router:
+        llm_router.stop_health_checks()
+    await close_http_client()
+
+
+@app.on_event("startup")
+async def open_upstream_connections():
+    # One pool for the SD-WAN and ServiceNow APIs, opened on the serving loop
+    upstream.open()
+
+
+@app.on_event("shutdown")
+async def close_upstream_connections():
+    await upstream.close()
+
+
+@app.middleware("http")
+async def llm_cache_bypass_middleware(request: Request, call_next):
+    """Honor ``X-LLM-Cache: bypass`` and ``Cache-Control: no-cache``"""
+    bypass = request.headers.get(BYPASS_HEADER, "").lower() == "bypass" or (
+        "no-cache" in request.headers.get("cache-control", "").lower()
+    )
+    token = cache_bypass.set(bypass)
+    try:
+        return await call_next(request)
+    finally:
+        cache_bypass.reset(token)
 
 
 workflow_manager = WorkflowManager()
 workflow_manager.register_provider(ServiceNowWorkflowProvider())
-workflow_manager.register_provider(SDWANWorkflowProvider())
-workflow_manager.register_provider(
-    KnowledgeBaseWorkflowProvider(next(get_db()), vectorizer),
-    is_fallback=True,
+sdwan_provider = SDWANWorkflowProvider()
+workflow_manager.register_provider(sdwan_provider)
+knowledge_provider = KnowledgeBaseWorkflowProvider(
+    replica_router.read_session, vectorizer
 )
+workflow_manager.register_provider(knowledge_provider, is_fallback=True)
+if SEMANTIC_ROUTING:
+    workflow_manager.enable_semantic_routing(
+        SemanticRouter(embedding_registry), knowledge_provider.embed_queries
+    )
+batch_runner = BatchSearchRunner(workflow_manager, knowledge_provider, llm_provider)
+
+
+def invalidate_knowledge_answers():
+    """Forget cached answers built on the knowledge base after it changes"""
+    answer_cache.invalidate(knowledge_provider.get_capabilities()["name"])
 
 
 @app.post("/ingest/pdf_url", response_model=EmbeddingListResponse)
@@ -55,19 +216,24 @@ def upload_pdf_and_store_embeddings(url: str, db: Session = Depends(get_db)):
     try:
         # Use the global vectorizer
         text_content = vectorizer.convert_pdf_to_text(url)
-        results = vectorizer.process_document(text_content, db, source_document=url)
-
-        formatted_results = [
-            EmbeddingResponse(
-                id=result.id,
-                text=result.text,
-                vector=result.vector,
-                source_document=result.source_document,
-                metadata=result.get_metadata() or {},
+        # In sharded mode the document's chunks go to the shard that owns it
+        with sharded_store.ingest_session(url, db) as ingest_db:
+            results = vectorizer.process_document(
+                text_content, ingest_db, source_document=url, settings_session=db
             )
-            for result in results
-        ]
 
+            formatted_results = [
+                EmbeddingResponse(
+                    id=result.id,
+                    text=result.text,
+                    vector=result.vector,
+                    source_document=result.source_document,
+                    metadata=result.get_metadata() or {},
+                )
+                for result in results
+            ]
+
+        invalidate_knowledge_answers()
         return EmbeddingListResponse(embeddings=formatted_results)
 
     except Exception as e:
@@ -93,21 +259,26 @@ async def upload_file_and_store_embeddings(
             # Process the PDF file
             text_content = vectorizer.convert_pdf_to_text(tmp_path)
             # Use filename as source document identifier
-            results = vectorizer.process_document(
-                text_content, db, source_document=file.filename
-            )
-
-            formatted_results = [
-                EmbeddingResponse(
-                    id=result.id,
-                    text=result.text,
-                    vector=result.vector,
-                    source_document=result.source_document,
-                    metadata=result.get_metadata() or {},
+            with sharded_store.ingest_session(file.filename, db) as ingest_db:
+                results = vectorizer.process_document(
+                    text_content,
+                    ingest_db,
+                    source_document=file.filename,
+                    settings_session=db,
                 )
-                for result in results
-            ]
 
+                formatted_results = [
+                    EmbeddingResponse(
+                        id=result.id,
+                        text=result.text,
+                        vector=result.vector,
+                        source_document=result.source_document,
+                        metadata=result.get_metadata() or {},
+                    )
+                    for result in results
+                ]
+
+            invalidate_knowledge_answers()
             return EmbeddingListResponse(embeddings=formatted_results)
 
         finally:
@@ -118,142 +289,626 @@ async def upload_file_and_store_embeddings(
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
 
 
-@app.post("/search/text/", response_model=LLMResponse)
-async def text_search(search_request: TextSearchRequest, db: Session = Depends(get_db)):
-    """Handle text queries with workflow routing"""
+async def _timed(timings: Dict[str, float], stage: str, awaitable):
+    """Await one pipeline stage, recording how long it took"""
+    started = time.perf_counter()
     try:
-        memory = ConversationMemory(db)
-        conversation_id = search_request.conversation_id or memory.create_conversation()
+        return await awaitable
+    finally:
+        timings[f"{stage}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
 
+def _load_history(conversation_id: str) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return ConversationMemory(db).get_prompt_history(conversation_id)
+    finally:
+        db.close()
+
+
+async def _retrieve(search_request: TextSearchRequest) -> Dict[str, Any]:
+    """Route a query, assemble its LLM context and look up a cached answer.
+
+    Shared by the blocking and the streaming search endpoints. Stages run as
+    soon as their inputs are ready rather than one after another: the
+    conversation history load and the query embedding start right away;
+    routing runs alongside them, or after the embedding when it routes by
+    the query vector; retrieval starts once the provider is known.
+    ``timings`` in the result holds the duration of every stage.
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    query = search_request.query_text
+    conversation_id = search_request.conversation_id or str(uuid.uuid4())
+    use_cache = search_request.use_cache and answer_cache.enabled
+    semantic_routing = workflow_manager.semantic_router is not None
+
+    empty_history = {"text": "", "tokens": 0, "window_tokens": 0}
+    history_task = asyncio.ensure_future(
+        _timed(timings, "history", asyncio.to_thread(_load_history, conversation_id))
+        if search_request.conversation_id
+        else asyncio.sleep(0, result=empty_history)
+    )
+    # The vector serves routing, the answer cache and knowledge base retrieval
+    embed_task = None
+    if use_cache or semantic_routing:
+        embed_task = asyncio.ensure_future(
+            _timed(
+                timings,
+                "embed",
+                asyncio.to_thread(knowledge_provider.embed_queries, [query]),
+            )
+        )
+
+    try:
         # Get appropriate provider (will always return a provider due to fallback)
-        provider = await workflow_manager.get_provider(search_request.query_text)
-        print("Type of provider:", type(provider))
+        routing_vector = (await embed_task)[0] if semantic_routing else None
+        fan_out = (
+            WORKFLOW_FAN_OUT
+            if search_request.fan_out is None
+            else search_request.fan_out
+        )
+        provider = await _timed(
+            timings,
+            "route",
+            workflow_manager.get_provider(query, routing_vector, fan_out),
+        )
+        provider_name = provider.get_capabilities()["name"]
 
-        # Handle query with memory support
-        result = await provider.handle_query(
-            search_request.query_text,
-            memory=memory,
-            conversation_id=conversation_id,
+        options = search_request.retrieval_options()
+        if isinstance(provider, KnowledgeBaseWorkflowProvider) and embed_task:
+            query_vector = (await embed_task)[0]
+            retrieval = provider.get_context(query, options, query_vector=query_vector)
+        else:
+            retrieval = provider.get_context(query, options)
+        context, history = await asyncio.gather(
+            _timed(timings, "retrieve", retrieval), history_task
         )
-        # Generate response using LLM
-        response = await llm_provider.generate_response(
-            query=search_request.query_text,
-            context=[str(result["context"])],
-            system_prompt=result["prompt"],
-            temperature=0.5,
+        query_vector = (await embed_task)[0] if embed_task and use_cache else None
+    finally:
+        for task in (history_task, embed_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    stage_started = time.perf_counter()
+    result = await provider.handle_query(
+        query, options=options, context=context, history=history
+    )
+
+    # Only the ranked chunk text goes to the LLM, cut to the token budget
+    assembled = context_assembler.assemble(
+        result["context"], search_request.context_token_budget
+    )
+
+    # Serve paraphrases of answered questions over unchanged context from cache
+    fingerprint = cached_answer = None
+    if query_vector is not None:
+        fingerprint = context_fingerprint(assembled.chunks, result["prompt"])
+        cached_answer = answer_cache.lookup(provider_name, query_vector, fingerprint)
+    timings["prompt_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
+    timings["retrieval_total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    return {
+        "conversation_id": conversation_id,
+        "provider": provider_name,
+        "result": result,
+        "assembled": assembled,
+        "query_vector": query_vector,
+        "fingerprint": fingerprint,
+        "cached_answer": cached_answer,
+        "timings": timings,
+    }
+
+
+def _remember_answer(search_request: TextSearchRequest, search, response, **metadata):
+    """Cache a fresh answer and store the interaction in conversation memory"""
+    if search["query_vector"] is not None and search["cached_answer"] is None:
+        answer_cache.store(
+            search["provider"],
+            search_request.query_text,
+            search["query_vector"],
+            search["fingerprint"],
+            response,
         )
 
-        # Store the interaction in memory
-        memory.add_interaction(
-            conversation_id=conversation_id,
+    # The request's session may be gone by the time a stream finishes
+    db = SessionLocal()
+    try:
+        ConversationMemory(db).add_interaction(
+            conversation_id=search["conversation_id"],
             query=search_request.query_text,
             response=response,
-            context_chunks=result["context"].get(
-                "context_chunks", [str(result["context"])]
+            context_chunks=search["result"]["context"].get(
+                "context_chunks", [str(search["result"]["context"])]
             ),
-            metadata={"provider": provider.get_capabilities()["name"]},
+            metadata={
+                "provider": search["provider"],
+                "cache_hit": search["cached_answer"] is not None,
+                "context_tokens": search["assembled"].tokens,
+                "history_tokens": search["result"].get("history_tokens"),
+                "history_window_tokens": search["result"].get("history_window_tokens"),
+                **metadata,
+            },
         )
+    finally:
+        db.close()
 
-        # Extract source links from context if available
-        source_links = result.get("context", {}).get("source_links", [])
-        if isinstance(result.get("context"), dict):
-            if "config" in result["context"]:
-                # For SDWAN provider, use the config context
-                context_text = str(result["context"]["config"])
-            elif "context_chunks" in result["context"]:
-                # For Knowledge Base provider, use the context chunks
-                context_text = "\n".join(result["context"]["context_chunks"])
-            else:
-                context_text = str(result["context"])
-        else:
-            context_text = str(result["context"])
+
+async def _save_answer(
+    search_request: TextSearchRequest, search, response: str, **metadata
+):
+    """Store an answer after the response went out, then refresh the summary"""
+    try:
+        await asyncio.to_thread(
+            _remember_answer, search_request, search, response, **metadata
+        )
+    except Exception as e:
+        print(f"Warning: could not save conversation turn: {e}")
+        return
+    conversation_summarizer.schedule(search["conversation_id"])
+
+
+def _context_text(context) -> str:
+    """Context as shown to clients in ``context_chunks``"""
+    if isinstance(context, dict) and "context_chunks" in context:
+        return "\n".join(context["context_chunks"])
+    return str(context)
+
+
+def _context_metadata(context) -> Optional[Dict[str, Any]]:
+    if isinstance(context, dict):
+        return context.get("metadata")
+    return None
+
+
+@app.post("/search/text/", response_model=LLMResponse)
+async def text_search(
+    search_request: TextSearchRequest, background_tasks: BackgroundTasks
+):
+    """Handle text queries with workflow routing.
+
+    The conversation turn is saved after the response has been sent;
+    ``timings`` reports the duration of each pipeline stage.
+    """
+    started = time.perf_counter()
+    try:
+        search = await _retrieve(search_request)
+        result, assembled = search["result"], search["assembled"]
+        timings = search["timings"]
+
+        response = search["cached_answer"]
+        if response is None:
+            # Generate response using LLM
+            response = await _timed(
+                timings,
+                "llm",
+                llm_provider.generate_response(
+                    query=search_request.query_text,
+                    context=assembled.chunks,
+                    system_prompt=result["prompt"],
+                    temperature=0.5,
+                ),
+            )
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        # Pin the conversation's reads to the primary now; only the insert
+        # waits until the response has been sent
+        replica_router.record_write(search["conversation_id"])
+        background_tasks.add_task(
+            _save_answer, search_request, search, response, timings=timings
+        )
 
         return LLMResponse(
             answer=response,
             sources=[],  # No document sources for API data
-            context_chunks=[context_text],
-            conversation_id=conversation_id,
-            provider=provider.get_capabilities()["name"],
-            source_links=source_links,
+            context_chunks=[_context_text(result["context"])],
+            conversation_id=search["conversation_id"],
+            provider=search["provider"],
+            source_links=result.get("context", {}).get("source_links", []),
+            cache_hit=search["cached_answer"] is not None,
+            context_tokens=assembled.tokens,
+            context_token_budget=assembled.budget,
+            context_truncated=assembled.truncated or assembled.dropped_chunks > 0,
+            timings=timings,
+            metadata=_context_metadata(result["context"]),
         )
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"An error occurred: {e}")
 
 
-@app.post("/ingest/excel/")
-async def ingest_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """
-    Ingest an Excel file, process its contents, and store embeddings.
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@app.post("/search/text/stream")
+async def text_search_stream(search_request: TextSearchRequest):
+    """Stream the answer to a text query as server-sent events.
+
+    A ``metadata`` event with the provider, sources and context usage is sent
+    as soon as retrieval finishes, then ``token`` events as the LLM generates,
+    and finally a ``done`` event with time-to-first-token. The answer is saved
+    to the conversation once the stream completes. Failures after the stream
+    has started arrive as an ``error`` event.
     """
+    started = time.perf_counter()
     try:
-        # Read Excel file
-        df = pd.read_excel(file.file)
-
-        # Convert DataFrame to text, concatenating all non-null values
-        text_content = " ".join(
-            df.astype(str)
-            .apply(lambda x: " ".join(x.dropna().astype(str)), axis=1)
-            .tolist()
+        search = await _retrieve(search_request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"An error occurred: {e}")
+    result, assembled = search["result"], search["assembled"]
+    # Filled in by the stream, saved once the response has finished
+    completed: Dict[str, Any] = {}
+
+    async def events():
+        yield _sse(
+            "metadata",
+            {
+                "conversation_id": search["conversation_id"],
+                "provider": search["provider"],
+                "source_links": result.get("context", {}).get("source_links", []),
+                "context_chunks": [_context_text(result["context"])],
+                "cache_hit": search["cached_answer"] is not None,
+                "context_tokens": assembled.tokens,
+                "context_token_budget": assembled.budget,
+                "context_truncated": assembled.truncated
+                or assembled.dropped_chunks > 0,
+                "retrieval_ms": (time.perf_counter() - started) * 1000,
+                "timings": search["timings"],
+                "metadata": _context_metadata(result["context"]),
+            },
         )
 
-        # Create document and get nodes
-        doc = Document(text=text_content)
-        nodes = vectorizer.parser.get_nodes_from_documents([doc])
+        pieces = []
+        ttft_ms = llm_ttft_ms = None
+        try:
+            if search["cached_answer"] is not None:
+                stream = _replay(search["cached_answer"])
+            else:
+                stream = llm_provider.stream_response(
+                    query=search_request.query_text,
+                    context=assembled.chunks,
+                    system_prompt=result["prompt"],
+                    temperature=0.5,
+                )
+            llm_started = time.perf_counter()
+            async for piece in stream:
+                if ttft_ms is None:
+                    now = time.perf_counter()
+                    ttft_ms = (now - started) * 1000
+                    llm_ttft_ms = (now - llm_started) * 1000
+                pieces.append(piece)
+                yield _sse("token", {"text": piece})
 
-        # Get embeddings for each node
-        embeddings = []
-        for node in nodes:
-            vector = vectorizer.embed_model.get_text_embedding(node.text)
+            response = "".join(pieces)
+            if ttft_ms is not None:
+                ttft_latency.record(ttft_ms)
+                llm_ttft_latency.record(llm_ttft_ms)
+            completed.update(response=response, ttft_ms=ttft_ms)
+            # Before "done", so a client reloading the conversation reads the primary
+            replica_router.record_write(search["conversation_id"])
+        except Exception as e:
+            yield _sse("error", {"detail": f"An error occurred: {e}"})
+            return
+
+        yield _sse(
+            "done",
+            {
+                "conversation_id": search["conversation_id"],
+                "ttft_ms": ttft_ms,
+                "llm_ttft_ms": llm_ttft_ms,
+                "total_ms": (time.perf_counter() - started) * 1000,
+            },
+        )
 
-            embedding = E5Embedding(
-                text=node.text,
-                vector=vector,
-                source_document=file.filename,
-                metadata={"source_type": "excel", "filename": file.filename},
+    async def save():
+        if "response" in completed:
+            await _save_answer(
+                search_request,
+                search,
+                completed["response"],
+                ttft_ms=completed["ttft_ms"],
+                streamed=True,
             )
-            embeddings.append(embedding)
 
-        # Bulk insert embeddings
-        db.bulk_save_objects(embeddings)
-        db.commit()
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        background=BackgroundTask(save),
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        return {
-            "message": f"Successfully processed Excel file and stored {len(embeddings)} embeddings"
-        }
 
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=400, detail=f"Error processing Excel file: {str(e)}"
+async def _replay(answer: str):
+    yield answer
+
+
+@app.post("/search/batch")
+async def batch_search(batch_request: BatchSearchRequest):
+    """Answer many queries in one call, streamed back as NDJSON.
+
+    One JSON object per line, in the order of ``queries``; a query that fails
+    gets an ``error`` field instead of an answer.
+    """
+    try:
+        providers, vectors = await batch_runner.plan(
+            batch_request.queries,
+            (
+                WORKFLOW_FAN_OUT
+                if batch_request.fan_out is None
+                else batch_request.fan_out
+            ),
         )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"An error occurred: {e}")
+
+    async def lines():
+        async for item in batch_runner.run(batch_request, providers, vectors):
+            yield json.dumps(jsonable_encoder(item)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/ingest/excel/")
+async def ingest_excel(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+    Ingest an Excel file, process its contents, and store embeddings.
+    """
+    with sharded_store.ingest_session(file.filename, db) as ingest_db:
+        try:
+            # Read Excel file
+            df = pd.read_excel(file.file)
+
+            # Convert DataFrame to text, concatenating all non-null values
+            text_content = " ".join(
+                df.astype(str)
+                .apply(lambda x: " ".join(x.dropna().astype(str)), axis=1)
+                .tolist()
+            )
+
+            # Create document and get nodes
+            doc = Document(text=text_content)
+            nodes = vectorizer.parser.get_nodes_from_documents([doc])
+
+            # Get embeddings for each node, stored in the active model's table
+            spec = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE)
+            embeddings = []
+            duplicates = 0
+            for chunk_index, node in enumerate(nodes):
+                embedding = spec.table(
+                    text=node.text,
+                    source_document=file.filename,
+                    chunk_index=chunk_index,
+                )
+                if (
+                    ingest_db.query(spec.table.id)
+                    .filter_by(text_hash=embedding.text_hash)
+                    .first()
+                ):
+                    duplicates += 1
+                    continue
+
+                signature = None
+                if near_duplicates.enabled:
+                    signature = near_duplicates.signature(node.text)
+                    match = near_duplicates.find(ingest_db, spec.table, signature)
+                    if match:
+                        duplicates += 1
+                        if near_duplicates.action == "skip":
+                            continue
+                        embedding.canonical_id = match[0]
+                if embedding.canonical_id is None:
+                    embedding.vector = embedding_registry.embed(node.text, spec.name)
+
+                embedding.set_metadata(
+                    {"source_type": "excel", "filename": file.filename}
+                )
+                ingest_db.add(embedding)
+                if signature is not None:
+                    # Index as we go so later rows see duplicates within the file
+                    ingest_db.flush()
+                    near_duplicates.add(
+                        ingest_db,
+                        spec.table,
+                        embedding.id,
+                        signature,
+                        canonical=embedding.canonical_id is None,
+                    )
+                embeddings.append(embedding)
+
+            corpus_stats.record(ingest_db, spec.table, embeddings)
+            ingest_db.commit()
+            invalidate_knowledge_answers()
+
+            return {
+                "message": (
+                    "Successfully processed Excel file and stored "
+                    f"{len(embeddings)} embeddings"
+                ),
+                "duplicates": duplicates,
+            }
+
+        except Exception as e:
+            ingest_db.rollback()
+            raise HTTPException(
+                status_code=400, detail=f"Error processing Excel file: {str(e)}"
+            )
+
+
+def _chunk_stores(db: Session):
+    """Sessions holding chunk tables: every shard in sharded mode, else ``db``"""
+    if not sharded_store.enabled:
+        yield db
+        return
+    for session_factory in sharded_store.session_factories:
+        shard_db = session_factory()
+        try:
+            yield shard_db
+        finally:
+            shard_db.close()
 
 
 @app.get("/admin/table-counts")
-def get_table_counts(db: Session = Depends(get_db)):
+def get_table_counts(db: Session = Depends(get_read_db)):
     """Get count of records in all tables."""
     try:
-        counts = [{"table": "embeddings", "count": db.query(E5Embedding).count()}]
+        # Served from the maintained counters, not a COUNT(*) scan
+        table = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE).table
+        count = sum(corpus_stats.total(store, table) for store in _chunk_stores(db))
+        counts = [{"table": "embeddings", "count": count}]
         return {"table_counts": counts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@app.get("/admin/corpus-stats")
+def get_corpus_stats(
+    include_documents: bool = True, db: Session = Depends(get_read_db)
+):
+    """Chunk counts per type and source document, index size and row estimate."""
+    try:
+        table = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE).table
+        return {
+            "stores": [
+                corpus_stats.summary(store, table, include_documents)
+                for store in _chunk_stores(db)
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.post("/admin/corpus-stats/rebuild")
+def rebuild_corpus_stats(db: Session = Depends(get_db)):
+    """Recount the active table from scratch, e.g. for data loaded out of band."""
+    try:
+        table = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE).table
+        for store in _chunk_stores(db):
+            corpus_stats.rebuild(store, table)
+        return {"message": f"Rebuilt corpus statistics for {table.__tablename__}"}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
 @app.delete("/admin/embeddings")
 def delete_embeddings(db: Session = Depends(get_db)):
     """Delete all records from embeddings tables."""
     try:
-        db.query(E5Embedding).delete()
-        db.commit()
+        table = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE).table
+        for store in _chunk_stores(db):
+            store.query(table).delete()
+            corpus_stats.reset(store, table)
+            near_duplicates.reset(store, table)
+            store.commit()
+        invalidate_knowledge_answers()
         return {"message": "Successfully deleted all embedding records"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@app.delete("/admin/documents")
+def delete_document(source_document: str, db: Session = Depends(get_db)):
+    """Delete every chunk of one source document."""
+    table = embedding_registry.load_active(db, max_age=ACTIVE_MODEL_MAX_AGE).table
+    with sharded_store.ingest_session(source_document, db) as store:
+        try:
+            chunks = (
+                store.query(table)
+                .filter(table.source_document == source_document)
+                .all()
+            )
+            if not chunks:
+                raise HTTPException(
+                    status_code=404, detail=f"No chunks found for {source_document}"
+                )
+            corpus_stats.record(store, table, chunks, sign=-1)
+            near_duplicates.remove(store, table, chunks)
+            for chunk in chunks:
+                store.delete(chunk)
+            store.commit()
+            invalidate_knowledge_answers()
+            return {
+                "message": (
+                    f"Successfully deleted {len(chunks)} chunks of {source_document}"
+                )
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            store.rollback()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@app.get("/admin/embedding-models")
+def list_embedding_models(db: Session = Depends(get_db)):
+    """List registered embedding models and any re-embedding job."""
+    embedding_registry.load_active(db)
+    return {
+        "active": embedding_registry.active().name,
+        "models": embedding_registry.list_models(),
+        "reembedding": reembedding_job.status() if reembedding_job else None,
+    }
+
+
+@app.post("/admin/embedding-models/{model_name}/reembed")
+async def start_reembedding(
+    model_name: str,
+    batch_size: int = 32,
+    pause_seconds: float = 0.5,
+    activate: bool = True,
+):
+    """Re-embed the corpus into another model's table in the background.
+
+    The current model keeps serving searches until the copy has caught up,
+    then (with ``activate``) searches and ingestion are cut over to the new model.
+    """
+    global reembedding_job
+    if reembedding_job and reembedding_job.running:
+        raise HTTPException(
+            status_code=409, detail="A re-embedding job is already running"
+        )
+    try:
+        reembedding_job = ReEmbeddingJob(
+            embedding_registry,
+            target=model_name,
+            batch_size=batch_size,
+            pause_seconds=pause_seconds,
+            activate=activate,
+        ).start()
+        return reembedding_job.status()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/admin/embedding-models/reembed")
+def cancel_reembedding():
+    """Cancel the running re-embedding job."""
+    if not reembedding_job or not reembedding_job.running:
+        raise HTTPException(status_code=404, detail="No re-embedding job is running")
+    reembedding_job.cancel()
+    return {"message": "Re-embedding job cancelled"}
+
+
+@app.post("/admin/embedding-models/{model_name}/activate")
+def activate_embedding_model(model_name: str, db: Session = Depends(get_db)):
+    """Switch searches and ingestion to another embedding model."""
+    try:
+        spec = embedding_registry.set_active(model_name, db)
+        answer_cache.invalidate()
+        return {"message": f"Active embedding model is now {spec.name}"}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/conversations/{conversation_id}", response_model=ConversationHistory)
-def get_conversation_history(conversation_id: str, db: Session = Depends(get_db)):
+def get_conversation_history(conversation_id: str):
     """Get the full history of a conversation."""
+    # Served from a replica unless this conversation was just written to
+    db = replica_router.read_session(sticky_key=conversation_id)
     try:
         memory = ConversationMemory(db)
         turns = memory.get_recent_history(
@@ -264,16 +919,15 @@ def get_conversation_history(conversation_id: str, db: Session = Depends(get_db)
         raise HTTPException(
             status_code=400, detail=f"Error retrieving conversation history: {str(e)}"
         )
+    finally:
+        db.close()
 
 
 @app.delete("/conversations/{conversation_id}")
 def delete_conversation(conversation_id: str, db: Session = Depends(get_db)):
     """Delete a conversation and all its turns."""
     try:
-        db.query(Conversation).filter(
-            Conversation.conversation_id == conversation_id
-        ).delete()
-        db.commit()
+        ConversationMemory(db).delete_conversation(conversation_id)
         return {"message": f"Successfully deleted conversation {conversation_id}"}
     except Exception as e:
         db.rollback()
@@ -287,6 +941,7 @@ def delete_all_conversations(db: Session = Depends(get_db)):
     """Delete all conversations and their turns."""
     try:
         db.query(Conversation).delete()
+        db.query(ConversationSummary).delete()
         db.commit()
         return {"message": "Successfully deleted all conversations"}
     except Exception as e:
@@ -297,7 +952,7 @@ def delete_all_conversations(db: Session = Depends(get_db)):
 
 
 @app.get("/conversations", response_model=ConversationListResponse)
-def list_conversations(db: Session = Depends(get_db)):
+def list_conversations(db: Session = Depends(get_read_db)):
     """List all conversations with their latest interaction."""
     try:
         # Get the latest turn for each conversation
@@ -325,7 +980,110 @@ def list_conversations(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/admin/answer-cache")
+def get_answer_cache_metrics():
+    """Hit rate and size of the semantic answer cache."""
+    return answer_cache.metrics()
+
+
+@app.delete("/admin/answer-cache")
+def clear_answer_cache():
+    """Drop every cached answer."""
+    answer_cache.invalidate()
+    return {"message": "Answer cache cleared"}
+
+
+@app.get("/admin/upstream")
+def get_upstream_metrics():
+    """SD-WAN and ServiceNow API requests, retries, failures and in-flight calls.
+
+    Counted per upstream host.
+    """
+    return upstream.metrics()
+
+
+@app.get("/admin/sdwan-config-cache")
+def get_sdwan_config_cache_metrics():
+    """Age of the cached SD-WAN organization config and its hit rate."""
+    return sdwan_provider.config_cache.metrics()
+
+
+@app.delete("/admin/sdwan-config-cache")
+def invalidate_sdwan_config_cache():
+    """Refetch the SD-WAN organization config on the next query."""
+    sdwan_provider.config_cache.invalidate()
+    # Answers built on the old config must not be served either
+    answer_cache.invalidate(sdwan_provider.get_capabilities()["name"])
+    return {"message": "SD-WAN config cache invalidated"}
+
+
+@app.get("/admin/llm-cache")
+def get_llm_cache_metrics():
+    """Hit rate of the exact-match LLM completion cache."""
+    if not isinstance(llm_provider, CachedLLMProvider):
+        return {"enabled": False}
+    return {"enabled": True, **llm_provider.metrics()}
+
+
+@app.delete("/admin/llm-cache")
+def clear_llm_cache():
+    """Drop every cached LLM completion."""
+    if isinstance(llm_provider, CachedLLMProvider):
+        llm_provider.clear()
+    return {"message": "LLM completion cache cleared"}
+
+
+@app.get("/admin/llm-deployments")
+def get_llm_deployment_metrics():
+    """Concurrency, retries, rate limiting and hedging per LLM deployment."""
+    return {
+        "deployments": gate_metrics(),
+        "routing": llm_router.metrics() if llm_router else None,
+    }
+
+
+@app.get("/admin/replicas")
+def get_replica_status():
+    """Report configured read replicas and whether they are in rotation."""
+    return {"replicas": replica_router.status()}
+
+
+@app.get("/admin/streaming")
+def get_streaming_metrics():
+    """Time-to-first-token percentiles of recent streamed answers."""
+    return {
+        "ttft": ttft_latency.summary(),
+        "llm_ttft": llm_ttft_latency.summary(),
+    }
+
+
+@app.get("/admin/memory")
+def get_memory_metrics():
+    """Conversation memory mode and the history tokens summaries saved."""
+    return conversation_summarizer.metrics()
+
+
 @app.get("/workflows/capabilities")
 async def get_workflow_capabilities():
     """Get available workflow capabilities"""
     return await workflow_manager.get_capabilities()
+
+
+@app.get("/workflows/route")
+async def explain_workflow_route(query: str, fan_out: bool = WORKFLOW_FAN_OUT):
+    """Show which provider a query would be routed to and why"""
+    query_vector = None
+    if workflow_manager.semantic_router:
+        query_vector = (
+            await asyncio.to_thread(knowledge_provider.embed_queries, [query])
+        )[0]
+    decision = await workflow_manager.route(query, query_vector, fan_out)
+    result = {
+        **decision,
+        "provider": decision["provider"].get_capabilities()["name"],
+    }
+    if workflow_manager.semantic_router:
+        result["calibration"] = await asyncio.to_thread(
+            workflow_manager.semantic_router.calibration
+        )
+    return result
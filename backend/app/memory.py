@@ -2,8 +2,9 @@ from datetime import datetime
 import uuid
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from app.database import Conversation
+from app.database import Conversation, ConversationSummary, replica_router
 from app.schemas import ConversationTurn
+from app.summary import conversation_summarizer
 
 
 class ConversationMemory:
@@ -39,6 +40,7 @@ class ConversationMemory:
         self.db.add(conversation)
         self.db.commit()
         self.db.refresh(conversation)
+        replica_router.record_write(conversation_id)
 
         return ConversationTurn(
             query=conversation.query,
@@ -88,9 +90,82 @@ class ConversationMemory:
 
         return "\n".join(formatted_history)
 
+    def get_prompt_history(
+        self, conversation_id: str, window_size: int = 5
+    ) -> Dict[str, Any]:
+        """History for the system prompt in the configured ``MEMORY_MODE``.
+
+        Besides the text, returns its token count and that of the verbatim
+        window of the last ``window_size`` turns, which is what window mode
+        sends and what summary mode is measured against.
+        """
+        summarizer = conversation_summarizer
+        turns = (
+            self.db.query(Conversation)
+            .filter(Conversation.conversation_id == conversation_id)
+            .order_by(Conversation.id.desc())
+            .limit(window_size)
+            .all()
+        )
+        window_text = self.format_memory_for_prompt(list(reversed(turns)))
+        window_tokens = summarizer.count_tokens(window_text)
+
+        text = window_text
+        if summarizer.enabled:
+            text = self._summarized_history(conversation_id)
+        tokens = (
+            summarizer.count_tokens(text) if text is not window_text else window_tokens
+        )
+        summarizer.record_prompt(window_tokens, tokens)
+        return {"text": text, "tokens": tokens, "window_tokens": window_tokens}
+
+    def _summarized_history(self, conversation_id: str) -> str:
+        """The rolling summary plus the turns it doesn't cover, within budget"""
+        summarizer = conversation_summarizer
+        state = self.db.get(ConversationSummary, conversation_id)
+        parts = []
+        last_turn_id = 0
+        if state:
+            summary = summarizer.truncate(state.summary, summarizer.max_summary_tokens)
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+            last_turn_id = state.last_turn_id
+
+        # Every turn the summary doesn't cover yet, however far the summarizer
+        # lags; newest first, the one crossing the budget is cut, older dropped
+        newest_first = (
+            self.db.query(Conversation)
+            .filter(
+                Conversation.conversation_id == conversation_id,
+                Conversation.id > last_turn_id,
+            )
+            .order_by(Conversation.id.desc())
+            .yield_per(20)
+        )
+        remaining = summarizer.token_budget - summarizer.count_tokens("".join(parts))
+        recent = []
+        for turn in newest_first:
+            # Leave room for the line breaks joining the parts
+            remaining -= 2
+            if remaining <= 0:
+                break
+            text = f"User: {turn.query}\nAssistant: {turn.response}\n---"
+            tokens = summarizer.count_tokens(text)
+            if tokens > remaining:
+                text = summarizer.truncate(text, remaining)
+            recent.append(text)
+            remaining -= tokens
+
+        if recent:
+            parts.append("\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
     def delete_conversation(self, conversation_id: str) -> None:
         """Delete all turns of a conversation"""
         self.db.query(Conversation).filter(
             Conversation.conversation_id == conversation_id
         ).delete()
+        self.db.query(ConversationSummary).filter(
+            ConversationSummary.conversation_id == conversation_id
+        ).delete()
         self.db.commit()
+        replica_router.record_write(conversation_id)
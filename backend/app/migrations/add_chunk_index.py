@@ -0,0 +1,53 @@
+"""Number the chunks of existing embedding tables.
+
+Neighbor expansion at retrieval time needs each chunk's position within its
+source document. The column and its index are added at startup; run this
+once after upgrading to fill in the chunks stored before:
+
+    python -m app.migrations.add_chunk_index
+
+Chunks were always inserted in document order, so existing rows are
+numbered by id within each source document, on the primary and every
+shard. Re-running is safe and only fills rows still missing a position.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.database import engine, upgrade_embedding_tables
+from app.embeddings import embedding_registry
+from app.sharding import sharded_store
+
+
+def add_chunk_index(bind: Engine, table_name: str) -> int:
+    with bind.begin() as conn:
+        result = conn.execute(text(f"""UPDATE {table_name} AS t
+                SET chunk_index = numbered.position
+                FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY source_document ORDER BY id
+                    ) - 1 AS position
+                    FROM {table_name}
+                ) AS numbered
+                WHERE t.id = numbered.id AND t.chunk_index IS NULL"""))
+    return result.rowcount
+
+
+def main():
+    for bind in [engine, *sharded_store.engines]:
+        upgrade_embedding_tables(bind)
+        for model in embedding_registry.list_models():
+            table_name = model["table"]
+            with bind.connect() as conn:
+                exists = conn.execute(
+                    text("SELECT to_regclass(:name)"), {"name": table_name}
+                ).scalar()
+            if not exists:
+                print(f"{bind.url.host} {table_name}: table does not exist, skipping")
+                continue
+
+            updated = add_chunk_index(bind, table_name)
+            print(f"{bind.url.host} {table_name}: numbered {updated} chunks")
+
+
+if __name__ == "__main__":
+    main()
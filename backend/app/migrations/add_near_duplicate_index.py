@@ -0,0 +1,93 @@
+"""Add near-duplicate links and index the existing chunks.
+
+Ingestion links near-duplicate chunks to a canonical copy through the
+``canonical_id`` column (added at startup) and finds them through the
+MinHash/LSH tables. Run once after upgrading to index the chunks stored
+before, on the primary and every shard:
+
+    python -m app.migrations.add_near_duplicate_index [--batch-size 500]
+
+Existing chunks are all indexed as canonical; duplicates among them are left
+in place. Chunks are signed in primary-key batches, and re-running only picks
+up chunks that don't have a signature yet.
+"""
+
+import argparse
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.database import SessionLocal, ChunkMinHash, upgrade_embedding_tables
+from app.dedup import near_duplicates
+from app.embeddings import embedding_registry
+from app.sharding import sharded_store
+
+
+def index_table(session_factory: sessionmaker, table, batch_size: int) -> int:
+    """Sign and bucket every chunk of a table that isn't indexed yet."""
+    table_name = table.__tablename__
+    indexed = 0
+    last_id = 0
+    while True:
+        db = session_factory()
+        try:
+            rows = (
+                db.query(table.id, table.text, table.canonical_id)
+                .filter(table.id > last_id)
+                .order_by(table.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return indexed
+            signed = {
+                chunk_id
+                for (chunk_id,) in db.query(ChunkMinHash.chunk_id).filter(
+                    ChunkMinHash.table_name == table_name,
+                    ChunkMinHash.chunk_id.in_([row.id for row in rows]),
+                )
+            }
+            for row in rows:
+                if row.id in signed:
+                    continue
+                near_duplicates.add(
+                    db,
+                    table,
+                    row.id,
+                    near_duplicates.signature(row.text),
+                    canonical=row.canonical_id is None,
+                )
+                indexed += 1
+            db.commit()
+            last_id = rows[-1].id
+        finally:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    # The signatures live next to the chunks, so each shard is indexed alone
+    for session_factory in [SessionLocal, *sharded_store.session_factories]:
+        bind = session_factory.kw["bind"]
+        upgrade_embedding_tables(bind)
+        for model in embedding_registry.list_models():
+            table_name = model["table"]
+            with bind.connect() as conn:
+                exists = conn.execute(
+                    text("SELECT to_regclass(:name)"), {"name": table_name}
+                ).scalar()
+            if not exists:
+                print(f"{bind.url.host} {table_name}: table does not exist, skipping")
+                continue
+
+            indexed = index_table(
+                session_factory,
+                embedding_registry.get(model["name"]).table,
+                args.batch_size,
+            )
+            print(f"{bind.url.host} {table_name}: indexed {indexed} chunks")
+
+
+if __name__ == "__main__":
+    main()
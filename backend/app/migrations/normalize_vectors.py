@@ -0,0 +1,71 @@
+"""Normalize stored vectors to unit length and add inner-product indexes.
+
+Searches rank with pgvector's inner-product operator, which only matches
+cosine similarity on unit vectors. Run once after upgrading:
+
+    python -m app.migrations.normalize_vectors [--batch-size 1000]
+
+Rows are updated in primary-key batches so the table is never locked for
+long, and the HNSW index is built CONCURRENTLY. Re-running is safe.
+"""
+
+import argparse
+from sqlalchemy import text
+from app.database import engine
+from app.embeddings import embedding_registry
+
+
+def normalize_table(table_name: str, batch_size: int) -> int:
+    """Normalize every non-unit vector in a table, one id range at a time."""
+    updated = 0
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT max(id) FROM {table_name}")).scalar()
+    if max_id is None:
+        return 0
+
+    for start in range(0, max_id + 1, batch_size):
+        with engine.begin() as conn:
+            result = conn.execute(
+                text(f"""UPDATE {table_name}
+                    SET vector = l2_normalize(vector)
+                    WHERE id >= :start AND id < :end
+                      AND vector IS NOT NULL
+                      AND abs(vector_norm(vector) - 1) > 1e-4"""),
+                {"start": start, "end": start + batch_size},
+            )
+            updated += result.rowcount
+    return updated
+
+
+def create_inner_product_index(table_name: str):
+    """Build the vector_ip_ops HNSW index without blocking writes."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(
+            text(f"""CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table_name}_vector_ip
+                ON {table_name} USING hnsw (vector vector_ip_ops)""")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    for model in embedding_registry.list_models():
+        table_name = model["table"]
+        with engine.connect() as conn:
+            exists = conn.execute(
+                text("SELECT to_regclass(:name)"), {"name": table_name}
+            ).scalar()
+        if not exists:
+            print(f"{table_name}: table does not exist, skipping")
+            continue
+
+        updated = normalize_table(table_name, args.batch_size)
+        print(f"{table_name}: normalized {updated} vectors")
+        create_inner_product_index(table_name)
+        print(f"{table_name}: ix_{table_name}_vector_ip ready")
+
+
+if __name__ == "__main__":
+    main()
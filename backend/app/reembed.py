@@ -0,0 +1,259 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import text
+from app.database import SessionLocal, engine
+from app.embeddings import (
+    EmbeddingModelRegistry,
+    EmbeddingModelSpec,
+    ACTIVE_MODEL_MAX_AGE,
+)
+from app.sharding import sharded_store
+from app.stats import corpus_stats
+from app.dedup import near_duplicates
+
+# Seconds the catch-up pass keeps copying after the cutover (at least the
+# active model max age), for rows other workers still ingest into the old
+# table until they notice the switch
+REEMBED_CATCH_UP_SECONDS = float(os.getenv("REEMBED_CATCH_UP_SECONDS", "120"))
+# Postgres advisory lock held while a job runs, so one worker re-embeds at a time
+REEMBED_LOCK_KEY = 7_361_042_026
+
+
+class ReEmbeddingJob:
+    """Copy the corpus into another model's table while the old one keeps serving.
+
+    Rows are read from the source table in primary-key order, re-embedded in
+    batches and written to the target table. Batches are throttled so the job
+    doesn't starve interactive queries of CPU or database connections. Once the
+    target has caught up, the registry is switched to the new model and the
+    job keeps picking up rows ingested into the source table until every
+    worker has seen the switch. In sharded mode every shard is copied in turn,
+    each within its own instance. A database advisory lock keeps a second
+    worker from starting a job of its own.
+    """
+
+    def __init__(
+        self,
+        registry: EmbeddingModelRegistry,
+        target: str,
+        batch_size: int = 32,
+        pause_seconds: float = 0.5,
+        activate: bool = True,
+    ):
+        self.registry = registry
+        self.source: EmbeddingModelSpec = registry.active()
+        self.target: EmbeddingModelSpec = registry.get(target)
+        if self.source.name == self.target.name:
+            raise ValueError(f"{target} is already the active embedding model")
+
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.activate = activate
+
+        # Chunk tables live on the shards in sharded mode, on the primary otherwise
+        self.session_factories = sharded_store.session_factories or [SessionLocal]
+
+        self.state = "pending"
+        self.last_ids = [0] * len(self.session_factories)
+        self.copied = 0
+        self.skipped = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock_connection = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> "ReEmbeddingJob":
+        """Schedule the job on the running event loop.
+
+        Raises ``RuntimeError`` when another worker is running a job.
+        """
+        self._acquire_lock()
+        self._task = asyncio.create_task(self.run())
+        return self
+
+    def _acquire_lock(self):
+        if engine.dialect.name != "postgresql":
+            return
+        conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        locked = conn.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": REEMBED_LOCK_KEY}
+        ).scalar()
+        if not locked:
+            conn.close()
+            raise RuntimeError(
+                "A re-embedding job is already running on another worker"
+            )
+        self._lock_connection = conn
+
+    def _release_lock(self):
+        conn, self._lock_connection = self._lock_connection, None
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": REEMBED_LOCK_KEY}
+            )
+            conn.close()
+        except Exception as e:
+            # Dropping the connection releases the lock too
+            print(f"Warning: could not release the re-embedding lock: {e}")
+            conn.invalidate()
+
+    def cancel(self):
+        """Stop the job after the current batch"""
+        if self.running:
+            self._task.cancel()
+
+    async def run(self):
+        self.state = "copying"
+        self.started_at = datetime.utcnow().isoformat()
+        try:
+            await self._copy_until_caught_up()
+
+            if self.activate:
+                db = SessionLocal()
+                try:
+                    self.registry.set_active(self.target.name, db)
+                finally:
+                    db.close()
+                self.state = "catching_up"
+                await self._catch_up(time.monotonic())
+
+            self.state = "completed"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.utcnow().isoformat()
+            self._release_lock()
+
+    async def _catch_up(self, switched_at: float):
+        """Copy late source rows until every worker has seen the cutover.
+
+        Workers re-read the active model only every ``ACTIVE_MODEL_MAX_AGE``
+        seconds, so until then they may still ingest into the source table.
+        """
+        window = max(REEMBED_CATCH_UP_SECONDS, ACTIVE_MODEL_MAX_AGE)
+        while True:
+            await self._copy_until_caught_up()
+            if time.monotonic() - switched_at >= window:
+                return
+            await asyncio.sleep(max(self.pause_seconds, 1.0))
+
+    async def _copy_until_caught_up(self):
+        for store in range(len(self.session_factories)):
+            while True:
+                copied = await asyncio.to_thread(self._copy_batch, store)
+                if copied == 0:
+                    break
+                await asyncio.sleep(self.pause_seconds)
+
+    def _copy_batch(self, store: int) -> int:
+        """Re-embed the next batch of source rows. Returns the rows read."""
+        source_table = self.source.table
+        target_table = self.target.table
+
+        db = self.session_factories[store]()
+        try:
+            rows = (
+                db.query(source_table)
+                .filter(source_table.id > self.last_ids[store])
+                .order_by(source_table.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not rows:
+                return 0
+
+            hashes = [row.text_hash for row in rows]
+            existing = {
+                text_hash
+                for (text_hash,) in db.query(target_table.text_hash).filter(
+                    target_table.text_hash.in_(hashes)
+                )
+            }
+            pending = [row for row in rows if row.text_hash not in existing]
+
+            if pending:
+                started = time.perf_counter()
+                # Near-duplicates have no vector; they follow their canonical chunk,
+                # which has a lower id and so was copied in an earlier batch
+                embedded = [row for row in pending if row.canonical_id is None]
+                vectors = self.registry.embed_batch(
+                    [row.text for row in embedded], self.target.name
+                )
+                vector_of = {row.id: vector for row, vector in zip(embedded, vectors)}
+                canonical_ids = self._target_ids(
+                    db, {row.canonical_id for row in pending} - {None}
+                )
+                copies = [
+                    target_table(
+                        text=row.text,
+                        vector=vector_of.get(row.id),
+                        text_hash=row.text_hash,
+                        source_document=row.source_document,
+                        chunk_index=row.chunk_index,
+                        canonical_id=canonical_ids.get(row.canonical_id),
+                        extra_metadata=row.extra_metadata,
+                    )
+                    for row in pending
+                ]
+                db.add_all(copies)
+                db.flush()
+                near_duplicates.copy(
+                    db,
+                    source_table,
+                    target_table,
+                    {row.id: copy.id for row, copy in zip(pending, copies)},
+                )
+                corpus_stats.record(db, target_table, copies)
+                db.commit()
+                elapsed = time.perf_counter() - started
+                # Back off further when embedding is slow so we never saturate the CPU
+                self.pause_seconds = max(self.pause_seconds, elapsed / 2)
+
+            self.last_ids[store] = rows[-1].id
+            self.copied += len(pending)
+            self.skipped += len(rows) - len(pending)
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _target_ids(self, db, source_ids) -> Dict[int, int]:
+        """Map source row ids to the ids of their copies in the target table"""
+        if not source_ids:
+            return {}
+        source_table, target_table = self.source.table, self.target.table
+        return dict(
+            db.query(source_table.id, target_table.id)
+            .join(target_table, target_table.text_hash == source_table.text_hash)
+            .filter(source_table.id.in_(source_ids))
+            .all()
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "source": self.source.name,
+            "target": self.target.name,
+            "state": self.state,
+            "last_ids": self.last_ids,
+            "copied": self.copied,
+            "skipped": self.skipped,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
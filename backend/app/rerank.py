@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+class CrossEncoderReranker:
+    """Re-score (query, chunk) pairs with a small local cross-encoder on CPU.
+
+    Scores are cached by (query, chunk hash), so repeated questions only pay
+    for chunks they haven't seen. The reranker tracks its own cost per pair
+    so callers can size the candidate list to a latency budget.
+    """
+
+    def __init__(
+        self, model_name: str = RERANK_MODEL, cache_size: int = 10000, batch_size=32
+    ):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self._tokenizer = None
+        self.load_error: Optional[str] = None
+        # Running estimate of model cost, refined after every batch
+        self.ms_per_pair = 5.0
+        self.ms_overhead = 5.0
+
+    def _load(self) -> bool:
+        if self._model is not None:
+            return True
+        if self.load_error:
+            return False
+        with self._lock:
+            if self._model is None and not self.load_error:
+                try:
+                    import torch
+                    from transformers import (
+                        AutoModelForSequenceClassification,
+                        AutoTokenizer,
+                    )
+
+                    torch.set_grad_enabled(False)
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModelForSequenceClassification.from_pretrained(
+                        self.model_name
+                    )
+                    model.eval()
+                    self._model = model
+                except Exception as e:
+                    self.load_error = f"Could not load reranker {self.model_name}: {e}"
+                    print(f"Warning: {self.load_error}")
+        return self._model is not None
+
+    @property
+    def available(self) -> bool:
+        return self._load()
+
+    def affordable_candidates(self, budget_ms: Optional[float], wanted: int) -> int:
+        """How many candidates fit into ``budget_ms``; 0 means skip reranking"""
+        if budget_ms is None:
+            return wanted
+        affordable = int((budget_ms - self.ms_overhead) / self.ms_per_pair)
+        return max(0, min(wanted, affordable))
+
+    def score(self, query: str, chunks: List[Tuple[str, str]]) -> List[float]:
+        """Score (text_hash, text) chunks against a query in one batched pass"""
+        scores: Dict[int, float] = {}
+        missing = []
+        with self._lock:
+            for i, (text_hash, _) in enumerate(chunks):
+                key = (query, text_hash)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+                else:
+                    missing.append(i)
+
+        if missing and self._load():
+            started = time.perf_counter()
+            fresh = []
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start : start + self.batch_size]
+                inputs = self._tokenizer(
+                    [query] * len(batch),
+                    [chunks[i][1] for i in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=512,
+                    return_tensors="pt",
+                )
+                logits = self._model(**inputs).logits
+                fresh.extend(
+                    logits[:, 0].tolist() if logits.dim() > 1 else logits.tolist()
+                )
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with self._lock:
+                for i, logit in zip(missing, fresh):
+                    # Squash logits to 0..1 so they are comparable with cosine scores
+                    scores[i] = float(1 / (1 + np.exp(-logit)))
+                    self._cache[(query, chunks[i][0])] = scores[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * (
+                    elapsed_ms / len(missing)
+                )
+
+        return [scores.get(i, float("nan")) for i in range(len(chunks))]
+
+
+reranker = CrossEncoderReranker()
@@ -0,0 +1,71 @@
+from typing import List, Optional, Sequence
+import numpy as np
+
+
+def mmr_select(
+    query_vector,
+    candidate_vectors,
+    k: int,
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """Pick ``k`` diverse candidates with max marginal relevance.
+
+    Each step takes the candidate maximizing
+    ``lambda * sim(query, c) - (1 - lambda) * max(sim(c, selected))``.
+    Vectors are expected to be unit-normalized, so dot products are cosine
+    similarities. ``relevance`` overrides ``sim(query, c)``, e.g. with
+    reranker scores. The candidate similarity matrix is computed once and the
+    running max over the selected set is updated in place, so each step is a
+    single vectorized pass over the pool.
+
+    Returns indexes into ``candidate_vectors`` in selection order.
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    if k >= n and lambda_mult >= 1.0:
+        return list(range(n))
+
+    if relevance is None:
+        relevance = candidates @ np.asarray(query_vector, dtype=np.float32)
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected: List[int] = []
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def join_overlapping(chunks: List[str], max_overlap: int = 4000) -> str:
+    """Concatenate consecutive chunks, dropping the text they overlap on.
+
+    The splitter repeats the tail of each chunk at the start of the next, so
+    a naive join of neighbors would pay for those tokens twice.
+    """
+    if not chunks:
+        return ""
+    text = chunks[0]
+    for chunk in chunks[1:]:
+        probe = chunk[:32]
+        start = text.find(probe, max(0, len(text) - max_overlap)) if probe else -1
+        while start != -1 and not chunk.startswith(text[start:]):
+            start = text.find(probe, start + 1)
+        if start == -1:
+            text = f"{text} {chunk}"
+        else:
+            text += chunk[len(text) - start :]
+    return text
@@ -0,0 +1,26 @@
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The wait a 429/503 response asked for, from ``retry-after(-ms)`` headers.
+
+    Works for any error carrying an httpx-style ``response``, such as the
+    OpenAI SDK's status errors and ``httpx.HTTPStatusError``.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        if value.isdigit():
+            return float(value)
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 
 
@@ -11,7 +11,8 @@ class EmbeddingCreate(BaseModel):
 class EmbeddingResponse(BaseModel):
     id: int
     text: str
-    vector: List[float]
+    # Unset for near-duplicates linked to a canonical chunk
+    vector: Optional[List[float]] = None
     source_document: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
 
@@ -29,13 +30,57 @@ class DocumentConversionRequest(BaseModel):
     document: str
 
 
-class TextSearchRequest(BaseModel):
-    query_text: str
+class RetrievalOptions(BaseModel):
     top_k: int = 5
+    mmr: bool = False  # Diversify results with max marginal relevance
+    mmr_lambda: float = 0.5  # 1.0 = pure relevance, 0.0 = pure diversity
+    mmr_pool_size: int = 20  # Candidates fetched for MMR to choose from
+    rerank: bool = False  # Re-score candidates with the local cross-encoder
+    rerank_candidates: int = 20  # Candidates passed to the cross-encoder
+    rerank_budget_ms: Optional[float] = None  # Shrink or skip reranking to fit
+    expand_neighbors: int = 0  # Adjacent chunks to add on each side of a match
+
+
+class SearchSettings(BaseModel):
+    """Retrieval and generation settings shared by the search endpoints"""
+
+    top_k: int = Field(5, ge=1, le=200)
+    mmr: bool = False
+    mmr_lambda: float = Field(0.5, ge=0.0, le=1.0)
+    mmr_pool_size: int = Field(20, ge=1, le=200)
+    rerank: bool = False
+    rerank_candidates: int = Field(20, ge=1, le=200)
+    rerank_budget_ms: Optional[float] = Field(None, gt=0)
+    expand_neighbors: int = Field(0, ge=0, le=5)
+    use_cache: bool = True  # Allow answers from the semantic answer cache
+    context_token_budget: Optional[int] = Field(None, gt=0)
+    # Gather context from every matching provider; None uses WORKFLOW_FAN_OUT
+    fan_out: Optional[bool] = None
+
+    def retrieval_options(self) -> RetrievalOptions:
+        return RetrievalOptions(
+            top_k=self.top_k,
+            mmr=self.mmr,
+            mmr_lambda=self.mmr_lambda,
+            mmr_pool_size=self.mmr_pool_size,
+            rerank=self.rerank,
+            rerank_candidates=self.rerank_candidates,
+            rerank_budget_ms=self.rerank_budget_ms,
+            expand_neighbors=self.expand_neighbors,
+        )
+
+
+class TextSearchRequest(SearchSettings):
+    query_text: str
     conversation_id: Optional[str] = None
     memory_window: int = 5  # Number of previous turns to include in context
 
 
+class BatchSearchRequest(SearchSettings):
+    queries: List[str] = Field(..., min_length=1, max_length=500)
+    llm_concurrency: int = Field(4, ge=1, le=32)  # LLM calls in flight at once
+
+
 class SourceLink(BaseModel):
     provider: str
     link: str
@@ -49,6 +94,14 @@ class LLMResponse(BaseModel):
     conversation_id: Optional[str] = None
     provider: Optional[str] = None
     source_links: Optional[List[SourceLink]] = None
+    cache_hit: bool = False
+    context_tokens: Optional[int] = None  # Tokens of context sent to the LLM
+    context_token_budget: Optional[int] = None
+    context_truncated: bool = False
+    # Milliseconds per pipeline stage, e.g. route_ms, retrieve_ms, llm_ms
+    timings: Optional[Dict[str, float]] = None
+    # What the provider reported about its context, e.g. the age of cached config
+    metadata: Optional[Dict[str, Any]] = None
 
 
 class ConversationTurn(BaseModel):
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import random
+from typing import Any, Dict, Optional
+import httpx
+from app.retry import retry_after_seconds
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3"))
+UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "10"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "5"))
+# Requests in flight to any one host; the rest queue for a slot
+UPSTREAM_PER_HOST_CONCURRENCY = int(os.getenv("UPSTREAM_PER_HOST_CONCURRENCY", "10"))
+
+# Safe to repeat whatever happened to the first attempt
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Failures where the request never reached the server
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _transient(error: Exception) -> bool:
+    """Timeouts, dropped connections, 429 and 5xx"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class UpstreamClient:
+    """Async HTTP client shared by the services that call other systems.
+
+    One keep-alive connection pool with connect and read timeouts serves
+    every host, and at most ``per_host_concurrency`` requests go to one host
+    at a time. Idempotent requests are retried on timeouts, connection
+    errors, 429 and 5xx with full jitter backoff (or the ``Retry-After`` the
+    server asked for); other methods only when the request was never sent.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+        per_host_concurrency: int = UPSTREAM_PER_HOST_CONCURRENCY,
+    ):
+        self.max_retries = max_retries
+        self.per_host_concurrency = per_host_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=UPSTREAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+                    keepalive_expiry=30,
+                ),
+                timeout=httpx.Timeout(
+                    UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT
+                ),
+            )
+        return self._client
+
+    def open(self):
+        """Create the connection pool now rather than on the first request"""
+        self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        # Semaphores belong to the event loop that used them
+        self._host_slots.clear()
+
+    def _slots(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).netloc.decode()
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_slots[host]
+
+    def _retry_delay(
+        self, method: str, error: Exception, attempt: int
+    ) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up"""
+        if attempt >= self.max_retries:
+            return None
+        if not isinstance(error, NOT_SENT_ERRORS):
+            if method not in IDEMPOTENT_METHODS or not _transient(error):
+                return None
+            retry_after = retry_after_seconds(error)
+            if retry_after is not None:
+                return retry_after if retry_after <= UPSTREAM_BACKOFF_MAX else None
+        return random.uniform(
+            0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2**attempt)
+        )
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request, raising ``httpx.HTTPError`` once retries are spent"""
+        method = method.upper()
+        self._stats["requests"] += 1
+        attempt = 0
+        while True:
+            try:
+                async with self._slots(url):
+                    response = await self.client.request(method, url, **kwargs)
+                    response.raise_for_status()
+                    return response
+            except httpx.HTTPError as e:
+                delay = self._retry_delay(method, e, attempt)
+                if delay is None:
+                    self._stats["failures"] += 1
+                    raise
+                self._stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def patch(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("PATCH", url, **kwargs)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "hosts": {
+                host: self.per_host_concurrency - slots._value
+                for host, slots in self._host_slots.items()
+            },
+        }
+
+
+upstream = UpstreamClient()
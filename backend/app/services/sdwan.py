@@ -1,20 +1,21 @@
-import requests
+import os
+import httpx
 from typing import Dict, Any
+from app.services.http import upstream
 
 
 class SDWANService:
     """Service to interact with the mock SD-WAN API"""
 
-    def __init__(self, base_url: str = "http://mock_sdwan:8080"):
-        self.base_url = base_url
+    def __init__(self, base_url: str = None):
+        self.base_url = base_url or os.getenv("SDWAN_API_URL", "http://mock_sdwan:8080")
 
     async def get_organization_config(self) -> Dict[str, Any]:
         """Fetch organization configuration from SD-WAN controller"""
         try:
-            response = requests.get(f"{self.base_url}/organization/config")
-            response.raise_for_status()
+            response = await upstream.get(f"{self.base_url}/organization/config")
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             # For development, return mock data if API is not available
             return {
                 "organization": {
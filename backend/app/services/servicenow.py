@@ -1,7 +1,9 @@
-import requests
+import os
+import httpx
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from app.llm.base import LLMProvider
+from app.services.http import upstream
 
 
 class ServiceNowService:
@@ -9,9 +11,11 @@ class ServiceNowService:
 
     def __init__(
         self,
-        base_url: str = "http://mock_servicenow:8082",
+        base_url: str = None,
     ):
-        self.base_url = base_url
+        self.base_url = base_url or os.getenv(
+            "SERVICENOW_API_URL", "http://mock_servicenow:8082"
+        )
 
     async def get_changes(
         self, query: Optional[str] = None, limit: int = 10, offset: int = 0
@@ -25,12 +29,11 @@ class ServiceNowService:
             if query:
                 params["sysparm_query"] = query
 
-            response = requests.get(
+            response = await upstream.get(
                 f"{self.base_url}/api/now/table/change_request", params=params
             )
-            response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             # For development, return mock data if API is not available
             return {
                 "result": [
@@ -100,11 +103,10 @@ class ServiceNowService:
     ) -> Dict[str, Any]:
         """Update an existing change request"""
         try:
-            response = requests.patch(
+            response = await upstream.patch(
                 f"{self.base_url}/api/now/table/change_request/{sys_id}",
                 json=change_data,
             )
-            response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"Error updating change request: {str(e)}")
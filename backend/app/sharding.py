@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import heapq
+import os
+from contextlib import contextmanager
+from typing import Any, List, Optional, Tuple, Type
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+from app.database import Base, BaseEmbedding, upgrade_embedding_tables
+
+# Optional comma-separated Postgres instances to spread the chunk tables over
+DATABASE_SHARD_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_SHARD_URLS", "").split(",")
+    if url.strip()
+]
+SHARD_QUERY_TIMEOUT = float(os.getenv("SHARD_QUERY_TIMEOUT", "0.5"))
+
+
+class ShardedVectorStore:
+    """Chunk tables split across several Postgres instances.
+
+    Every chunk of a source document lives on the shard picked by a stable
+    hash of ``source_document``, so ingestion writes to a single shard.
+    Searches scatter to every shard concurrently and gather the global
+    top-k; a shard that misses its deadline is left out and the result is
+    flagged as partial instead of holding up the whole query.
+    """
+
+    def __init__(self, shard_urls: List[str], timeout: float = SHARD_QUERY_TIMEOUT):
+        self.timeout = timeout
+        self.engines = [create_engine(url, pool_pre_ping=True) for url in shard_urls]
+        self.session_factories = [
+            sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+            for shard_engine in self.engines
+        ]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def create_all(self):
+        """Create or upgrade the embedding tables on every shard"""
+        for shard_engine in self.engines:
+            Base.metadata.create_all(bind=shard_engine)
+            upgrade_embedding_tables(shard_engine)
+
+    def shard_for(self, source_document: Optional[str]) -> int:
+        """Index of the shard that owns a source document"""
+        digest = hashlib.md5((source_document or "").encode()).digest()
+        return int.from_bytes(digest[:8], "big") % len(self.engines)
+
+    @contextmanager
+    def ingest_session(self, source_document: Optional[str], default: Session):
+        """Session to write a document's chunks with.
+
+        Yields the owning shard's session in sharded mode, ``default``
+        otherwise.
+        """
+        if not self.enabled:
+            yield default
+            return
+
+        db = self.session_factories[self.shard_for(source_document)]()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _search_shard(
+        self, shard: int, table: Type[BaseEmbedding], query_vector, limit: int
+    ) -> List[Any]:
+        db = self.session_factories[shard]()
+        try:
+            # Make the shard give up server-side too once the deadline has passed
+            db.execute(
+                text(f"SET LOCAL statement_timeout = {int(self.timeout * 1000)}")
+            )
+            distance = table.vector.max_inner_product(query_vector)
+            return (
+                db.query(table, (-1 * distance).label("similarity"))
+                .filter(table.vector.isnot(None))
+                .order_by(distance)
+                .limit(limit)
+                .all()
+            )
+        finally:
+            db.close()
+
+    async def search(
+        self, table: Type[BaseEmbedding], query_vector, limit: int
+    ) -> Tuple[List[Any], List[int]]:
+        """Search every shard concurrently and merge the global top ``limit``.
+
+        Returns the merged (row, similarity) results and the indexes of the
+        shards that failed or missed the deadline.
+        """
+
+        async def query_shard(shard: int):
+            return await asyncio.wait_for(
+                asyncio.to_thread(
+                    self._search_shard, shard, table, query_vector, limit
+                ),
+                timeout=self.timeout,
+            )
+
+        shard_results = await asyncio.gather(
+            *(query_shard(shard) for shard in range(len(self.engines))),
+            return_exceptions=True,
+        )
+
+        candidates = []
+        missing_shards = []
+        for shard, rows in enumerate(shard_results):
+            if isinstance(rows, BaseException):
+                missing_shards.append(shard)
+                continue
+            candidates.extend(rows)
+
+        # The same chunk text can be ingested under two documents on two shards
+        best = {}
+        for row in candidates:
+            text_hash = row[0].text_hash
+            if text_hash not in best or row.similarity > best[text_hash].similarity:
+                best[text_hash] = row
+
+        merged = heapq.nlargest(limit, best.values(), key=lambda row: row.similarity)
+        return merged, missing_shards
+
+
+sharded_store = ShardedVectorStore(DATABASE_SHARD_URLS)
@@ -0,0 +1,149 @@
+import json
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Type
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.database import BaseEmbedding, CorpusStat
+
+
+def chunk_type(metadata: Optional[Dict[str, Any]]) -> str:
+    """Document type recorded for a chunk, whichever ingest path wrote it"""
+    if not metadata:
+        return "unknown"
+    return metadata.get("type") or metadata.get("source_type") or "unknown"
+
+
+class CorpusStats:
+    """Incrementally maintained chunk counts for the embedding tables.
+
+    Ingestion and deletion adjust the counters in the same transaction as the
+    rows they describe, so reading them is a primary-key lookup instead of a
+    ``COUNT(*)`` over the whole table.
+    """
+
+    def record(
+        self,
+        db: Session,
+        table: Type[BaseEmbedding],
+        chunks: Iterable[BaseEmbedding],
+        sign: int = 1,
+    ):
+        """Add (or with ``sign=-1`` subtract) chunks to the counters.
+
+        Doesn't commit; call it before the commit that writes the chunks.
+        """
+        deltas: Counter = Counter()
+        for chunk in chunks:
+            deltas[("total", "")] += sign
+            deltas[("type", chunk_type(chunk.get_metadata()))] += sign
+            deltas[("source_document", chunk.source_document or "")] += sign
+
+        for (dimension, key), delta in deltas.items():
+            stmt = insert(CorpusStat).values(
+                table_name=table.__tablename__,
+                dimension=dimension,
+                key=key,
+                chunk_count=delta,
+            )
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["table_name", "dimension", "key"],
+                    set_={"chunk_count": CorpusStat.chunk_count + delta},
+                )
+            )
+
+    def reset(self, db: Session, table: Type[BaseEmbedding]):
+        """Drop the counters of a table, e.g. after deleting all its rows"""
+        db.query(CorpusStat).filter(
+            CorpusStat.table_name == table.__tablename__
+        ).delete()
+
+    def rebuild(self, db: Session, table: Type[BaseEmbedding]):
+        """Recompute the counters from the table itself (one full scan)"""
+        self.reset(db, table)
+        counts: Counter = Counter()
+        for source_document, metadata, count in db.query(
+            table.source_document, table.extra_metadata, func.count()
+        ).group_by(table.source_document, table.extra_metadata):
+            doc_type = chunk_type(json.loads(metadata) if metadata else None)
+            counts[("total", "")] += count
+            counts[("type", doc_type)] += count
+            counts[("source_document", source_document or "")] += count
+
+        db.add_all(
+            CorpusStat(
+                table_name=table.__tablename__,
+                dimension=dimension,
+                key=key,
+                chunk_count=count,
+            )
+            for (dimension, key), count in counts.items()
+        )
+        db.commit()
+
+    def bootstrap(self, db: Session, table: Type[BaseEmbedding]) -> bool:
+        """Rebuild the counters of a table that has rows but no counters yet.
+
+        For tables filled before the counters existed; returns whether it
+        rebuilt them.
+        """
+        if db.get(CorpusStat, (table.__tablename__, "total", "")) is not None:
+            return False
+        if db.query(table.id).first() is None:
+            return False
+        self.rebuild(db, table)
+        return True
+
+    def total(self, db: Session, table: Type[BaseEmbedding]) -> int:
+        stat = db.get(CorpusStat, (table.__tablename__, "total", ""))
+        return stat.chunk_count if stat else 0
+
+    def summary(
+        self, db: Session, table: Type[BaseEmbedding], include_documents: bool = True
+    ) -> Dict[str, Any]:
+        """Counters plus the catalog's size and row estimate for a table"""
+        stats = db.query(CorpusStat).filter(
+            CorpusStat.table_name == table.__tablename__
+        )
+        if not include_documents:
+            stats = stats.filter(CorpusStat.dimension != "source_document")
+
+        by_type: Dict[str, int] = {}
+        by_document: Dict[str, int] = {}
+        total = 0
+        for stat in stats:
+            if stat.dimension == "total":
+                total = stat.chunk_count
+            elif stat.dimension == "type":
+                by_type[stat.key] = stat.chunk_count
+            else:
+                by_document[stat.key] = stat.chunk_count
+
+        catalog = (
+            db.execute(
+                text("""SELECT c.reltuples::bigint AS row_estimate,
+                        pg_table_size(c.oid) AS table_bytes,
+                        pg_indexes_size(c.oid) AS index_bytes
+                    FROM pg_class c WHERE c.oid = to_regclass(:name)"""),
+                {"name": table.__tablename__},
+            )
+            .mappings()
+            .first()
+        )
+
+        summary = {
+            "table": table.__tablename__,
+            "chunks": total,
+            "by_type": {k: v for k, v in by_type.items() if v},
+            # -1 means the table has never been analyzed
+            "planner_row_estimate": catalog["row_estimate"] if catalog else None,
+            "table_bytes": catalog["table_bytes"] if catalog else None,
+            "index_bytes": catalog["index_bytes"] if catalog else None,
+        }
+        if include_documents:
+            summary["by_source_document"] = {k: v for k, v in by_document.items() if v}
+        return summary
+
+
+corpus_stats = CorpusStats()
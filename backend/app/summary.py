@@ -0,0 +1,227 @@
+import asyncio
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Set
+from app.context import context_assembler
+from app.database import Conversation, ConversationSummary, SessionLocal
+
+# "window" inlines the last turns verbatim; "summary" sends a rolling summary
+# of older turns plus the newest MEMORY_RAW_TURNS raw
+MEMORY_MODE = os.getenv("MEMORY_MODE", "window")
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1000"))
+MEMORY_RAW_TURNS = int(os.getenv("MEMORY_RAW_TURNS", "2"))
+# "llm" summarizes with a short completion, "extractive" keeps each turn's
+# question and the first sentence of its answer
+MEMORY_SUMMARY_METHOD = os.getenv("MEMORY_SUMMARY_METHOD", "llm")
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+# A cheaper provider and/or model for summaries; unset uses the answering LLM
+MEMORY_SUMMARY_PROVIDER = os.getenv("MEMORY_SUMMARY_PROVIDER")
+MEMORY_SUMMARY_MODEL = os.getenv("MEMORY_SUMMARY_MODEL")
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user
+and an assistant. Update the summary with the new turns. Keep facts, names, device
+and configuration details, open questions and decisions; drop pleasantries and
+repetition. Answer with the updated summary only, in at most {max_words} words."""
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class ConversationSummarizer:
+    """Keeps a rolling summary of each conversation's older turns.
+
+    After every answer ``schedule`` folds the turns that fell out of the raw
+    window into the conversation's summary, in the background so the
+    response doesn't wait for it. Refreshes of one conversation never
+    overlap; turns that arrive during a refresh are picked up by a follow-up
+    run. Also tallies how many history tokens prompts saved compared to
+    inlining the turns verbatim.
+    """
+
+    def __init__(
+        self,
+        mode: str = MEMORY_MODE,
+        token_budget: int = MEMORY_TOKEN_BUDGET,
+        raw_turns: int = MEMORY_RAW_TURNS,
+        method: str = MEMORY_SUMMARY_METHOD,
+        max_summary_tokens: int = MEMORY_SUMMARY_MAX_TOKENS,
+    ):
+        self.mode = mode
+        self.token_budget = token_budget
+        self.raw_turns = raw_turns
+        self.method = method
+        self.max_summary_tokens = max_summary_tokens
+        self.llm_provider = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+        self._stats = {
+            "prompts": 0,
+            "window_tokens": 0,
+            "history_tokens": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "llm_fallbacks": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == "summary"
+
+    def count_tokens(self, text: str) -> int:
+        return context_assembler.tokenizer.count(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return context_assembler.tokenizer.truncate(text, max_tokens)
+
+    def record_prompt(self, window_tokens: int, history_tokens: int):
+        """Count one prompt's history against what the verbatim window would cost"""
+        self._stats["prompts"] += 1
+        self._stats["window_tokens"] += window_tokens
+        self._stats["history_tokens"] += history_tokens
+
+    def schedule(self, conversation_id: str):
+        """Refresh a conversation's summary in the background"""
+        if not self.enabled:
+            return
+        if conversation_id in self._running:
+            self._dirty.add(conversation_id)
+            return
+        self._running[conversation_id] = asyncio.create_task(
+            self._refresh_loop(conversation_id)
+        )
+
+    async def _refresh_loop(self, conversation_id: str):
+        try:
+            while True:
+                self._dirty.discard(conversation_id)
+                try:
+                    await self.refresh(conversation_id)
+                except Exception as e:
+                    self._stats["refresh_failures"] += 1
+                    print(f"Warning: summary refresh of {conversation_id} failed: {e}")
+                if conversation_id not in self._dirty:
+                    return
+        finally:
+            self._running.pop(conversation_id, None)
+
+    async def refresh(self, conversation_id: str) -> bool:
+        """Fold turns older than the raw window into the summary"""
+        state, pending = await asyncio.to_thread(self._pending, conversation_id)
+        if not pending:
+            return False
+        summary = state["summary"] if state else ""
+        if self.method == "llm" and self.llm_provider is not None:
+            try:
+                summary = await self._summarize_llm(summary, pending)
+            except Exception as e:
+                self._stats["llm_fallbacks"] += 1
+                print(f"Warning: LLM summary failed, using extractive summary: {e}")
+                summary = self._summarize_extractive(summary, pending)
+        else:
+            summary = self._summarize_extractive(summary, pending)
+
+        await asyncio.to_thread(
+            self._save,
+            conversation_id,
+            summary,
+            pending[-1]["id"],
+            (state["turns_summarized"] if state else 0) + len(pending),
+        )
+        self._stats["refreshes"] += 1
+        return True
+
+    def _pending(self, conversation_id: str):
+        """The stored summary and the turns it doesn't cover yet"""
+        db = SessionLocal()
+        try:
+            state = db.get(ConversationSummary, conversation_id)
+            last_turn_id = state.last_turn_id if state else 0
+            turns = (
+                db.query(Conversation.id, Conversation.query, Conversation.response)
+                .filter(
+                    Conversation.conversation_id == conversation_id,
+                    Conversation.id > last_turn_id,
+                )
+                .order_by(Conversation.id)
+                .all()
+            )
+            # The newest turns go to the prompt verbatim
+            pending = turns[: max(0, len(turns) - self.raw_turns)]
+            return (
+                (
+                    {
+                        "summary": state.summary,
+                        "turns_summarized": state.turns_summarized,
+                    }
+                    if state
+                    else None
+                ),
+                [
+                    {"id": turn.id, "query": turn.query, "response": turn.response}
+                    for turn in pending
+                ],
+            )
+        finally:
+            db.close()
+
+    def _save(self, conversation_id: str, summary: str, last_turn_id: int, turns: int):
+        db = SessionLocal()
+        try:
+            state = db.get(ConversationSummary, conversation_id)
+            if state is None:
+                state = ConversationSummary(conversation_id=conversation_id)
+                db.add(state)
+            state.summary = summary
+            state.last_turn_id = last_turn_id
+            state.turns_summarized = turns
+            state.updated_at = datetime.utcnow().isoformat()
+            db.commit()
+        finally:
+            db.close()
+
+    async def _summarize_llm(self, summary: str, turns: List[Dict[str, Any]]) -> str:
+        new_turns = "\n".join(
+            f"User: {turn['query']}\nAssistant: {turn['response']}" for turn in turns
+        )
+        response = await self.llm_provider.generate_response(
+            query=f"New turns:\n{new_turns}",
+            context=[f"Current summary:\n{summary or '(none)'}"],
+            system_prompt=SUMMARY_PROMPT.format(
+                max_words=int(self.max_summary_tokens * 0.75)
+            ),
+            temperature=0,
+            max_tokens=self.max_summary_tokens,
+        )
+        return self.truncate(response.strip(), self.max_summary_tokens)
+
+    def _summarize_extractive(self, summary: str, turns: List[Dict[str, Any]]) -> str:
+        lines = summary.splitlines() if summary else []
+        for turn in turns:
+            answer = _SENTENCE_END.split(turn["response"].strip(), 1)[0]
+            lines.append(f"- User asked: {turn['query']} Answer: {answer}")
+        # Oldest points go first when the summary outgrows its budget
+        while len(lines) > 1 and self.count_tokens("\n".join(lines)) > (
+            self.max_summary_tokens
+        ):
+            lines.pop(0)
+        return self.truncate("\n".join(lines), self.max_summary_tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        saved = self._stats["window_tokens"] - self._stats["history_tokens"]
+        return {
+            "mode": self.mode,
+            "method": self.method,
+            "token_budget": self.token_budget,
+            "raw_turns": self.raw_turns,
+            **self._stats,
+            "tokens_saved": saved,
+            "savings_ratio": (
+                saved / self._stats["window_tokens"]
+                if self._stats["window_tokens"]
+                else 0.0
+            ),
+            "refreshes_running": len(self._running),
+        }
+
+
+conversation_summarizer = ConversationSummarizer()
@@ -1,11 +1,13 @@
 import io
+import os
 import requests
 from llama_index.core import Document
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 import pypdf
 import hashlib
-from app.database import E5Embedding
+from app.embeddings import embedding_registry, ACTIVE_MODEL_MAX_AGE
+from app.stats import corpus_stats
+from app.dedup import near_duplicates
 
 
 class LlamaVectorizer:
@@ -14,12 +16,20 @@ class LlamaVectorizer:
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.embed_model = HuggingFaceEmbedding(
-                model_name="intfloat/e5-small-v2"
+            cls._instance.registry = embedding_registry
+            # Smaller chunks match more precisely; retrieval can widen them again
+            # by pulling in neighboring chunks (see RetrievalOptions.expand_neighbors)
+            cls._instance.parser = SentenceSplitter(
+                chunk_size=int(os.getenv("CHUNK_SIZE", "510")),
+                chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "50")),
             )
-            cls._instance.parser = SentenceSplitter(chunk_size=510, chunk_overlap=50)
         return cls._instance
 
+    @property
+    def embed_model(self):
+        """Embedding model of the currently active registry entry"""
+        return self.registry.get_embed_model()
+
     @staticmethod
     def convert_pdf_to_text(pdf_source):
         """Extract text from a PDF file or URL."""
@@ -41,8 +51,19 @@ class LlamaVectorizer:
 
         return text.strip()
 
-    def process_document(self, text, db_session, source_document=None):
-        """Process text: chunking, embedding, and storing in database."""
+    def process_document(
+        self, text, db_session, source_document=None, settings_session=None
+    ):
+        """Process text: chunking, embedding, and storing in database.
+
+        The active model is read from ``settings_session`` (the primary
+        database; defaults to ``db_session``) so ingestion follows a cutover
+        made by another worker.
+        """
+        spec = self.registry.load_active(
+            settings_session or db_session, max_age=ACTIVE_MODEL_MAX_AGE
+        )
+        table = spec.table
         doc = Document(text=text)
         nodes = self.parser.get_nodes_from_documents([doc])
 
@@ -59,30 +80,55 @@ class LlamaVectorizer:
                 doc_type = "web"
 
         results = []
-        for node in nodes:
+        for chunk_index, node in enumerate(nodes):
             # Generate hash first
             text_hash = hashlib.md5(node.text.encode()).hexdigest()
 
             # Check if entry exists
-            existing = (
-                db_session.query(E5Embedding).filter_by(text_hash=text_hash).first()
-            )
+            existing = db_session.query(table).filter_by(text_hash=text_hash).first()
 
             if existing:
                 results.append(existing)
+                continue
+
+            signature = None
+            canonical = None
+            if near_duplicates.enabled:
+                signature = near_duplicates.signature(node.text)
+                match = near_duplicates.find(db_session, table, signature)
+                if match:
+                    canonical = db_session.get(table, match[0])
+                    if near_duplicates.action == "skip":
+                        results.append(canonical)
+                        continue
+
+            metadata = {"type": doc_type, "source": source_document}
+            db_entry = table(
+                text=node.text,
+                text_hash=text_hash,
+                source_document=source_document,
+                chunk_index=chunk_index,
+            )
+            if canonical is not None:
+                # Keep the chunk for its document, but let the canonical copy
+                # answer searches for it; no embedding needed
+                db_entry.canonical_id = canonical.id
             else:
-                # Only generate embedding and insert if new
-                embedding = self.embed_model.get_text_embedding(node.text)
-                metadata = {"type": doc_type, "source": source_document}
-                db_entry = E5Embedding(
-                    text=node.text,
-                    vector=embedding,
-                    text_hash=text_hash,
-                    source_document=source_document,
+                # Only generate embedding if new
+                db_entry.vector = self.registry.embed(node.text, spec.name)
+            db_entry.set_metadata(metadata)
+            db_session.add(db_entry)
+            if signature is not None:
+                db_session.flush()
+                near_duplicates.add(
+                    db_session,
+                    table,
+                    db_entry.id,
+                    signature,
+                    canonical=canonical is None,
                 )
-                db_entry.set_metadata(metadata)
-                db_session.add(db_entry)
-                db_session.commit()
-                results.append(db_entry)
+            corpus_stats.record(db_session, table, [db_entry])
+            db_session.commit()
+            results.append(db_entry)
 
         return results
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from app.memory import ConversationMemory
+from app.schemas import RetrievalOptions
 
 
 class WorkflowProvider(ABC):
@@ -12,7 +13,9 @@ class WorkflowProvider(ABC):
         pass
 
     @abstractmethod
-    async def get_context(self, query: str) -> Dict[str, Any]:
+    async def get_context(
+        self, query: str, options: Optional[RetrievalOptions] = None
+    ) -> Dict[str, Any]:
         """Get relevant context for the query"""
         pass
 
@@ -26,15 +29,24 @@ class WorkflowProvider(ABC):
         query: str,
         memory: Optional[ConversationMemory] = None,
         conversation_id: Optional[str] = None,
+        options: Optional[RetrievalOptions] = None,
+        context: Optional[Dict[str, Any]] = None,
+        history: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Handle the query with optional memory support"""
-        context = await self.get_context(query)
+        """Handle the query with optional memory support.
+
+        Pass ``context`` and ``history`` (from ``memory.get_prompt_history``)
+        when they were already loaded to only build the prompt.
+        """
+        if context is None:
+            context = await self.get_context(query, options)
 
         # Get conversation history if memory is available
-        history_text = ""
-        if memory and conversation_id:
-            history = memory.get_recent_history(conversation_id)
-            history_text = memory.format_memory_for_prompt(history)
+        if history is None:
+            history = {"text": "", "tokens": 0, "window_tokens": 0}
+            if memory and conversation_id:
+                history = memory.get_prompt_history(conversation_id)
+        history_text = history["text"]
 
         # Build the system prompt based on provider capabilities and context
         capabilities = self.get_capabilities()
@@ -48,4 +60,10 @@ class WorkflowProvider(ABC):
         Previous conversation:
         {history_text}"""
 
-        return {"context": context, "prompt": prompt, "history": history_text}
+        return {
+            "context": context,
+            "prompt": prompt,
+            "history": history_text,
+            "history_tokens": history["tokens"],
+            "history_window_tokens": history["window_tokens"],
+        }
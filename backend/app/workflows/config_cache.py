@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class StaleWhileRevalidateCache:
+    """Caches one slowly changing value fetched by ``loader``.
+
+    Within ``ttl`` seconds of the last fetch the cached value is served as
+    is. Past that it is still served, but one background task refreshes it;
+    only once it is older than ``max_stale`` (or absent) do callers wait for
+    a fetch. However many callers miss at once, there is at most one
+    upstream call in flight and they all share its result. ``invalidate``
+    makes the next call fetch afresh and discards any fetch already running.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: float,
+        max_stale: float,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._value: Any = None
+        self._fetched_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Task] = None
+        # Bumped by invalidate, so fetches started before it aren't stored
+        self._generation = 0
+        self._last_error: Optional[str] = None
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "fetches": 0,
+            "refresh_failures": 0,
+            "invalidations": 0,
+        }
+
+    def age(self) -> Optional[float]:
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    async def _fetch(self, generation: int) -> Any:
+        self._stats["fetches"] += 1
+        try:
+            value = await self.loader()
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+        if generation == self._generation:
+            self._value = value
+            self._fetched_at = time.monotonic()
+            self._last_error = None
+        return value
+
+    def _start_fetch(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch(self._generation))
+            self._inflight.add_done_callback(self._fetch_done)
+        return self._inflight
+
+    def _fetch_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["refresh_failures"] += 1
+
+    async def get(self) -> Tuple[Any, Dict[str, Any]]:
+        """The value and how it was served: status ("hit", "stale" or "miss") and age"""
+        age = self.age()
+        if age is not None and age < self.ttl:
+            self._stats["hits"] += 1
+            status = "hit"
+        elif age is not None and age < self.max_stale:
+            self._stats["stale_hits"] += 1
+            status = "stale"
+            self._start_fetch()
+        else:
+            self._stats["misses"] += 1
+            status = "miss"
+            # Shielded so a cancelled caller doesn't cancel everyone's fetch
+            value = await asyncio.shield(self._start_fetch())
+            return value, {"status": status, "age_s": self.age() or 0.0}
+        return self._value, {"status": status, "age_s": age}
+
+    def invalidate(self):
+        self._generation += 1
+        self._value = None
+        self._fetched_at = None
+        self._inflight = None
+        self._stats["invalidations"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "ttl_s": self.ttl,
+            "max_stale_s": self.max_stale,
+            "age_s": self.age(),
+            "refreshing": self._inflight is not None and not self._inflight.done(),
+            "last_error": self._last_error,
+        }
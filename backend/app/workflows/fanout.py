@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from itertools import zip_longest
+from typing import Any, Dict, List, Optional
+from .base import WorkflowProvider
+from ..schemas import RetrievalOptions
+
+# Ask every matching provider for context instead of only the best one
+WORKFLOW_FAN_OUT = os.getenv("WORKFLOW_FAN_OUT", "false").lower() == "true"
+FAN_OUT_MAX_PROVIDERS = int(os.getenv("FAN_OUT_MAX_PROVIDERS", "3"))
+# Seconds a provider gets before its context is dropped; a provider can
+# override it with a ``context_timeout`` attribute
+FAN_OUT_TIMEOUT = float(os.getenv("FAN_OUT_TIMEOUT", "3"))
+
+
+class FanOutProvider(WorkflowProvider):
+    """Several providers answering one query together.
+
+    ``get_context`` asks every member at once, each under its own deadline,
+    and merges what arrived in time: chunks are interleaved in member order
+    (the router's ranking), so each system is represented when the context
+    budget cuts the tail, and source links are concatenated. A member that
+    misses its deadline or fails is dropped and reported in the metadata,
+    so the query costs the slowest member's latency at most, not the sum.
+    """
+
+    def __init__(
+        self, providers: List[WorkflowProvider], timeout: float = FAN_OUT_TIMEOUT
+    ):
+        self.providers = providers
+        self.timeout = timeout
+
+    async def can_handle(self, query: str) -> bool:
+        return True
+
+    def get_capabilities(self) -> Dict[str, Any]:
+        members = [provider.get_capabilities() for provider in self.providers]
+        return {
+            "name": " + ".join(member["name"] for member in members),
+            "description": "; ".join(member["description"] for member in members),
+            "capabilities": [
+                capability
+                for member in members
+                for capability in member["capabilities"]
+            ],
+            "limitations": [
+                limitation for member in members for limitation in member["limitations"]
+            ],
+        }
+
+    async def _member_context(
+        self,
+        provider: WorkflowProvider,
+        query: str,
+        options: Optional[RetrievalOptions],
+    ) -> Dict[str, Any]:
+        timeout = getattr(provider, "context_timeout", None) or self.timeout
+        started = time.perf_counter()
+        outcome: Dict[str, Any] = {}
+        try:
+            outcome["context"] = await asyncio.wait_for(
+                provider.get_context(query, options), timeout
+            )
+            outcome["status"] = "ok"
+        except asyncio.TimeoutError:
+            outcome["status"] = "late"
+            print(
+                f"Warning: {provider.get_capabilities()['name']} missed its "
+                f"{timeout}s deadline, answering without it"
+            )
+        except Exception as e:
+            outcome.update(status="failed", error=str(e))
+        outcome["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return outcome
+
+    async def get_context(
+        self, query: str, options: Optional[RetrievalOptions] = None
+    ) -> Dict[str, Any]:
+        """Gather and merge the members' context"""
+        outcomes = await asyncio.gather(
+            *(self._member_context(p, query, options) for p in self.providers)
+        )
+
+        chunk_lists, source_links = [], []
+        contexts: Dict[str, Any] = {}
+        report: Dict[str, Any] = {}
+        for provider, outcome in zip(self.providers, outcomes):
+            name = provider.get_capabilities()["name"]
+            context = outcome.pop("context", None)
+            report[name] = outcome
+            if not isinstance(context, dict):
+                continue
+            contexts[name] = context
+            if context.get("metadata"):
+                outcome["metadata"] = context["metadata"]
+            # Label each chunk with its system, they're mixed from here on
+            chunk_lists.append(
+                [f"[{name}]\n{chunk}" for chunk in context.get("context_chunks", [])]
+            )
+            source_links.extend(context.get("source_links", []))
+
+        if not contexts:
+            raise ValueError(f"No provider returned context in time: {report}")
+
+        return {
+            "context_chunks": [
+                chunk
+                for round_ in zip_longest(*chunk_lists)
+                for chunk in round_
+                if chunk is not None
+            ],
+            "source_links": source_links,
+            "providers": contexts,
+            "metadata": {"fan_out": report},
+        }
@@ -0,0 +1,105 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def _normalize(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+def _trie_pattern(keywords: Sequence[str]) -> str:
+    """One regex alternation for all keywords, factored by common prefix.
+
+    ``change``, ``change request`` and ``change risk`` become
+    ``change(?:\\s+r(?:equest|isk))?``: the engine walks each prefix once
+    instead of trying every keyword in turn, and optional tails are greedy,
+    so the longest keyword at a position wins.
+    """
+    trie: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        ends_here = "" in node
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not ends_here:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if ends_here else group
+
+    return build(trie)
+
+
+@dataclass
+class RouteMatch:
+    """Keywords one provider matched in a query"""
+
+    provider: Any
+    score: float = 0.0
+    keywords: List[str] = field(default_factory=list)
+
+    def explain(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider.get_capabilities()["name"],
+            "score": self.score,
+            "keywords": self.keywords,
+        }
+
+
+class KeywordRouter:
+    """Scores every provider's keywords against a query in one regex pass.
+
+    All keywords of all providers are compiled into a single prefix-factored
+    pattern. Keywords match case-insensitively as whole words, optionally
+    plural, so ``device`` matches "devices" but ``ip`` matches neither "zip"
+    nor "ipsec" and ``change`` doesn't match "changelog". Each match adds
+    its number of words to the score of every provider that lists the
+    keyword, so "change request" outweighs "change" alone.
+    """
+
+    def __init__(self):
+        self.providers: List[Any] = []
+        self._owners: Dict[str, List[int]] = {}
+        self._pattern: Optional[re.Pattern] = None
+
+    def build(self, providers: Sequence[Any]):
+        """Compile the keywords of ``providers``, in priority order"""
+        self.providers = list(providers)
+        self._owners = {}
+        for index, provider in enumerate(self.providers):
+            for keyword in getattr(provider, "keywords", None) or []:
+                owners = self._owners.setdefault(_normalize(keyword), [])
+                if index not in owners:
+                    owners.append(index)
+        self._pattern = None
+        if self._owners:
+            keywords = _trie_pattern(list(self._owners))
+            self._pattern = re.compile(
+                r"(?<!\w)(" + keywords + r")(?:e?s)?(?!\w)", re.IGNORECASE
+            )
+
+    def score(self, query: str) -> List[RouteMatch]:
+        """Matches of every provider with at least one keyword in the query"""
+        matches: Dict[int, RouteMatch] = {}
+        if self._pattern is None:
+            return []
+        for found in self._pattern.finditer(query):
+            keyword = _normalize(found.group(1))
+            for index in self._owners[keyword]:
+                match = matches.setdefault(index, RouteMatch(self.providers[index]))
+                match.score += len(keyword.split())
+                match.keywords.append(keyword)
+        # Highest score first; ties go to the provider registered first
+        return [
+            matches[index]
+            for index in sorted(matches, key=lambda i: (-matches[i].score, i))
+        ]
@@ -1,18 +1,28 @@
-from typing import Dict, Any, List, Optional
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Any, Callable, List, Optional
 from .base import WorkflowProvider
-from ..database import E5Embedding
 from ..utils import LlamaVectorizer
+from ..embeddings import ACTIVE_MODEL_MAX_AGE
+from ..sharding import sharded_store
 from llama_index.core import Document
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from ..schemas import SourceLink
+from ..schemas import RetrievalOptions, SourceLink
+from ..retrieval import join_overlapping, mmr_select
+from ..rerank import reranker
 from ..memory import ConversationMemory
 
 
 class KnowledgeBaseWorkflowProvider(WorkflowProvider):
     """Provider for knowledge base document queries with LLM fallback"""
 
-    def __init__(self, db: Session, vectorizer: LlamaVectorizer):
-        self.db = db
+    def __init__(
+        self, session_factory: Callable[[], Session], vectorizer: LlamaVectorizer
+    ):
+        # Opens a session per search, so searches can be routed to read replicas
+        self.session_factory = session_factory
         self.vectorizer = vectorizer
         self.keywords = [
             "document",
@@ -26,35 +36,77 @@ class KnowledgeBaseWorkflowProvider(WorkflowProvider):
             "file",
             "pdf",
         ]
+        # Representative questions, for the semantic router's centroid
+        self.example_queries = [
+            "What does the design guide recommend for branch deployments?",
+            "Summarize the best practices document for network segmentation",
+            "Where in the documentation is the failover procedure described?",
+            "What does the manual say about firmware upgrades?",
+        ]
 
     async def can_handle(self, query: str) -> bool:
         """This provider can handle any query, either with vector search or LLM fallback"""
         return True
 
-    async def get_context(self, query: str) -> Dict[str, Any]:
-        """Get context from knowledge base documents"""
-        doc = Document(text=query)
-        nodes = self.vectorizer.parser.get_nodes_from_documents([doc])
-        query_vector = self.vectorizer.embed_model.get_text_embedding(nodes[0].text)
-
-        # Search vector store
-        results = (
-            self.db.query(
-                E5Embedding,
-                (1 - E5Embedding.vector.cosine_distance(query_vector)).label(
-                    "similarity"
-                ),
-            )
-            .order_by(E5Embedding.vector.cosine_distance(query_vector))
-            .limit(5)
-            .all()
+    async def get_context(
+        self,
+        query: str,
+        options: Optional[RetrievalOptions] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> Dict[str, Any]:
+        """Get context from knowledge base documents.
+
+        ``query_vector`` skips embedding the query, e.g. when a batch of
+        queries was embedded at once (see ``embed_queries``).
+        """
+        options = options or RetrievalOptions()
+        timings: Dict[str, float] = {}
+
+        # Reranking and MMR need a wider pool of candidates to choose from
+        limit = options.top_k
+        if options.mmr:
+            limit = max(limit, options.mmr_pool_size)
+        if options.rerank:
+            limit = max(limit, options.rerank_candidates)
+        spec, query_vector, results, missing_shards = await self._search(
+            query, limit, timings, query_vector
         )
 
         # Filter results by relevance threshold
-        relevant_results = [
-            result for result in results if float(result.similarity) > 0.8
+        candidates = [
+            (result[0], float(result.similarity))
+            for result in results
+            if float(result.similarity) > 0.8
         ]
 
+        rerank_scores: Dict[int, float] = {}
+        rerank_skipped = None
+        if options.rerank and candidates:
+            candidates, rerank_scores, rerank_skipped = await self._rerank(
+                query, candidates, options, timings
+            )
+
+        if options.mmr and len(candidates) > options.top_k:
+            started = time.perf_counter()
+            relevance = None
+            if rerank_scores:
+                # Let MMR trade diversity against the cross-encoder's relevance
+                relevance = [
+                    rerank_scores.get(id(row), similarity)
+                    for row, similarity in candidates
+                ]
+            picked = mmr_select(
+                query_vector,
+                [row.vector for row, _ in candidates],
+                options.top_k,
+                options.mmr_lambda,
+                relevance=relevance,
+            )
+            relevant_results = [candidates[i] for i in picked]
+            timings["mmr_ms"] = (time.perf_counter() - started) * 1000
+        else:
+            relevant_results = candidates[: options.top_k]
+
         if not relevant_results:
             return {
                 "context_chunks": [],
@@ -63,22 +115,42 @@ class KnowledgeBaseWorkflowProvider(WorkflowProvider):
                     "provider": "Knowledge Base",
                     "reason": "No high relevance documents found",
                     "fallback": True,
+                    "partial": bool(missing_shards),
+                    "missing_shards": missing_shards,
+                    "timings": timings,
                 },
             }
 
+        # Widen each small matched chunk with its neighbors from the same document
+        passages = [
+            (result, similarity, result.text) for result, similarity in relevant_results
+        ]
+        if options.expand_neighbors:
+            started = time.perf_counter()
+            passages = await asyncio.to_thread(
+                self._expand_neighbors,
+                spec.table,
+                relevant_results,
+                options.expand_neighbors,
+            )
+            timings["expand_ms"] = (time.perf_counter() - started) * 1000
+
         # Extract context and source links from vector search results
         context_chunks = []
         source_links = []
-        for result, similarity in relevant_results:
-            context_chunks.append(result.text)
+        for result, similarity, passage in passages:
+            context_chunks.append(passage)
+            link_metadata = {
+                "text": result.text[:100] + "...",
+                "relevance": similarity,
+            }
+            if id(result) in rerank_scores:
+                link_metadata["rerank_score"] = rerank_scores[id(result)]
             source_links.append(
                 SourceLink(
                     provider="Knowledge Base",
                     link=result.source_document,
-                    metadata={
-                        "text": result.text[:100] + "...",
-                        "relevance": float(similarity),
-                    },
+                    metadata=link_metadata,
                 )
             )
 
@@ -87,17 +159,209 @@ class KnowledgeBaseWorkflowProvider(WorkflowProvider):
             "source_links": source_links,
             "metadata": {
                 "provider": "Knowledge Base",
+                "embedding_model": spec.name,
                 "relevance_threshold": 0.8,
                 "num_results": len(relevant_results),
+                "mmr": options.mmr,
+                "expand_neighbors": options.expand_neighbors,
+                "reranked": bool(rerank_scores),
+                "rerank_candidates": len(rerank_scores),
+                "rerank_skipped": rerank_skipped,
                 "fallback": False,
+                "partial": bool(missing_shards),
+                "missing_shards": missing_shards,
+                "timings": timings,
             },
         }
 
+    def _expand_neighbors(self, table, hits, window: int):
+        """Replace each hit's text with the run of chunks around it.
+
+        Windows that touch within a document are merged into one passage,
+        credited to the best-ranked hit inside it. All neighbors of a store
+        come back in a single query on the (source_document, chunk_index)
+        index. Returns (hit, similarity, passage) in rank order.
+        """
+        # Merge the [index - window, index + window] ranges per document
+        ranges: Dict[str, List[List[int]]] = defaultdict(list)
+        for row, _ in hits:
+            if row.source_document is None or row.chunk_index is None:
+                continue
+            ranges[row.source_document].append(
+                [max(0, row.chunk_index - window), row.chunk_index + window]
+            )
+        for document, spans in ranges.items():
+            spans.sort()
+            merged = [spans[0]]
+            for low, high in spans[1:]:
+                if low <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], high)
+                else:
+                    merged.append([low, high])
+            ranges[document] = merged
+
+        # One fetch per store; in sharded mode a document lives on one shard
+        by_store: Dict[int, List] = defaultdict(list)
+        for document, spans in ranges.items():
+            store = sharded_store.shard_for(document) if sharded_store.enabled else 0
+            for low, high in spans:
+                by_store[store].append(
+                    and_(
+                        table.source_document == document,
+                        table.chunk_index.between(low, high),
+                    )
+                )
+        neighbors: Dict[tuple, str] = {}
+        for store, conditions in by_store.items():
+            db = (
+                sharded_store.session_factories[store]()
+                if sharded_store.enabled
+                else self.session_factory()
+            )
+            try:
+                for document, index, text in db.query(
+                    table.source_document, table.chunk_index, table.text
+                ).filter(or_(*conditions)):
+                    neighbors[(document, index)] = text
+            finally:
+                db.close()
+
+        passages = []
+        used = set()
+        for row, similarity in hits:
+            spans = ranges.get(row.source_document)
+            if not spans or row.chunk_index is None:
+                passages.append((row, similarity, row.text))
+                continue
+            span = next(s for s in spans if s[0] <= row.chunk_index <= s[1])
+            key = (row.source_document, span[0])
+            if key in used:
+                # Already part of a better-ranked hit's passage
+                continue
+            used.add(key)
+            texts = [
+                neighbors[(row.source_document, index)]
+                for index in range(span[0], span[1] + 1)
+                if (row.source_document, index) in neighbors
+            ]
+            passages.append((row, similarity, join_overlapping(texts) or row.text))
+        return passages
+
+    async def _rerank(self, query, candidates, options, timings):
+        """Re-order the head of the candidate list with the cross-encoder.
+
+        Returns the re-ordered candidates, the rerank scores keyed by row id
+        and, if reranking was skipped, the reason.
+        """
+        # The first call loads the model, keep that off the event loop
+        if not await asyncio.to_thread(lambda: reranker.available):
+            return candidates, {}, reranker.load_error
+
+        # Spend whatever is left of the latency budget after retrieval
+        budget = options.rerank_budget_ms
+        if budget is not None:
+            budget -= sum(timings.values())
+        n = reranker.affordable_candidates(
+            budget, min(options.rerank_candidates, len(candidates))
+        )
+        if n < 2:
+            return candidates, {}, "latency budget exhausted"
+
+        head, tail = candidates[:n], candidates[n:]
+        started = time.perf_counter()
+        scores = await asyncio.to_thread(
+            reranker.score, query, [(row.text_hash, row.text) for row, _ in head]
+        )
+        timings["rerank_ms"] = (time.perf_counter() - started) * 1000
+
+        order = sorted(range(n), key=lambda i: scores[i], reverse=True)
+        rerank_scores = {id(head[i][0]): scores[i] for i in order}
+        return [head[i] for i in order] + tail, rerank_scores, None
+
+    def _query_text(self, query: str) -> str:
+        """The part of a query that gets embedded: its first parser chunk"""
+        doc = Document(text=query)
+        return self.vectorizer.parser.get_nodes_from_documents([doc])[0].text
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries in one model batch, for ``get_context(query_vector=)``"""
+        return self.vectorizer.registry.embed_batch(
+            [self._query_text(query) for query in queries]
+        )
+
+    async def _search(
+        self,
+        query: str,
+        limit: int,
+        timings: Dict[str, float],
+        query_vector: Optional[List[float]] = None,
+    ):
+        """Run the vector search.
+
+        Returns the model spec, the query vector, the (row, similarity) pairs
+        with their vectors loaded, and the shards that didn't answer in time
+        (always empty outside sharded mode). Stage durations go into ``timings``.
+        """
+        spec, query_vector = await asyncio.to_thread(
+            self._embed_query, query, query_vector, timings
+        )
+
+        started = time.perf_counter()
+        if sharded_store.enabled:
+            results, missing_shards = await sharded_store.search(
+                spec.table, query_vector, limit=limit
+            )
+        else:
+            # Blocking database work runs on a pooled connection off the event loop
+            results = await asyncio.to_thread(
+                self._search_table, spec.table, query_vector, limit
+            )
+            missing_shards = []
+        timings["search_ms"] = (time.perf_counter() - started) * 1000
+        return spec, query_vector, results, missing_shards
+
+    def _embed_query(self, query: str, query_vector, timings: Dict[str, float]):
+        db = self.session_factory()
+        try:
+            # Route the search to the table of the active embedding model
+            spec = self.vectorizer.registry.load_active(
+                db, max_age=ACTIVE_MODEL_MAX_AGE
+            )
+        finally:
+            db.close()
+
+        # A vector embedded ahead of time by a since-replaced model can't be used
+        if query_vector is None or len(query_vector) != spec.dimension:
+            started = time.perf_counter()
+            query_vector = self.vectorizer.registry.embed(
+                self._query_text(query), spec.name
+            )
+            timings["embed_ms"] = (time.perf_counter() - started) * 1000
+        return spec, query_vector
+
+    def _search_table(self, table, query_vector, limit: int):
+        db = self.session_factory()
+        try:
+            # Vectors are unit-normalized, so the inner product equals cosine
+            # similarity; <#> returns it negated for ascending order.
+            distance = table.vector.max_inner_product(query_vector)
+            return (
+                db.query(table, (-1 * distance).label("similarity"))
+                .filter(table.vector.isnot(None))
+                .order_by(distance)
+                .limit(limit)
+                .all()
+            )
+        finally:
+            db.close()
+
     def get_capabilities(self) -> Dict[str, Any]:
         """Get knowledge base provider capabilities"""
         return {
             "name": "Knowledge Base Provider",
-            "description": "Provider for knowledge base document queries with LLM fallback",
+            "description": (
+                "Provider for knowledge base document queries with LLM fallback"
+            ),
             "capabilities": [
                 "Vector-based document search",
                 "High relevance matching (>80%)",
@@ -117,20 +381,30 @@ class KnowledgeBaseWorkflowProvider(WorkflowProvider):
         query: str,
         memory: Optional[ConversationMemory] = None,
         conversation_id: Optional[str] = None,
+        options: Optional[RetrievalOptions] = None,
+        context: Optional[Dict[str, Any]] = None,
+        history: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Handle the query with optional memory support and fallback handling"""
-        context = await self.get_context(query)
+        """Handle the query with optional memory support and fallback handling.
+
+        Pass ``context`` and ``history`` (from ``memory.get_prompt_history``)
+        when they were already loaded to only build the prompt.
+        """
+        if context is None:
+            context = await self.get_context(query, options)
 
         # Get conversation history if memory is available
-        history_text = ""
-        if memory and conversation_id:
-            history = memory.get_recent_history(conversation_id)
-            history_text = memory.format_memory_for_prompt(history)
+        if history is None:
+            history = {"text": "", "tokens": 0, "window_tokens": 0}
+            if memory and conversation_id:
+                history = memory.get_prompt_history(conversation_id)
+        history_text = history["text"]
 
         # Build the system prompt based on provider capabilities and context
         capabilities = self.get_capabilities()
+        topics = ", ".join(capabilities["capabilities"])
         prompt = f"""You are a specialized assistant for {capabilities['name']}.
-        Analyze the provided context to answer questions about {', '.join(capabilities['capabilities'])}.
+        Analyze the provided context to answer questions about {topics}.
         Be specific and reference actual configuration details.
 
         Provider Limitations:
@@ -150,4 +424,10 @@ class KnowledgeBaseWorkflowProvider(WorkflowProvider):
             3. If you're not certain about something, acknowledge the uncertainty
             4. Focus on factual information rather than speculation"""
 
-        return {"context": context, "prompt": prompt, "history": history_text}
+        return {
+            "context": context,
+            "prompt": prompt,
+            "history": history_text,
+            "history_tokens": history["tokens"],
+            "history_window_tokens": history["window_tokens"],
+        }
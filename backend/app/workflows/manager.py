@@ -1,6 +1,9 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import Callable, List, Dict, Any, Optional
 from .base import WorkflowProvider
-from .knowledge_provider import KnowledgeBaseWorkflowProvider
+from .keyword_router import KeywordRouter
+from .semantic_router import SemanticRouter
+from .fanout import FanOutProvider, FAN_OUT_MAX_PROVIDERS
 
 
 class WorkflowManager:
@@ -9,6 +12,9 @@ class WorkflowManager:
     def __init__(self):
         self.providers: List[WorkflowProvider] = []
         self.fallback_provider: Optional[WorkflowProvider] = None
+        self.keyword_router = KeywordRouter()
+        self.semantic_router: Optional[SemanticRouter] = None
+        self.embed_queries: Optional[Callable[[List[str]], List[List[float]]]] = None
 
     def register_provider(self, provider: WorkflowProvider, is_fallback: bool = False):
         """Register a workflow provider"""
@@ -16,34 +22,112 @@ class WorkflowManager:
             self.fallback_provider = provider
         else:
             self.providers.append(provider)
+            self.keyword_router.build(self.providers)
+        if self.semantic_router:
+            self.semantic_router.build(self._all_providers())
 
-    async def get_provider(self, query: str) -> WorkflowProvider:
-        """Get the appropriate provider for the query"""
+    def enable_semantic_routing(
+        self,
+        router: SemanticRouter,
+        embed_queries: Callable[[List[str]], List[List[float]]],
+    ):
+        """Route by query embedding first, with keywords as the fallback.
+
+        ``embed_queries`` must embed with the model the router's registry
+        has active, e.g. the knowledge provider's ``embed_queries``.
+        """
+        self.semantic_router = router
+        self.embed_queries = embed_queries
+        router.build(self._all_providers())
+
+    def _all_providers(self) -> List[WorkflowProvider]:
+        if self.fallback_provider:
+            return [*self.providers, self.fallback_provider]
+        return list(self.providers)
+
+    async def route(
+        self,
+        query: str,
+        query_vector: Optional[List[float]] = None,
+        fan_out: bool = False,
+    ) -> Dict[str, Any]:
+        """Pick the provider for a query and explain why.
+
+        With semantic routing enabled and the query's vector given, the
+        provider whose centroid is confidently closest wins. Otherwise
+        providers that declare ``keywords`` are scored in one pass by the
+        keyword router and the best scoring one wins. Without a keyword
+        match, providers that don't declare keywords are asked through
+        ``can_handle``, in registration order, before the fallback.
+
+        With ``fan_out``, a query that matches several providers - the
+        semantic pick and every keyword match, up to FAN_OUT_MAX_PROVIDERS -
+        goes to all of them at once through a ``FanOutProvider``.
+        """
         if not self.providers and not self.fallback_provider:
             raise ValueError("No providers registered")
 
-        # First try the KnowledgeBase provider if it exists
-        knowledge_provider = next(
-            (p for p in self.providers if isinstance(p, KnowledgeBaseWorkflowProvider)),
-            None,
-        )
-        if knowledge_provider:
-            # Check if KnowledgeBase can handle with high relevance
-            if await knowledge_provider.can_handle(query):
-                return knowledge_provider
-
-        # Then try other providers
-        for provider in self.providers:
-            if not isinstance(provider, KnowledgeBaseWorkflowProvider):
-                if await provider.can_handle(query):
-                    return provider
+        semantic, decision = [], None
+        if self.semantic_router and query_vector is not None:
+            decision = await self._evaluate_provider_for_query(query, query_vector)
+            semantic = decision["semantic"]
+
+        matches = self.keyword_router.score(query)
+        explanation = [match.explain() for match in matches]
+        if fan_out:
+            members = [match.provider for match in matches]
+            if decision and decision["provider"] in self.providers:
+                members.insert(0, decision["provider"])
+            members = list(dict.fromkeys(members))[:FAN_OUT_MAX_PROVIDERS]
+            if len(members) > 1:
+                return {
+                    "provider": FanOutProvider(members),
+                    "reason": "fan_out",
+                    "matches": explanation,
+                    "semantic": semantic,
+                }
+
+        if decision and decision["provider"] is not None:
+            return {**decision, "matches": explanation}
+        if matches:
+            return {
+                "provider": matches[0].provider,
+                "reason": "keywords",
+                "matches": explanation,
+                "semantic": semantic,
+            }
+
+        others = [p for p in self.providers if not getattr(p, "keywords", None)]
+        handles = await asyncio.gather(*(p.can_handle(query) for p in others))
+        for provider, handled in zip(others, handles):
+            if handled:
+                return {
+                    "provider": provider,
+                    "reason": "can_handle",
+                    "matches": [],
+                    "semantic": semantic,
+                }
 
         # If no provider matches, use fallback
         if self.fallback_provider:
-            return self.fallback_provider
+            return {
+                "provider": self.fallback_provider,
+                "reason": "fallback",
+                "matches": [],
+                "semantic": semantic,
+            }
 
         raise ValueError("No provider available for query")
 
+    async def get_provider(
+        self,
+        query: str,
+        query_vector: Optional[List[float]] = None,
+        fan_out: bool = False,
+    ) -> WorkflowProvider:
+        """Get the appropriate provider for the query"""
+        return (await self.route(query, query_vector, fan_out))["provider"]
+
     async def get_capabilities(self) -> Dict[str, Any]:
         """Get capabilities of all providers"""
         capabilities = []
@@ -53,39 +137,35 @@ class WorkflowManager:
             capabilities.append(self.fallback_provider.get_capabilities())
         return {"providers": capabilities}
 
-    async def get_provider_with_context(self, query: str) -> Optional[WorkflowProvider]:
-        # Add provider context awareness
-        provider_capabilities = {
-            provider.get_capabilities()["name"]: {
-                "description": provider.get_capabilities()["description"],
-                "capabilities": provider.get_capabilities()["capabilities"],
-                "keywords": provider.keywords,
-            }
-            for provider in self.providers
-        }
+    async def get_provider_with_context(
+        self, query: str, query_vector: Optional[List[float]] = None
+    ) -> Optional[WorkflowProvider]:
+        """The provider semantically closest to the query, if confidently so.
 
-        # Let the LLM evaluate the query with full provider context
-        # This would be part of the system prompt for the LLM
-        provider_context = f"""
-        Available providers and their capabilities:
-        {provider_capabilities}
-        
-        Query type evaluation rules:
-        1. For queries about current state/configuration, use the relevant system provider
-        2. For queries about making changes/requests, use ServiceNow provider
-        3. For queries about documentation/best practices, use Knowledge Base provider
-        4. For complex queries requiring multiple contexts, prioritize the action provider
-           (e.g., for 'create change based on current config', use ServiceNow)
+        Embeds the query unless its vector is given; returns None when
+        semantic routing is off or no provider is a confident match.
         """
-
-        # The LLM would then evaluate the query with this context
-        # and return the most appropriate provider
-        return await self._evaluate_provider_for_query(query, provider_context)
+        if not self.semantic_router:
+            return None
+        if query_vector is None:
+            query_vector = (await asyncio.to_thread(self.embed_queries, [query]))[0]
+        decision = await self._evaluate_provider_for_query(query, query_vector)
+        return decision["provider"]
 
     async def _evaluate_provider_for_query(
-        self, query: str, provider_context: str
-    ) -> Optional[WorkflowProvider]:
-        # Implementation of _evaluate_provider_for_query method
-        # This method should return the most appropriate provider based on the query and provider_context
-        # This is a placeholder and should be implemented based on your specific requirements
-        return None
+        self, query: str, query_vector: List[float]
+    ) -> Dict[str, Any]:
+        """Score the query vector against every provider centroid"""
+        # The first call per embedding model computes the centroids
+        scores = await asyncio.to_thread(self.semantic_router.score, query_vector)
+        provider, lead = self.semantic_router.decide(scores)
+        return {
+            "provider": provider,
+            "reason": "semantic",
+            "confidence": lead,
+            "matches": [],
+            "semantic": [
+                {"provider": p.get_capabilities()["name"], "similarity": similarity}
+                for p, similarity in scores
+            ],
+        }
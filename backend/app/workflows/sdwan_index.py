@@ -0,0 +1,442 @@
+import ipaddress
+import os
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .keyword_router import _normalize
+
+# Devices rendered in full for one query; a selection larger than this (or
+# a question naming no device) leads with a fleet summary instead
+SDWAN_CONTEXT_MAX_DEVICES = int(os.getenv("SDWAN_CONTEXT_MAX_DEVICES", "20"))
+
+# Query words for the device statuses the controller reports
+STATUS_SYNONYMS = {
+    "offline": "down",
+    "unreachable": "down",
+    "online": "active",
+}
+
+# Most names listed per group in the fleet summary
+SUMMARY_MAX_NAMES = 20
+
+_ADDRESS = re.compile(
+    r"(?<![\w.:])(?:\d{1,3}(?:\.\d{1,3}){3}|[0-9a-f]{0,4}(?::[0-9a-f]{0,4}){2,7})"
+    r"(?:/\d{1,3})?(?![\w.:])",
+    re.IGNORECASE,
+)
+_VLAN_ID = re.compile(r"\bvlans?\s*(?:id\s*)?#?(\d+)", re.IGNORECASE)
+_TOKEN = re.compile(r"\w[\w.\-]*")
+
+
+def _vlan_terms(name: str) -> List[str]:
+    """Query phrases naming a VLAN.
+
+    A one-word name like "Data" or "Voice" is an everyday word, so it only
+    counts next to "vlan" ("data vlan", "vlan data"); "data center" doesn't
+    pick the Data VLAN. Names of several words or with digits or
+    separators are specific enough on their own.
+    """
+    terms = [f"{name} vlan", f"{name} vlans", f"vlan {name}"]
+    if not name.isalpha():
+        terms.append(name)
+    return terms
+
+
+def _parse_prefix(text: str) -> Optional[Tuple[int, int, int]]:
+    """``address[/length]`` as (IP version, address, prefix length)"""
+    address, _, length = text.partition("/")
+    try:
+        parsed = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    prefixlen = int(length) if length.isdigit() else parsed.max_prefixlen
+    if prefixlen > parsed.max_prefixlen:
+        return None
+    return parsed.version, int(parsed), prefixlen
+
+
+def _span(version: int, address: int, prefixlen: int) -> Tuple[int, int]:
+    """First and last address of the prefix holding ``address``"""
+    host_bits = (32 if version == 4 else 128) - prefixlen
+    start = address >> host_bits << host_bits
+    return start, start | ((1 << host_bits) - 1)
+
+
+@dataclass(frozen=True)
+class PrefixEntry:
+    """One address or subnet configured on a device"""
+
+    device: int
+    label: str
+    version: int
+    start: int
+    prefixlen: int
+
+    @property
+    def end(self) -> int:
+        return _span(self.version, self.start, self.prefixlen)[1]
+
+    @property
+    def network(self) -> str:
+        return str(ipaddress.ip_network((self.start, self.prefixlen)))
+
+
+class PrefixIndex:
+    """Device subnets and addresses for longest-prefix and containment lookups.
+
+    Entries are kept in one hash table per (IP version, prefix length), so
+    the longest prefix holding an address takes one lookup per length in
+    use, and in a list sorted by network address, so the entries inside a
+    query prefix are one bisect and a scan of the matches.
+    """
+
+    def __init__(self):
+        self._by_length: Dict[Tuple[int, int], Dict[int, List[PrefixEntry]]] = {}
+        self._lengths: Dict[int, List[int]] = {}
+        self._sorted: Dict[int, List[Tuple[int, int, PrefixEntry]]] = {}
+        self._starts: Dict[int, List[int]] = {}
+
+    def add(self, entry: PrefixEntry):
+        table = self._by_length.setdefault((entry.version, entry.prefixlen), {})
+        table.setdefault(entry.start, []).append(entry)
+        self._sorted.setdefault(entry.version, []).append(
+            (entry.start, entry.end, entry)
+        )
+
+    def freeze(self):
+        """Sort the entries; call once after the last ``add``"""
+        for version, entries in self._sorted.items():
+            entries.sort(key=lambda item: (item[0], item[1]))
+            self._starts[version] = [start for start, _, _ in entries]
+        lengths = defaultdict(list)
+        for version, prefixlen in self._by_length:
+            lengths[version].append(prefixlen)
+        self._lengths = {
+            version: sorted(prefixlens, reverse=True)
+            for version, prefixlens in lengths.items()
+        }
+
+    def longest_match(
+        self, version: int, address: int, prefixlen: int
+    ) -> List[PrefixEntry]:
+        """Entries of the most specific prefix holding all of the given one"""
+        for length in self._lengths.get(version, []):
+            if length <= prefixlen:
+                start, _ = _span(version, address, length)
+                entries = self._by_length[(version, length)].get(start)
+                if entries:
+                    return entries
+        return []
+
+    def within(self, version: int, address: int, prefixlen: int) -> List[PrefixEntry]:
+        """Entries whose prefix lies inside the given one"""
+        start, end = _span(version, address, prefixlen)
+        entries = self._sorted.get(version, [])
+        found = []
+        for index in range(
+            bisect_left(self._starts.get(version, []), start), len(entries)
+        ):
+            entry_start, entry_end, entry = entries[index]
+            if entry_start > end:
+                break
+            if entry_end <= end:
+                found.append(entry)
+        return found
+
+
+@dataclass
+class Selection:
+    """Devices a query is about, best first, and what picked them"""
+
+    devices: List[int] = field(default_factory=list)
+    selectors: Dict[str, List[str]] = field(default_factory=dict)
+    notes: Dict[int, List[str]] = field(default_factory=dict)
+    fleet_wide: bool = False
+
+
+class SDWANConfigIndex:
+    """Organization config indexed for building query-specific context.
+
+    Built once per fetched config: each device's context chunk is rendered
+    up front, inverted indexes map device names (and the parts of names
+    that single out a few devices, like a site), models, statuses and VLAN
+    ids and names to devices, and a ``PrefixIndex`` holds every interface
+    and VLAN address and subnet. ``select`` resolves a query against them
+    with a dict lookup per query word plus an address lookup per IP in the
+    query, so building context no longer costs work per device in the fleet.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        organization = config.get("organization", {})
+        self.organization_name = organization.get("name", "")
+        self.devices: List[Dict[str, Any]] = organization.get("devices", [])
+        self.chunks = [self._render(device) for device in self.devices]
+
+        self.by_name: Dict[str, Set[int]] = defaultdict(set)
+        self.by_model: Dict[str, Set[int]] = defaultdict(set)
+        self.by_status: Dict[str, Set[int]] = defaultdict(set)
+        self.by_vlan_id: Dict[int, Set[int]] = defaultdict(set)
+        self.by_vlan_name: Dict[str, Set[int]] = defaultdict(set)
+        self.prefixes = PrefixIndex()
+        name_parts: Dict[str, Set[int]] = defaultdict(set)
+
+        for index, device in enumerate(self.devices):
+            name = _normalize(device["name"])
+            self.by_name[name].add(index)
+            for part in re.split(r"[\W_]+", name):
+                if part and part != name and not part.isdigit():
+                    name_parts[part].add(index)
+            self.by_model[_normalize(device["model"])].add(index)
+            self.by_status[_normalize(device["status"])].add(index)
+            device_config = device.get("config", {})
+            for vlan in device_config.get("vlans", []):
+                self.by_vlan_id[int(vlan["id"])].add(index)
+                self.by_vlan_name[_normalize(vlan["name"])].add(index)
+                self._add_address(index, f"{vlan['name']} (VLAN {vlan['id']})", vlan)
+            for interface in device_config.get("interfaces", []):
+                self._add_address(index, f"interface {interface['name']}", interface)
+        self.prefixes.freeze()
+
+        # A name part shared by much of the fleet ("edge", "01") picks nothing
+        for part, devices in name_parts.items():
+            if part not in self.by_name and len(devices) <= len(self.devices) // 2:
+                self.by_name[part] = devices
+
+        self._indexes = {
+            "names": self.by_name,
+            "models": self.by_model,
+            "statuses": self.by_status,
+            "vlans": self.by_vlan_name,
+        }
+        terms: Dict[str, List[Tuple[str, Any]]] = defaultdict(list)
+        for dimension, values in self._indexes.items():
+            for value in values:
+                if dimension == "vlans":
+                    for term in _vlan_terms(value):
+                        terms[term].append((dimension, value))
+                else:
+                    terms[value].append((dimension, value))
+        for word, status in STATUS_SYNONYMS.items():
+            if status in self.by_status:
+                terms[word].append(("statuses", status))
+        self._terms = dict(terms)
+        self._max_words = max((len(term.split()) for term in self._terms), default=1)
+        self._summary: Optional[str] = None
+
+    @staticmethod
+    def _render(device: Dict[str, Any]) -> str:
+        device_context = f"Device: {device['name']}\n"
+        device_context += f"Model: {device['model']}\n"
+        device_context += f"Status: {device['status']}\n"
+
+        # Add VLAN information
+        if "config" in device and "vlans" in device["config"]:
+            device_context += "VLANs:\n"
+            for vlan in device["config"]["vlans"]:
+                device_context += (
+                    f"- {vlan['name']} (VLAN {vlan['id']}): {vlan['ip']}\n"
+                )
+
+        # Add interface information
+        if "config" in device and "interfaces" in device["config"]:
+            device_context += "Interfaces:\n"
+            for interface in device["config"]["interfaces"]:
+                device_context += (
+                    f"- {interface['name']}: {interface['ip']} "
+                    f"({interface['status']})\n"
+                )
+
+        return device_context
+
+    def _add_address(self, device: int, label: str, item: Dict[str, Any]):
+        parsed = _parse_prefix(str(item.get("ip", "")))
+        if parsed is None:
+            return
+        version, address, prefixlen = parsed
+        # The subnet, for addresses inside it, and the address itself
+        start, _ = _span(version, address, prefixlen)
+        self.prefixes.add(PrefixEntry(device, label, version, start, prefixlen))
+        bits = 32 if version == 4 else 128
+        if prefixlen < bits:
+            self.prefixes.add(PrefixEntry(device, label, version, address, bits))
+
+    def _address_matches(self, text: str) -> List[PrefixEntry]:
+        parsed = _parse_prefix(text)
+        if parsed is None:
+            return []
+        if "/" in text:
+            entries = self.prefixes.within(*parsed)
+            if entries:
+                return entries
+        return self.prefixes.longest_match(*parsed)
+
+    def _match_terms(self, query: str) -> List[str]:
+        """Index terms in the query, longest first at each position.
+
+        A token matching no term as a whole (``site12-edge``) is looked up
+        by its parts.
+        """
+        tokens = [token.rstrip(".-") for token in _TOKEN.findall(query.lower())]
+        matched = []
+        position = 0
+        while position < len(tokens):
+            for words in range(min(self._max_words, len(tokens) - position), 0, -1):
+                term = " ".join(tokens[position : position + words])
+                if term in self._terms:
+                    matched.append(term)
+                    position += words
+                    break
+            else:
+                matched.extend(
+                    part
+                    for part in re.split(r"[.\-]+", tokens[position])
+                    if part in self._terms
+                )
+                position += 1
+        return matched
+
+    def select(self, query: str) -> Selection:
+        """Resolve the devices a query mentions.
+
+        Names and addresses pick devices outright; models, statuses and
+        VLANs narrow them down, or on their own pick every device that
+        matches all of them. A query matching none of these is fleet-wide.
+        """
+        selection = Selection()
+        picked: Dict[str, Set[int]] = defaultdict(set)
+
+        for term in self._match_terms(query):
+            for dimension, value in self._terms[term]:
+                picked[dimension] |= self._indexes[dimension][value]
+                selection.selectors.setdefault(dimension, []).append(value)
+        for vlan_id in _VLAN_ID.findall(query):
+            devices = self.by_vlan_id.get(int(vlan_id))
+            if devices:
+                picked["vlans"] |= devices
+                selection.selectors.setdefault("vlans", []).append(vlan_id)
+
+        # Devices named or addressed, most specific first
+        ranked: Dict[int, None] = {}
+        for text in _ADDRESS.findall(query):
+            entries = sorted(
+                self._address_matches(text),
+                key=lambda entry: -entry.prefixlen,
+            )
+            if entries:
+                selection.selectors.setdefault("addresses", []).append(text)
+            for entry in entries:
+                ranked[entry.device] = None
+                selection.notes.setdefault(entry.device, []).append(
+                    f"{text} matches {entry.label} {entry.network}"
+                )
+        for device in sorted(picked.get("names", ())):
+            ranked[device] = None
+
+        filters = [picked[d] for d in ("models", "statuses", "vlans") if d in picked]
+        if ranked:
+            narrowed = [
+                device
+                for device in ranked
+                if all(device in devices for devices in filters)
+            ]
+            selection.devices = narrowed or list(ranked)
+        elif filters:
+            selection.devices = sorted(set.intersection(*filters))
+        else:
+            selection.fleet_wide = True
+            selection.devices = list(range(len(self.devices)))
+        return selection
+
+    def summary(self) -> str:
+        """Fleet-wide aggregates as one context chunk"""
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    def _summarize(self) -> str:
+        statuses = Counter(device["status"] for device in self.devices)
+        models = Counter(device["model"] for device in self.devices)
+        lines = [
+            f"Organization: {self.organization_name} ({len(self.devices)} devices)",
+            "Device status: "
+            + ", ".join(
+                f"{status} {count}" for status, count in statuses.most_common()
+            ),
+            "Models: "
+            + ", ".join(f"{model} {count}" for model, count in models.most_common()),
+        ]
+
+        vlans = Counter()
+        vlan_names: Dict[int, str] = {}
+        interfaces_down = []
+        for device in self.devices:
+            device_config = device.get("config", {})
+            for vlan in device_config.get("vlans", []):
+                vlans[int(vlan["id"])] += 1
+                vlan_names.setdefault(int(vlan["id"]), vlan["name"])
+            for interface in device_config.get("interfaces", []):
+                if interface.get("status") == "down":
+                    interfaces_down.append(f"{device['name']} {interface['name']}")
+        if vlans:
+            lines.append(
+                "VLANs: "
+                + ", ".join(
+                    f"{vlan_names[vlan_id]} (VLAN {vlan_id}) on {count} devices"
+                    for vlan_id, count in sorted(vlans.items())
+                )
+            )
+
+        for status in statuses:
+            if status == "active":
+                continue
+            names = [
+                self.devices[index]["name"]
+                for index in sorted(self.by_status[_normalize(status)])
+            ]
+            lines.append(f"Devices {status}: {self._listing(names)}")
+        if interfaces_down:
+            lines.append(f"Interfaces down: {self._listing(interfaces_down)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _listing(names: List[str]) -> str:
+        shown = ", ".join(names[:SUMMARY_MAX_NAMES])
+        if len(names) > SUMMARY_MAX_NAMES:
+            shown += f" (+{len(names) - SUMMARY_MAX_NAMES} more)"
+        return shown
+
+    def context(
+        self, query: str, max_devices: int = SDWAN_CONTEXT_MAX_DEVICES
+    ) -> Tuple[List[int], List[str], Dict[str, Any]]:
+        """Devices included for ``query``, their context chunks and a report"""
+        selection = self.select(query)
+        summarized = bool(self.devices) and (
+            selection.fleet_wide or len(selection.devices) > max_devices
+        )
+        # A fleet-wide question about more devices than fit gets the summary
+        # alone; the first devices of the config say nothing about the rest
+        if selection.fleet_wide and len(self.devices) > max_devices:
+            included = []
+        else:
+            included = selection.devices[:max_devices]
+        chunks = []
+        if summarized:
+            chunks.append(self.summary())
+        for device in included:
+            notes = selection.notes.get(device)
+            prefix = "".join(f"Matched: {note}\n" for note in notes) if notes else ""
+            chunks.append(prefix + self.chunks[device])
+        return (
+            included,
+            chunks,
+            {
+                "devices": len(self.devices),
+                "matched": 0 if selection.fleet_wide else len(selection.devices),
+                "included": len(included),
+                "summary": summarized,
+                "selectors": selection.selectors,
+            },
+        )
@@ -1,7 +1,16 @@
-from typing import Dict, Any, List
+import asyncio
+import os
+from typing import Dict, Any, List, Optional
 from .base import WorkflowProvider
+from .config_cache import StaleWhileRevalidateCache
+from .sdwan_index import SDWANConfigIndex
 from ..services.sdwan import SDWANService
-from ..schemas import SourceLink
+from ..schemas import RetrievalOptions, SourceLink
+
+# Organization config younger than this is served from cache; older, up to
+# the max stale age, is served while a background task refreshes it
+SDWAN_CONFIG_TTL = float(os.getenv("SDWAN_CONFIG_TTL", "60"))
+SDWAN_CONFIG_MAX_STALE = float(os.getenv("SDWAN_CONFIG_MAX_STALE", "600"))
 
 
 class SDWANWorkflowProvider(WorkflowProvider):
@@ -9,6 +18,12 @@ class SDWANWorkflowProvider(WorkflowProvider):
 
     def __init__(self):
         self.sdwan_service = SDWANService()
+        self.config_cache = StaleWhileRevalidateCache(
+            self.sdwan_service.get_organization_config,
+            ttl=SDWAN_CONFIG_TTL,
+            max_stale=SDWAN_CONFIG_MAX_STALE,
+        )
+        self._index: Optional[SDWANConfigIndex] = None
         self.keywords = [
             "sdwan",
             "network",
@@ -17,46 +32,48 @@ class SDWANWorkflowProvider(WorkflowProvider):
             "interface",
             "organization",
             "config",
+            "configuration",
+            "configured",
             "status",
             "ip",
             "address",
         ]
+        # Representative questions, for the semantic router's centroid
+        self.example_queries = [
+            "Which devices are offline right now?",
+            "What VLANs are configured at the branch office?",
+            "Show me the IP addresses of the edge routers",
+            "What is the status of interface GigabitEthernet0/1?",
+            "Which device models does the organization run?",
+        ]
 
     async def can_handle(self, query: str) -> bool:
         """Check if query is related to SD-WAN"""
         query_lower = query.lower()
         return any(keyword in query_lower for keyword in self.keywords)
 
-    async def get_context(self, query: str) -> Dict[str, Any]:
-        """Get SD-WAN configuration context"""
-        config = await self.sdwan_service.get_organization_config()
-
-        # Format context chunks from config
-        context_chunks = []
-        for device in config.get("organization", {}).get("devices", []):
-            device_context = f"Device: {device['name']}\n"
-            device_context += f"Model: {device['model']}\n"
-            device_context += f"Status: {device['status']}\n"
-
-            # Add VLAN information
-            if "config" in device and "vlans" in device["config"]:
-                device_context += "VLANs:\n"
-                for vlan in device["config"]["vlans"]:
-                    device_context += (
-                        f"- {vlan['name']} (VLAN {vlan['id']}): {vlan['ip']}\n"
-                    )
+    async def get_context(
+        self, query: str, options: Optional[RetrievalOptions] = None
+    ) -> Dict[str, Any]:
+        """Get context for the devices the query is about.
 
-            # Add interface information
-            if "config" in device and "interfaces" in device["config"]:
-                device_context += "Interfaces:\n"
-                for interface in device["config"]["interfaces"]:
-                    device_context += f"- {interface['name']}: {interface['ip']} ({interface['status']})\n"
+        Devices named or addressed in the query (narrowed by any model,
+        status or VLAN it mentions) are included in full; fleet-wide
+        questions get an aggregate summary instead.
+        """
+        config, cache_info = await self.config_cache.get()
 
-            context_chunks.append(device_context)
+        index = self._index
+        if index is None or index.config is not config:
+            # Rebuilt only when the cache hands out a newly fetched config,
+            # off the event loop since a large fleet takes a while
+            index = self._index = await asyncio.to_thread(SDWANConfigIndex, config)
+        devices, context_chunks, report = index.context(query)
 
-        # Create source links for each device
+        # Create source links for the devices in the context
         source_links = []
-        for device in config.get("organization", {}).get("devices", []):
+        for device_index in devices:
+            device = index.devices[device_index]
             source_links.append(
                 SourceLink(
                     provider="SDWAN",
@@ -70,9 +87,9 @@ class SDWANWorkflowProvider(WorkflowProvider):
             )
 
         return {
-            "config": config,
             "context_chunks": context_chunks,
             "source_links": source_links,
+            "metadata": {"config_cache": cache_info, "sdwan_context": report},
         }
 
     def get_capabilities(self) -> Dict[str, Any]:
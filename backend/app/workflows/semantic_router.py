@@ -0,0 +1,253 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+SEMANTIC_ROUTING = os.getenv("SEMANTIC_ROUTING", "true").lower() == "true"
+# Minimum cosine between the query and the best provider centroid, and minimum
+# lead of the best provider over the runner-up. Unset, both are calibrated per
+# embedding model when its centroids are built (see SemanticRouter.calibrate)
+SEMANTIC_ROUTER_THRESHOLD = (
+    float(os.getenv("SEMANTIC_ROUTER_THRESHOLD"))
+    if os.getenv("SEMANTIC_ROUTER_THRESHOLD")
+    else None
+)
+SEMANTIC_ROUTER_MARGIN = (
+    float(os.getenv("SEMANTIC_ROUTER_MARGIN"))
+    if os.getenv("SEMANTIC_ROUTER_MARGIN")
+    else None
+)
+# Used when a model can't be calibrated, e.g. no provider has example_queries
+DEFAULT_THRESHOLD = 0.45
+DEFAULT_MARGIN = 0.03
+MIN_MARGIN = 0.01
+
+# Questions no provider should claim; calibration puts the threshold above them
+OFF_TOPIC_QUERIES = [
+    "What's the weather going to be like tomorrow?",
+    "Tell me a joke",
+    "Who won the football match last night?",
+    "Recommend a good recipe for dinner",
+    "How do I say thank you in French?",
+    "What is the capital of Australia?",
+    "Write a short poem about the sea",
+    "How many calories are in a banana?",
+]
+
+
+def provider_texts(provider: Any) -> List[str]:
+    """What a provider's centroid is built from"""
+    capabilities = provider.get_capabilities()
+    texts = [capabilities["description"], *capabilities["capabilities"]]
+    texts.extend(getattr(provider, "example_queries", None) or [])
+    keywords = getattr(provider, "keywords", None)
+    if keywords:
+        texts.append(", ".join(keywords))
+    return texts
+
+
+class SemanticRouter:
+    """Routes a query to the provider whose centroid is closest to it.
+
+    Each provider's centroid is the normalized mean of the embeddings of its
+    description, capabilities, ``example_queries`` and keywords, computed
+    once per embedding model with a single batch call. Routing is then one
+    matrix-vector product against a query vector that's already at hand,
+    so it adds no model or LLM call to a request. A route is only confident
+    when the best cosine clears ``threshold`` and leads the runner-up by
+    ``margin``; callers fall back to keyword routing otherwise. Thresholds
+    that aren't given are calibrated per model (see ``calibrate``).
+    """
+
+    def __init__(
+        self,
+        registry,
+        threshold: Optional[float] = SEMANTIC_ROUTER_THRESHOLD,
+        margin: Optional[float] = SEMANTIC_ROUTER_MARGIN,
+        off_topic_queries: Sequence[str] = OFF_TOPIC_QUERIES,
+    ):
+        self.registry = registry
+        self.threshold = threshold
+        self.margin = margin
+        self.off_topic_queries = list(off_topic_queries)
+        self.providers: List[Any] = []
+        self._centroids: Dict[str, np.ndarray] = {}
+        self._calibration: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def build(self, providers: Sequence[Any]):
+        """Set the candidate providers; centroids are computed on first use"""
+        with self._lock:
+            self.providers = list(providers)
+            self._centroids = {}
+            self._calibration = {}
+
+    def centroids(self) -> np.ndarray:
+        """Centroid matrix for the active embedding model, one row per provider"""
+        name = self.registry.active().name
+        centroids = self._centroids.get(name)
+        if centroids is None:
+            with self._lock:
+                centroids = self._centroids.get(name)
+                if centroids is None:
+                    centroids = self._compute(name)
+                    self._centroids[name] = centroids
+        return centroids
+
+    def calibration(self) -> Dict[str, Any]:
+        """Threshold and margin in use for the active embedding model"""
+        self.centroids()
+        return self._calibration[self.registry.active().name]
+
+    def _compute(self, model_name: str) -> np.ndarray:
+        texts, owners, examples = [], [], []
+        for index, provider in enumerate(self.providers):
+            example_queries = set(getattr(provider, "example_queries", None) or [])
+            for text in provider_texts(provider):
+                if text in example_queries:
+                    examples.append(len(texts))
+                texts.append(text)
+                owners.append(index)
+        # Off-topic queries ride along in the same batch, for calibration
+        vectors = np.asarray(
+            self.registry.embed_batch(texts + self.off_topic_queries, model_name),
+            dtype=np.float32,
+        )
+        vectors, off_topic = vectors[: len(texts)], vectors[len(texts) :]
+        owners = np.asarray(owners)
+        sums = np.stack(
+            [
+                vectors[owners == index].sum(axis=0)
+                for index in range(len(self.providers))
+            ]
+        )
+        counts = np.bincount(owners, minlength=len(self.providers))
+        centroids = _normalize(sums)
+
+        held_out = []
+        for row in examples:
+            owner = owners[row]
+            if counts[owner] < 2:
+                continue
+            # Score each example against a centroid built without it
+            loo = sums.copy()
+            loo[owner] -= vectors[row]
+            held_out.append((owner, _normalize(loo) @ _normalize(vectors[row])))
+        self._calibration[model_name] = self.calibrate(
+            held_out, _normalize(off_topic) @ centroids.T
+        )
+        return centroids
+
+    def calibrate(
+        self,
+        held_out: Sequence[Tuple[int, np.ndarray]],
+        off_topic: np.ndarray,
+    ) -> Dict[str, Any]:
+        """Pick a threshold and margin from held-out and off-topic scores.
+
+        ``held_out`` pairs each example query's provider index with its
+        cosines to all centroids (its own provider's centroid left it out);
+        ``off_topic`` holds one row of cosines per off-topic query. The
+        threshold is the cut that best separates correctly routed examples
+        from off-topic queries and misrouted examples; the margin is just
+        above the largest lead of a misrouted example. A threshold or
+        margin given to the router is kept as is.
+        """
+        accepted, rejected, misrouted_leads = [], [], []
+        for owner, similarities in held_out:
+            best, lead = _best_and_lead(similarities)
+            if int(np.argmax(similarities)) == owner:
+                accepted.append(best)
+            else:
+                rejected.append(best)
+                misrouted_leads.append(lead)
+        rejected.extend(_best_and_lead(row)[0] for row in off_topic)
+
+        calibrated = bool(accepted)
+        threshold = self.threshold
+        if threshold is None:
+            threshold = (
+                _separating_cut(accepted, rejected) if calibrated else DEFAULT_THRESHOLD
+            )
+        margin = self.margin
+        if margin is None:
+            margin = (
+                max([MIN_MARGIN, *(lead + 0.005 for lead in misrouted_leads)])
+                if calibrated
+                else DEFAULT_MARGIN
+            )
+        if not calibrated and (self.threshold is None or self.margin is None):
+            print(
+                "Warning: no example_queries to calibrate semantic routing, "
+                "using the default threshold and margin"
+            )
+        return {
+            "threshold": float(threshold),
+            "margin": float(margin),
+            "calibrated": calibrated,
+            "held_out": len(held_out),
+            "held_out_misrouted": len(misrouted_leads),
+            "held_out_accepted": sum(score >= threshold for score in accepted),
+            "off_topic_accepted": sum(
+                _best_and_lead(row)[0] >= threshold for row in off_topic
+            ),
+        }
+
+    def score(self, query_vector: Sequence[float]) -> List[Tuple[Any, float]]:
+        """Providers by cosine to the query, best first.
+
+        Expects a unit-length vector from the active model (as the knowledge
+        provider embeds queries); a vector of another model scores nothing.
+        """
+        if not self.providers:
+            return []
+        centroids = self.centroids()
+        vector = np.asarray(query_vector, dtype=np.float32)
+        if vector.shape != (centroids.shape[1],):
+            return []
+        similarities = centroids @ vector
+        order = np.argsort(-similarities)
+        return [(self.providers[i], float(similarities[i])) for i in order]
+
+    def decide(self, scores: List[Tuple[Any, float]]) -> Tuple[Optional[Any], float]:
+        """The confidently best provider, if any, and the confidence margin"""
+        if not scores:
+            return None, 0.0
+        calibration = self.calibration()
+        best = scores[0][1]
+        lead = best - scores[1][1] if len(scores) > 1 else best
+        if best >= calibration["threshold"] and lead >= calibration["margin"]:
+            return scores[0][0], lead
+        return None, lead
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _best_and_lead(similarities: np.ndarray) -> Tuple[float, float]:
+    ranked = np.sort(similarities)[::-1]
+    best = float(ranked[0])
+    return best, best - float(ranked[1]) if len(ranked) > 1 else best
+
+
+def _separating_cut(accepted: List[float], rejected: List[float]) -> float:
+    """Threshold misclassifying the fewest scores, centred in its gap"""
+    values = sorted(set(accepted) | set(rejected))
+    cuts = [values[0] - 0.01]
+    cuts += [(low + high) / 2 for low, high in zip(values, values[1:])]
+    cuts.append(values[-1] + 0.01)
+
+    def errors(cut):
+        return sum(score < cut for score in accepted) + sum(
+            score >= cut for score in rejected
+        )
+
+    # Among equally good cuts, the one with the most room on both sides
+    best = min(errors(cut) for cut in cuts)
+    candidates = [cut for cut in cuts if errors(cut) == best]
+    return max(
+        candidates,
+        key=lambda cut: min(abs(cut - value) for value in values),
+    )
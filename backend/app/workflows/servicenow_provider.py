@@ -1,7 +1,7 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from .base import WorkflowProvider
 from ..services.servicenow import ServiceNowService
-from ..schemas import SourceLink
+from ..schemas import RetrievalOptions, SourceLink
 
 
 class ServiceNowWorkflowProvider(WorkflowProvider):
@@ -21,13 +21,23 @@ class ServiceNowWorkflowProvider(WorkflowProvider):
             "change approval",
             "change risk",
         ]
+        # Representative questions, for the semantic router's centroid
+        self.example_queries = [
+            "Raise a change request to update the VLAN on the core switch",
+            "What changes are scheduled for this weekend?",
+            "Has CHG0030001 been approved yet?",
+            "Create a change to replace the firewall at the data center",
+            "What is the risk of the planned router upgrade?",
+        ]
 
     async def can_handle(self, query: str) -> bool:
         """Check if query is related to change management"""
         query_lower = query.lower()
         return any(keyword in query_lower for keyword in self.keywords)
 
-    async def get_context(self, query: str) -> Dict[str, Any]:
+    async def get_context(
+        self, query: str, options: Optional[RetrievalOptions] = None
+    ) -> Dict[str, Any]:
         """Get change management context"""
         # For change creation requests, use this enhanced prompt
         if (
@@ -0,0 +1,4 @@
+import os
+
+# app.database refuses to import without a database; unit tests use SQLite
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import ChunkLSHBucket, ChunkMinHash, TestEmbedding as Chunk
+from app.dedup import MinHasher, NearDuplicateIndex, lsh_parameters
+
+TEXT = (
+    "The branch router connects to the data center over two SD-WAN tunnels. "
+    "Traffic fails over to the LTE link when both tunnels are down, and "
+    "voice traffic is always sent over the tunnel with the lowest latency."
+)
+NEAR_COPY = TEXT.replace("lowest latency", "lowest jitter")
+UNRELATED = (
+    "Change requests for core switches need approval from the network "
+    "architecture board at least five working days before the window."
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    tables = [Chunk.__table__, ChunkMinHash.__table__, ChunkLSHBucket.__table__]
+    Chunk.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def index():
+    return NearDuplicateIndex(threshold=0.8, action="link")
+
+
+def store(db, index, text, vector=None, canonical=None):
+    """Ingest a chunk the way LlamaVectorizer.process_document does"""
+    row = Chunk(text=text, vector=vector)
+    if canonical is not None:
+        row.canonical_id = canonical
+    db.add(row)
+    db.flush()
+    index.add(db, Chunk, row.id, index.signature(text), canonical is None)
+    return row
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9])
+def test_lsh_parameters_fit_the_signature(threshold):
+    bands, rows = lsh_parameters(threshold, 128)
+    assert bands * rows <= 128
+
+    def shares_a_bucket(similarity):
+        return 1 - (1 - similarity**rows) ** bands
+
+    # An S-curve around the threshold: duplicates found, distant pairs not
+    assert shares_a_bucket(threshold + 0.05) > 0.95
+    assert shares_a_bucket(threshold) > 0.8
+    assert shares_a_bucket(threshold - 0.3) < 0.1
+
+
+def test_lsh_parameters_get_stricter_with_the_threshold():
+    assert lsh_parameters(0.9, 128)[1] >= lsh_parameters(0.5, 128)[1]
+
+
+def test_minhash_ignores_case_whitespace_and_punctuation():
+    hasher = MinHasher(num_perm=64)
+    assert np.array_equal(
+        hasher.signature(TEXT), hasher.signature("  " + TEXT.upper().replace(",", ""))
+    )
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher(num_perm=256)
+    near = np.mean(hasher.signature(TEXT) == hasher.signature(NEAR_COPY))
+    unrelated = np.mean(hasher.signature(TEXT) == hasher.signature(UNRELATED))
+    assert near > 0.6
+    assert unrelated < 0.1
+
+
+def test_minhash_short_text_is_one_shingle():
+    hasher = MinHasher(shingle_size=5)
+    assert len(hasher.shingles("just three words")) == 1
+
+
+def test_minhash_is_deterministic_per_seed():
+    assert np.array_equal(
+        MinHasher(seed=3).signature(TEXT), MinHasher(seed=3).signature(TEXT)
+    )
+    assert not np.array_equal(
+        MinHasher(seed=3).signature(TEXT), MinHasher(seed=4).signature(TEXT)
+    )
+
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(action="merge")
+
+
+def test_find_returns_the_canonical_near_duplicate(db, index):
+    original = store(db, index, TEXT, [1.0, 0.0, 0.0])
+    store(db, index, UNRELATED, [0.0, 1.0, 0.0])
+    match = index.find(db, Chunk, index.signature(NEAR_COPY))
+    assert match is not None
+    assert match[0] == original.id
+    assert match[1] >= index.threshold
+    assert index.find(db, Chunk, index.signature("Nothing like it")) is None
+
+
+def test_linked_duplicates_are_not_candidates(db, index):
+    original = store(db, index, TEXT, [1.0, 0.0, 0.0])
+    store(db, index, NEAR_COPY, canonical=original.id)
+    match = index.find(db, Chunk, index.signature(NEAR_COPY))
+    assert match[0] == original.id
+
+
+def test_remove_promotes_the_first_surviving_duplicate(db, index):
+    original = store(db, index, TEXT, [1.0, 0.0, 0.0])
+    heir = store(db, index, NEAR_COPY, canonical=original.id)
+    sibling = store(db, index, NEAR_COPY + " Again.", canonical=original.id)
+    other = store(db, index, UNRELATED, [0.0, 1.0, 0.0])
+
+    index.remove(db, Chunk, [original])
+    db.delete(original)
+    db.flush()
+
+    assert heir.canonical_id is None
+    assert list(heir.vector) == [1.0, 0.0, 0.0]
+    assert sibling.canonical_id == heir.id
+    assert other.canonical_id is None
+    # The heir now answers for the text, and the deleted chunk is unindexed
+    assert index.find(db, Chunk, index.signature(TEXT))[0] == heir.id
+    assert db.query(ChunkMinHash).filter_by(chunk_id=original.id).count() == 0
+    assert db.query(ChunkLSHBucket).filter_by(chunk_id=original.id).count() == 0
+
+
+def test_remove_with_the_duplicates_drops_them_all(db, index):
+    original = store(db, index, TEXT, [1.0, 0.0, 0.0])
+    copy = store(db, index, NEAR_COPY, canonical=original.id)
+
+    index.remove(db, Chunk, [original, copy])
+
+    assert copy.canonical_id == original.id
+    assert db.query(ChunkMinHash).count() == 0
+    assert db.query(ChunkLSHBucket).count() == 0
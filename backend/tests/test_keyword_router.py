@@ -0,0 +1,75 @@
+import re
+from app.workflows.keyword_router import KeywordRouter, _trie_pattern
+
+
+class Provider:
+    def __init__(self, name, keywords):
+        self.name = name
+        self.keywords = keywords
+
+    def get_capabilities(self):
+        return {"name": self.name}
+
+
+SERVICENOW = Provider("servicenow", ["change", "change request", "change risk"])
+SDWAN = Provider("sdwan", ["device", "vlan", "ip", "address", "config"])
+SHARED = Provider("shared", ["device"])
+
+
+def router(*providers):
+    keyword_router = KeywordRouter()
+    keyword_router.build(providers)
+    return keyword_router
+
+
+def names(matches):
+    return [match.provider.name for match in matches]
+
+
+def test_trie_pattern_factors_common_prefixes():
+    pattern = _trie_pattern(["change", "change request", "change risk"])
+    assert pattern == r"change(?:\s+r(?:equest|isk))?"
+    assert re.fullmatch(pattern, "change  request")
+
+
+def test_no_keywords_scores_nothing():
+    assert router(Provider("empty", [])).score("anything") == []
+
+
+def test_longest_keyword_wins_and_counts_its_words():
+    [match] = router(SERVICENOW).score("Open a Change Request for tonight")
+    assert match.keywords == ["change request"]
+    assert match.score == 2
+
+
+def test_keywords_match_whole_words_or_plurals():
+    keyword_router = router(SDWAN, SERVICENOW)
+    assert keyword_router.score("zip the ipsec changelog") == []
+    [match] = keyword_router.score("list devices and their addresses")
+    assert match.keywords == ["device", "address"]
+
+
+def test_longer_keyword_falls_back_when_not_a_whole_word():
+    [match] = router(SERVICENOW).score("is this change risky")
+    assert match.keywords == ["change"]
+
+
+def test_best_score_first_ties_by_registration_order():
+    keyword_router = router(SDWAN, SHARED, SERVICENOW)
+    assert names(keyword_router.score("device change request")) == [
+        "servicenow",
+        "sdwan",
+        "shared",
+    ]
+    assert names(keyword_router.score("which device")) == ["sdwan", "shared"]
+
+
+def test_every_occurrence_counts():
+    [match] = router(SDWAN).score("vlan 10 and vlan 20 on the same IP")
+    assert match.score == 3
+    assert match.keywords == ["vlan", "vlan", "ip"]
+
+
+def test_explain_names_the_provider():
+    [match] = router(SDWAN).score("vlan")
+    assert match.explain() == {"provider": "sdwan", "score": 1, "keywords": ["vlan"]}
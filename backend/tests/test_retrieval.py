@@ -0,0 +1,88 @@
+import numpy as np
+from app.retrieval import join_overlapping, mmr_select
+
+
+def unit(*vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+QUERY = unit([1.0, 0.0, 0.0])[0]
+# Two near-identical candidates close to the query, one further but different
+CANDIDATES = unit([1.0, 0.1, 0.0], [1.0, 0.12, 0.0], [0.7, 0.0, 0.7], [0.0, 1.0, 0.0])
+
+
+def test_mmr_empty_pool_or_k():
+    assert mmr_select(QUERY, [], 3) == []
+    assert mmr_select(QUERY, CANDIDATES, 0) == []
+
+
+def test_mmr_k_at_least_pool_returns_every_candidate_once():
+    selected = mmr_select(QUERY, CANDIDATES, 10)
+    assert sorted(selected) == list(range(len(CANDIDATES)))
+
+
+def test_mmr_lambda_one_is_plain_relevance_order():
+    relevance = CANDIDATES @ QUERY
+    assert mmr_select(QUERY, CANDIDATES, 3, lambda_mult=1.0) == list(
+        np.argsort(-relevance)[:3]
+    )
+    assert mmr_select(QUERY, CANDIDATES, 10, lambda_mult=1.0) == [0, 1, 2, 3]
+
+
+def test_mmr_lambda_zero_picks_least_redundant_after_the_first():
+    selected = mmr_select(QUERY, CANDIDATES, 2, lambda_mult=0.0)
+    # The first pick is always the most relevant; then only diversity counts
+    assert selected == [0, 3]
+
+
+def test_mmr_skips_the_near_duplicate():
+    assert mmr_select(QUERY, CANDIDATES, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_duplicate_vectors_are_each_selected_once():
+    duplicates = unit([1.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 0.0, 0.0])
+    selected = mmr_select(QUERY, duplicates, 3)
+    assert sorted(selected) == [0, 1, 2]
+
+
+def test_mmr_relevance_overrides_query_similarity():
+    selected = mmr_select(QUERY, CANDIDATES, 1, relevance=[0.0, 0.0, 0.0, 1.0])
+    assert selected == [3]
+
+
+def test_join_overlapping_empty_and_single():
+    assert join_overlapping([]) == ""
+    assert join_overlapping(["only chunk"]) == "only chunk"
+
+
+def test_join_overlapping_drops_the_repeated_window():
+    a = "The router forwards packets."
+    b = "It keeps one routing table per VRF."
+    c = "Static routes override learned ones."
+    d = "Default routes come last."
+    chunks = [f"{a} {b}", f"{b} {c}", f"{c} {d}"]
+    assert join_overlapping(chunks) == f"{a} {b} {c} {d}"
+
+
+def test_join_overlapping_without_overlap_joins_with_a_space():
+    assert join_overlapping(["alpha beta", "gamma delta"]) == "alpha beta gamma delta"
+
+
+def test_join_overlapping_finds_the_overlap_after_an_earlier_false_match():
+    # The chunk's opening also appears earlier, where it isn't a suffix
+    overlap = "the tail of one chunk that is repeated"
+    first = f"{overlap} once. Some other text. {overlap}"
+    second = f"{overlap}, then new text"
+    assert join_overlapping([first, second]) == f"{first}, then new text"
+
+
+def test_join_overlapping_ignores_overlap_beyond_max_overlap():
+    first = "repeated start " + "x" * 100
+    second = "repeated start " + "x" * 100 + " end"
+    joined = join_overlapping([first, second], max_overlap=10)
+    assert joined == f"{first} {second}"
+
+
+def test_join_overlapping_identical_chunks_collapse():
+    assert join_overlapping(["same text here", "same text here"]) == "same text here"
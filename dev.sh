@@ -47,6 +47,13 @@ show_logs() {
     fi
 }
 
+# Function to backfill existing data after an upgrade
+run_migrations() {
+    echo "Running data migrations..."
+    docker-compose -f docker-compose.dev.yml exec backend python -m app.migrations.add_chunk_index
+    docker-compose -f docker-compose.dev.yml exec backend python -m app.migrations.add_near_duplicate_index
+}
+
 # Main menu
 case "$1" in
     "start")
@@ -61,12 +68,16 @@ case "$1" in
     "logs")
         show_logs $2
         ;;
+    "migrate")
+        run_migrations
+        ;;
     *)
-        echo "Usage: $0 {start|stop|rebuild|logs}"
+        echo "Usage: $0 {start|stop|rebuild|logs|migrate}"
         echo "  start   - Start the development environment"
         echo "  stop    - Stop the development environment"
         echo "  rebuild - Rebuild a specific service (backend|ui|db)"
         echo "  logs    - Show logs (optional: specify service)"
+        echo "  migrate - Backfill existing data after an upgrade"
         exit 1
         ;;
 esac 
\ No newline at end of file
@@ -0,0 +1,231 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+app = FastAPI(title="Mock LLM API")
+
+
+class MockConfig(BaseModel):
+    ttft_ms: float = float(os.getenv("MOCK_LLM_TTFT_MS", "400"))
+    tokens_per_second: float = float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50"))
+    # Relative random variation applied to both latencies
+    jitter: float = float(os.getenv("MOCK_LLM_JITTER", "0.2"))
+    response_tokens: int = int(os.getenv("MOCK_LLM_RESPONSE_TOKENS", "80"))
+    error_rate: float = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+    rate_limit_rate: float = float(os.getenv("MOCK_LLM_429_RATE", "0"))
+    retry_after_seconds: float = float(os.getenv("MOCK_LLM_RETRY_AFTER", "1"))
+    # Requests beyond this many in flight get a 429, like a deployment quota
+    max_concurrency: Optional[int] = (
+        int(os.getenv("MOCK_LLM_MAX_CONCURRENCY"))
+        if os.getenv("MOCK_LLM_MAX_CONCURRENCY")
+        else None
+    )
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: Optional[str] = None
+
+
+class ChatCompletionRequest(BaseModel):
+    model: Optional[str] = None
+    messages: List[ChatMessage]
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    stream: bool = False
+
+
+config = MockConfig()
+stats = {
+    "requests": 0,
+    "streams": 0,
+    "errors_injected": 0,
+    "rate_limited": 0,
+    "in_flight": 0,
+}
+
+FILLER = (
+    "the network configuration shows all branch devices online with data "
+    "and voice vlans assigned per site and uplinks healthy across the fleet"
+).split()
+
+
+def _jittered(value: float) -> float:
+    return max(0.0, value * random.uniform(1 - config.jitter, 1 + config.jitter))
+
+
+def _answer_tokens(request: ChatCompletionRequest) -> List[str]:
+    question = request.messages[-1].content or "" if request.messages else ""
+    # The backend sends "Context: ...\n\nQuestion: ..."; echo just the question
+    question = question.rsplit("Question:", 1)[-1].strip()
+    words = [f"Mock answer to: {question[:80]}."] + [
+        FILLER[i % len(FILLER)] for i in range(config.response_tokens)
+    ]
+    limit = request.max_tokens or len(words)
+    return [word + " " for word in words[:limit]]
+
+
+def _usage(request: ChatCompletionRequest, completion_tokens: int) -> Dict[str, int]:
+    prompt_tokens = sum(len((m.content or "").split()) for m in request.messages)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _injected_failure() -> Optional[JSONResponse]:
+    """A 429 or 500 response, if one is due"""
+    over_quota = (
+        config.max_concurrency is not None
+        and stats["in_flight"] >= config.max_concurrency
+    )
+    if over_quota or random.random() < config.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={
+                "retry-after": str(int(round(config.retry_after_seconds))),
+                "retry-after-ms": str(int(config.retry_after_seconds * 1000)),
+            },
+            content={
+                "error": {
+                    "code": "429",
+                    "message": "Requests to the deployment have exceeded the rate limit.",
+                }
+            },
+        )
+    if random.random() < config.error_rate:
+        stats["errors_injected"] += 1
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": {"code": "internal_error", "message": "Injected failure"}
+            },
+        )
+    return None
+
+
+async def _complete(request: ChatCompletionRequest, model: str):
+    tokens = _answer_tokens(request)
+    stats["in_flight"] += 1
+    try:
+        await asyncio.sleep(
+            _jittered(config.ttft_ms / 1000 + len(tokens) / config.tokens_per_second)
+        )
+    finally:
+        stats["in_flight"] -= 1
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": _usage(request, len(tokens)),
+    }
+
+
+async def _stream(request: ChatCompletionRequest, model: str, azure: bool):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    stats["in_flight"] += 1
+    try:
+        if azure:
+            # Azure leads with a chunk carrying only content filter results
+            yield "data: " + json.dumps(
+                {"id": "", "object": "", "created": 0, "model": "", "choices": []}
+            ) + "\n\n"
+        await asyncio.sleep(_jittered(config.ttft_ms / 1000))
+        yield chunk({"role": "assistant", "content": ""})
+        for token in _answer_tokens(request):
+            yield chunk({"content": token})
+            await asyncio.sleep(_jittered(1 / config.tokens_per_second))
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+
+async def _chat_completions(request: ChatCompletionRequest, model: str, azure: bool):
+    stats["requests"] += 1
+    failure = _injected_failure()
+    if failure is not None:
+        return failure
+    if request.stream:
+        stats["streams"] += 1
+        return StreamingResponse(
+            _stream(request, model, azure), media_type="text/event-stream"
+        )
+    return await _complete(request, model)
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: ChatCompletionRequest):
+    """OpenAI-style chat completions"""
+    return await _chat_completions(request, request.model or "mock", azure=False)
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: ChatCompletionRequest):
+    """Azure OpenAI-style chat completions; the api-version is accepted and ignored"""
+    return await _chat_completions(request, deployment, azure=True)
+
+
+@app.get("/v1/models")
+@app.get("/openai/models")
+async def list_models():
+    """Models list, used by the backend as a cheap health probe"""
+    return {
+        "object": "list",
+        "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "mock"}],
+    }
+
+
+@app.get("/config")
+async def get_config():
+    """Current latency and fault injection settings"""
+    return config
+
+
+@app.patch("/config")
+async def update_config(request: Request):
+    """Change latency or fault injection settings at runtime"""
+    global config
+    config = MockConfig(**{**config.model_dump(), **await request.json()})
+    return config
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Requests served and failures injected so far"""
+    return stats
+
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint"""
+    return {"status": "healthy"}